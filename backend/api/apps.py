@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .instrumentation import add_listener, install_query_wrapper
+        from .metrics import record_request
+
+        connection_created.connect(install_query_wrapper)
+        add_listener(record_request)
@@ -0,0 +1,159 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Acces au cache depuis les vues async, sans passer par un thread : meme stockage, memes cles et
+# meme serialisation que le cache Django synchrone (une entree ecrite par une vue WSGI est lue par
+# une vue ASGI et inversement). Choisi d'apres le backend de CACHES, pas de reglage a garder en phase :
+#  - django_redis : client redis.asyncio, cles et valeurs encodees par le client django_redis ;
+#  - autres backends : API async du cache Django, LocMemCache (memoire du processus, sans E/S)
+#    appele directement.
+
+# Un client redis.asyncio par boucle d'evenements : ses connexions sont liees a la boucle qui les a ouvertes.
+# Sous ASGI, une seule boucle par processus, donc un seul pool ; les vues async ne sont pas routees sous
+# WSGI (backend/urls.py), ou chaque requete ouvrirait une nouvelle boucle et un nouveau pool.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _location(alias):
+    location = settings.CACHES[alias]['LOCATION']
+    if isinstance(location, str):
+        location = location.split(',')
+    # Premier serveur : celui ou django_redis ecrit
+    return location[0]
+
+
+def _connection_kwargs(alias):
+    # Memes OPTIONS que le pool django_redis (authentification, delais, CONNECTION_POOL_KWARGS)
+    options = settings.CACHES[alias].get('OPTIONS', {})
+    kwargs = dict(options.get('CONNECTION_POOL_KWARGS', {}))
+    for option, argument in (
+        ('USERNAME', 'username'),
+        ('PASSWORD', 'password'),
+        ('SOCKET_TIMEOUT', 'socket_timeout'),
+        ('SOCKET_CONNECT_TIMEOUT', 'socket_connect_timeout'),
+    ):
+        if options.get(option):
+            kwargs[argument] = options[option]
+    return kwargs
+
+
+def async_redis(alias=DEFAULT_CACHE_ALIAS):
+    from redis.asyncio import ConnectionPool, Redis
+
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    if alias not in clients:
+        pool = ConnectionPool.from_url(_location(alias), **_connection_kwargs(alias))
+        options = settings.CACHES[alias].get('OPTIONS', {})
+        clients[alias] = Redis(connection_pool=pool, **options.get('REDIS_CLIENT_KWARGS', {}))
+    return clients[alias]
+
+
+class RedisAsyncCache:
+    def __init__(self, alias):
+        self.alias = alias
+        self.cache = caches[alias]
+        self.client = self.cache.client
+
+    @property
+    def redis(self):
+        return async_redis(self.alias)
+
+    def _expiry(self, timeout):
+        # Conventions du cache Django : DEFAULT_TIMEOUT, None sans expiration
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.cache.default_timeout
+        return {} if timeout is None else {'px': max(int(timeout * 1000), 1)}
+
+    async def get(self, key):
+        value = await self.redis.get(self.client.make_key(key))
+        return None if value is None else self.client.decode(value)
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self.redis.mget([self.client.make_key(key) for key in keys])
+        return {key: self.client.decode(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        await self.redis.set(self.client.make_key(key), self.client.encode(value), **self._expiry(timeout))
+
+    async def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return bool(await self.redis.set(
+            self.client.make_key(key), self.client.encode(value), nx=True, **self._expiry(timeout)
+        ))
+
+    async def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        if not mapping:
+            return
+        expiry = self._expiry(timeout)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(self.client.make_key(key), self.client.encode(value), **expiry)
+            await pipe.execute()
+
+    async def delete(self, key):
+        return bool(await self.redis.delete(self.client.make_key(key)))
+
+
+class DjangoAsyncCache:
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        self.direct = isinstance(self.cache, LocMemCache)
+
+    async def _call(self, name, *args):
+        if self.direct:
+            return getattr(self.cache, name)(*args)
+        return await getattr(self.cache, f'a{name}')(*args)
+
+    async def get(self, key):
+        return await self._call('get', key)
+
+    async def get_many(self, keys):
+        return await self._call('get_many', list(keys))
+
+    async def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        await self._call('set', key, value, timeout)
+
+    async def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return await self._call('add', key, value, timeout)
+
+    async def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        await self._call('set_many', mapping, timeout)
+
+    async def delete(self, key):
+        return await self._call('delete', key)
+
+
+_caches = {}
+
+
+def _is_redis(cache):
+    try:
+        from django_redis.cache import RedisCache
+    except ImportError:
+        return False
+    return isinstance(cache, RedisCache)
+
+
+def get_cache(alias=DEFAULT_CACHE_ALIAS):
+    if alias not in _caches:
+        if _is_redis(caches[alias]):
+            _caches[alias] = RedisAsyncCache(alias)
+        else:
+            _caches[alias] = DjangoAsyncCache(alias)
+    return _caches[alias]
+
+
+@receiver(setting_changed)
+def _reset_caches(setting, **kwargs):
+    if setting == 'CACHES':
+        _caches.clear()
+        _clients.clear()
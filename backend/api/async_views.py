@@ -0,0 +1,294 @@
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.models import AnonymousUser, update_last_login
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, NotFound, ParseError, ValidationError,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import availability, catalog_cache, fastpath, hashing, renderers, services, throttling
+from .authentication import LibraryRefreshToken, PrincipalJWTAuthentication
+from .conditional import conditional_books, conditional_catalog
+from .fieldsets import Fieldset
+from .forms import CustomUserCreationForm
+from .instrumentation import query_budget
+from .models import Author, Publishers, Title, User
+from .pagination import CatalogCursorPagination
+from .serializers import AuthorSerializer, PublishersSerializer, TitleListSerializer, TitleSerializer, UserSerializer
+from .views import poser_cookie_refresh
+
+# Vues async (Django, sans DRF) pour ASGI.
+# Authentification : le hachage des mots de passe part dans le pool borne de api/hashing.py, une vague
+# de connexions n'occupe ni la boucle d'evenements ni un thread par requete (pool plein -> 503 +
+# Retry-After). Catalogue en lecture (backend/urls_asgi.py) : cache lu par redis.asyncio
+# (api/async_cache.py), ORM async, lectures independantes menees en parallele ; sous ASGI les vues
+# synchrones passent toutes par le meme thread de sync_to_async. Reponses identiques a celles des vues DRF.
+
+
+def lire_corps(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        if not isinstance(data, dict):
+            raise ParseError('Expected a JSON object.')
+        return data
+    return request.POST
+
+
+def reponse_erreur(exc):
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+        response['WWW-Authenticate'] = f'{jwt_settings.AUTH_HEADER_TYPES[0]} realm="api"'
+    return response
+
+
+def reponse_json(data):
+    # Memes octets que Response + FastJSONRenderer : les fragments en cache sont inseres tels quels
+    return HttpResponse(renderers.dumps(data), content_type='application/json')
+
+
+def async_api_view(methods, throttle_scope=None, authenticate=False):
+    # Pendant de @api_view : request.data (corps JSON ou formulaire) et request.query_params comme sous
+    # DRF, authentification JWT si authenticate (request.user : Principal ou anonyme), limitation de
+    # debit (api/throttling.py), exceptions DRF et Http404 rendues en JSON ; exemptees de CSRF comme les APIView
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                request.data = lire_corps(request) if request.method == 'POST' else {}
+                request.query_params = request.GET
+                if authenticate:
+                    resultat = await PrincipalJWTAuthentication().aauthenticate(request)
+                    request.user = resultat[0] if resultat else AnonymousUser()
+                    throttle = throttling.SlidingWindowThrottle()
+                else:
+                    throttle = throttling.AnonymousThrottle(request.data.get('email') or request.data.get('username'))
+                await throttling.acheck(throttle, request, throttle_scope)
+                return await view(request, *args, **kwargs)
+            except Http404 as exc:
+                return reponse_erreur(NotFound(*exc.args))
+            except APIException as exc:
+                return reponse_erreur(exc)
+        return wrapper
+    return decorator
+
+
+async def authentifier(request, email, password):
+    # Backends de AUTHENTICATION_BACKENDS (user_login_failed, user_can_authenticate) ; le hachage part dans
+    # le pool de api/hashing.py (api.authentication.HashingPoolBackend, User.acheck_password)
+    if not isinstance(email, str) or not isinstance(password, str):
+        return None
+    return await aauthenticate(request, **{User.USERNAME_FIELD: email, 'password': password})
+
+
+def erreurs_formulaire(form):
+    return {champ: [erreur['message'] for erreur in erreurs] for champ, erreurs in form.errors.get_json_data().items()}
+
+
+@async_api_view(['GET', 'POST'], throttle_scope='login')
+async def connexion(request):
+    if request.method == 'POST':
+        user = await authentifier(request, request.data.get('username'), request.data.get('password'))
+        if user is not None:
+            await alogin(request, user)
+            return JsonResponse({"message": "Login successful."}, status=200)
+        return JsonResponse({"error": "Incorrect email or password."}, status=400)
+    return JsonResponse({"message": "Send a POST request with 'username' and 'password'."}, status=200)
+
+
+@async_api_view(['GET', 'POST'], throttle_scope='signup')
+async def inscription(request):
+    if request.method == 'POST':
+        form = CustomUserCreationForm(request.data)
+        if not await sync_to_async(form.is_valid)():
+            return JsonResponse({"errors": erreurs_formulaire(form)}, status=400)
+        # Hachage dans le pool, puis form.save() (signaux, validateurs, m2m) dans le thread de sync_to_async
+        form.encoded_password = await hashing.ahash(form.cleaned_data['password1'])
+        await sync_to_async(form.save)()
+        return JsonResponse({"message": "Account created successfully. Please login."}, status=201)
+    return JsonResponse({"message": "Send a POST request with the required fields to create an account."}, status=200)
+
+
+@async_api_view(['POST'], throttle_scope='signup')
+async def creer_compte(request):
+    serializer = UserSerializer(data=request.data, context={'password_hashed': True})
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    password = await hashing.ahash(serializer.validated_data['password'])
+    await sync_to_async(serializer.save)(password=password)
+    return JsonResponse(serializer.data, status=201)
+
+
+@async_api_view(['POST'], throttle_scope='login')
+async def obtenir_jeton(request):
+    data = request.data
+    manquants = {
+        champ: ["This field is required."] for champ in (User.USERNAME_FIELD, 'password') if not data.get(champ)
+    }
+    if manquants:
+        raise ValidationError(manquants)
+    user = await authentifier(request, data[User.USERNAME_FIELD], data['password'])
+    if user is None:
+        raise AuthenticationFailed("No active account found with the given credentials", code="no_active_account")
+    refresh = await sync_to_async(LibraryRefreshToken.for_user, thread_sensitive=False)(user)
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        await sync_to_async(update_last_login)(None, user)
+
+    # Refresh token en cookie httponly, jeton d'acces dans le corps
+    response = JsonResponse({"access": str(refresh.access_token)}, status=200)
+    poser_cookie_refresh(response, str(refresh))
+    return response
+
+
+# CATALOGUE
+async def afragments_par_id(rendu, lignes):
+    lignes = list(lignes)
+    items = [(rendu.pk(ligne), item) for ligne, item in zip(lignes, await rendu.arender(lignes))]
+    await availability.aremember(items)
+    return {pk: renderers.dumps(item) for pk, item in items}
+
+
+async def afragments_json(name, scopes, rendu, lignes, *parts):
+    lignes = {rendu.pk(ligne): ligne for ligne in lignes}
+
+    async def construire(ids):
+        return await afragments_par_id(rendu, [lignes[pk] for pk in ids])
+
+    fragments = await catalog_cache.acached_fragments(name, scopes, list(lignes), construire, *parts)
+    return [renderers.Fragment(data, pk) for pk, data in fragments.items()]
+
+
+@query_budget(5)
+@async_api_view(['GET'], authenticate=True)
+@conditional_books(per_user=True)
+async def liste_livres(request):
+    fieldset = Fieldset.from_request(request)
+    serializer_class = fieldset.serializer(TitleSerializer, TitleListSerializer)
+    rendu = fastpath.plan(serializer_class, fieldset)
+    scopes = catalog_cache.book_scopes(fieldset)
+    parts = (serializer_class.__name__, *fieldset.cache_parts())
+
+    def livres():
+        # Construit seulement en cas de miss (values() sur ~15 colonnes coute autant qu'un hit)
+        return rendu.queryset(Title.objects.for_catalog())
+
+    async def construire():
+        paginator = CatalogCursorPagination()
+        # Curseur DRF (requete de la page comprise) dans le thread de sync_to_async, le reste en async
+        page = await sync_to_async(paginator.paginate_queryset)(livres(), request)
+        return {
+            'books': await afragments_json('book-json', scopes, rendu, page, *parts),
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        }
+
+    async def livres_reserves():
+        if not request.user.is_authenticated:
+            return []
+
+        async def construire_reserves(ids):
+            return await afragments_par_id(rendu, [ligne async for ligne in livres().filter(pk__in=ids)])
+
+        fragments = await catalog_cache.acached_fragments(
+            'book-json', scopes, await services.areserved_title_ids(request.user.pk), construire_reserves, *parts,
+        )
+        return [renderers.Fragment(data, pk) for pk, data in fragments.items()]
+
+    # Page du catalogue et livres reserves par le lecteur : independants, lus en parallele
+    data, reserves = await asyncio.gather(
+        catalog_cache.acached_payload('books', scopes, construire, request.build_absolute_uri()),
+        livres_reserves(),
+    )
+    data = dict(data)
+    data['books'], data['reserved_books_by_user'] = await availability.aapply(data['books'], reserves)
+    return reponse_json(data)
+
+
+@query_budget(3)
+@async_api_view(['GET'], authenticate=True)
+@conditional_books()
+async def detail_livre(request, id):
+    fieldset = Fieldset.from_request(request)
+
+    async def construire():
+        # Relations chargees par optimize() : la serialisation ne fait plus de requete
+        livres = fieldset.queryset(TitleSerializer, Title.objects.for_catalog())
+        livre = TitleSerializer(await aget_object_or_404(livres, pk=id), **fieldset.kwargs).data
+        await availability.aremember([(id, livre)])
+        return livre
+
+    livre = await catalog_cache.acached_payload(
+        'book', catalog_cache.book_scopes(fieldset), construire, id, *fieldset.cache_parts()
+    )
+    return reponse_json({'book': await availability.aapply_item(livre, id)})
+
+
+@query_budget(4)
+@async_api_view(['GET'], authenticate=True)
+@conditional_catalog(catalog_cache.AUTHORS, catalog_cache.TITLES, catalog_cache.AVAILABILITY)
+async def liste_auteurs(request):
+    fieldset = Fieldset.from_request(request)
+    rendu = fastpath.plan(AuthorSerializer, fieldset)
+    scopes = [catalog_cache.AUTHORS] + (
+        [catalog_cache.TITLES, catalog_cache.AVAILABILITY] if 'titles' in fieldset.expand else []
+    )
+
+    async def construire():
+        lignes = [ligne async for ligne in rendu.queryset(Author.objects.all())]
+        return await afragments_json('author-json', scopes, rendu, lignes, *fieldset.cache_parts())
+
+    auteurs = await catalog_cache.acached_payload('authors', scopes, construire, *fieldset.cache_parts())
+    return reponse_json({'authors': auteurs})
+
+
+@query_budget(4)
+@async_api_view(['GET'], authenticate=True)
+@conditional_books()
+async def livres_par_auteur(request, au_id):
+    fieldset = Fieldset.from_request(request)
+    serializer_class = fieldset.serializer(TitleSerializer, TitleListSerializer)
+    rendu = fastpath.plan(serializer_class, fieldset)
+    scopes = catalog_cache.book_scopes(fieldset)
+    parts = (serializer_class.__name__, *fieldset.cache_parts())
+
+    async def construire():
+        auteur = await aget_object_or_404(Author, pk=au_id)
+        livres = [ligne async for ligne in rendu.queryset(Title.objects.filter(authors=auteur))]
+        return {
+            'author': AuthorSerializer(auteur).data,
+            'books': await afragments_json('book-json', scopes, rendu, livres, *parts),
+        }
+
+    data = dict(await catalog_cache.acached_payload('author_books', scopes, construire, au_id, *parts))
+    data['books'], = await availability.aapply(data['books'])
+    return reponse_json(data)
+
+
+@query_budget(2)
+@async_api_view(['GET'], authenticate=True)
+@conditional_catalog(catalog_cache.PUBLISHERS)
+async def liste_editeurs(request):
+    fieldset = Fieldset.from_request(request)
+    rendu = fastpath.plan(PublishersSerializer, fieldset)
+
+    async def construire():
+        return await rendu.aserialize(Publishers.objects.all())
+
+    editeurs = await catalog_cache.acached_payload(
+        'publishers', [catalog_cache.PUBLISHERS], construire, *fieldset.cache_parts(),
+    )
+    return reponse_json({'publishers': editeurs})
@@ -0,0 +1,162 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import hashing, revocation
+from .models import User
+
+# Authentification JWT sans base : le jeton porte id, is_staff, is_superuser et une version
+# (compteur par utilisateur, api/revocation.py, incremente pour revoquer ses jetons). request.user est
+# un Principal : ces attributs sans requete, le reste charge User a la demande depuis le cache.
+
+PRINCIPAL_CLAIMS = ('is_staff', 'is_superuser', 'ver')
+
+
+def _user_key(user_id):
+    return f'auth:user-fields:{user_id}'
+
+
+def _cached_fields():
+    # Jamais le hachage du mot de passe dans le cache : champ differe, relu en base si on y accede
+    return [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def token_version(user_id):
+    return revocation.get_store().version(user_id)
+
+
+def bump_token_version(user_id):
+    # Tous les jetons deja emis pour cet utilisateur sont refuses
+    return revocation.get_store().bump(user_id)
+
+
+def cached_user(user_id):
+    key = _user_key(user_id)
+    fields = _cached_fields()
+    values = cache.get(key)
+    if values is None:
+        try:
+            values = User.objects.filter(pk=user_id, is_active=True).values_list(*fields).get()
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        cache.set(key, values, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    return User.from_db(User.objects.db, fields, values)
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class HashingPoolBackend(ModelBackend):
+    # ModelBackend dont la version async ne hache jamais dans la boucle d'evenements : User.acheck_password
+    # passe par le pool de api/hashing.py, et une adresse inconnue y coute un hachage comme un mot de passe faux
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await User._default_manager.aget_by_natural_key(username)
+        except User.DoesNotExist:
+            await hashing.ahash(password)
+            return None
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+class Principal(SimpleLazyObject):
+    # Se comporte comme le User (egalite, filtres ORM, isinstance) ; id / is_staff / is_superuser
+    # sont lus sans charger l'utilisateur
+    def __init__(self, user_id, is_staff, is_superuser, version):
+        super().__init__(lambda: cached_user(user_id))
+        self.__dict__.update(
+            id=user_id, pk=user_id, is_staff=is_staff, is_superuser=is_superuser, token_version=version,
+            is_active=True, is_authenticated=True, is_anonymous=False,
+        )
+
+    def __bool__(self):
+        # IsAuthenticated teste bool(request.user) : sans charger l'utilisateur
+        return True
+
+
+class LibraryRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['ver'] = token_version(user.pk)
+        return token
+
+
+class LibraryTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = LibraryRefreshToken
+
+
+def _user_id(token):
+    try:
+        return User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+    except KeyError:
+        raise AuthenticationFailed("Token contained no recognizable user identification", code="token_not_valid")
+
+
+def _revoked():
+    return AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+def rotate_refresh_token(raw_token):
+    # Un refresh token ne sert qu'une fois : il est revoque (jusqu'a son expiration) et remplace par
+    # un nouveau, aux claims relues sur l'utilisateur. Rejoue, il revoque toutes les sessions du lecteur.
+    token = LibraryRefreshToken(raw_token)
+    user_id = _user_id(token)
+    store = revocation.get_store()
+    version, revoked = store.state(user_id, token[api_settings.JTI_CLAIM])
+    if token.get('ver', 0) != version:
+        raise _revoked()
+    if revoked or not store.revoke(token[api_settings.JTI_CLAIM], revocation.remaining(token)):
+        store.bump(user_id)
+        raise _revoked()
+    return LibraryRefreshToken.for_user(cached_user(user_id))
+
+
+def revoke_token(token):
+    revocation.get_store().revoke(token[api_settings.JTI_CLAIM], revocation.remaining(token))
+
+
+class PrincipalJWTAuthentication(JWTAuthentication):
+    def _principal(self, validated_token, user_id, version, revoked):
+        if revoked or validated_token.get('ver', 0) != version:
+            raise _revoked()
+        if any(claim not in validated_token for claim in PRINCIPAL_CLAIMS):
+            # Jeton emis avant l'ajout des claims : chargement classique depuis la base
+            return None
+        return Principal(user_id, validated_token['is_staff'], validated_token['is_superuser'], version)
+
+    def get_user(self, validated_token):
+        user_id = _user_id(validated_token)
+        # Jeton revoque (deconnexion) ou version depassee : une seule lecture du stockage de revocation
+        version, revoked = revocation.get_store().state(user_id, validated_token.get(api_settings.JTI_CLAIM))
+        principal = self._principal(validated_token, user_id, version, revoked)
+        return principal if principal is not None else super().get_user(validated_token)
+
+    async def aauthenticate(self, request):
+        # Vues async (api/async_views.py) : memes controles, stockage de revocation lu sans thread
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user_id = _user_id(validated_token)
+        version, revoked = await revocation.get_store().astate(user_id, validated_token.get(api_settings.JTI_CLAIM))
+        principal = self._principal(validated_token, user_id, version, revoked)
+        if principal is None:
+            principal = await sync_to_async(super().get_user)(validated_token)
+        return principal, validated_token
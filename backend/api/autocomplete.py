@@ -0,0 +1,275 @@
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Count
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Author, Title
+
+# Index de prefixes pour l'autocompletion : chaque prefixe (du libelle complet et de chaque mot)
+# pointe vers un ensemble trie par popularite. Un membre est auto-suffisant
+# ("t:<id>:<libelle>") pour qu'une suggestion ne coute qu'une seule lecture.
+
+TITLE = 't'
+AUTHOR = 'a'
+KINDS = {TITLE: 'title', AUTHOR: 'author'}
+
+
+def _setting(name, default):
+    return getattr(settings, 'AUTOCOMPLETE', {}).get(name, default)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def prefixes(label):
+    max_length = _setting('MAX_PREFIX_LENGTH', 15)
+    normalized = normalize(label)
+    words = normalized.split()
+    result = set()
+    for i in range(len(words)):
+        suffix = ' '.join(words[i:])
+        result.update(suffix[:n] for n in range(1, min(len(suffix), max_length) + 1))
+    return result
+
+
+def score_prefix(label):
+    # Prefixe le plus long : celui qui a le moins de chances d'avoir ete elague
+    return normalize(label)[:_setting('MAX_PREFIX_LENGTH', 15)]
+
+
+def label_of(member):
+    return member.split(':', 2)[2]
+
+
+def encode(kind, pk, label):
+    return f'{kind}:{pk}:{label}'
+
+
+def decode(member):
+    kind, pk, label = member.split(':', 2)
+    return {'type': KINDS[kind], 'id': int(pk), 'label': label}
+
+
+class MemoryPrefixIndex:
+    # Index en memoire du processus : developpement et tests
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._prefixes = {}
+            self._members = {}
+
+    def add(self, kind, pk, label, score=None):
+        member = encode(kind, pk, label)
+        with self._lock:
+            previous = self._members.get((kind, pk))
+            if score is None:
+                score = self._score(previous) if previous else 0
+            if previous:
+                self._discard(previous)
+            self._members[(kind, pk)] = member
+            for prefix in prefixes(label):
+                self._prefixes.setdefault(prefix, {})[member] = score
+
+    def bulk_add(self, entries):
+        for kind, pk, label, score in entries:
+            self.add(kind, pk, label, score)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            member = self._members.pop((kind, pk), None)
+            if member:
+                self._discard(member)
+
+    def prune(self, keep):
+        with self._lock:
+            stale = [key for key in self._members if key not in keep]
+        for kind, pk in stale:
+            self.remove(kind, pk)
+        return len(stale)
+
+    def incr(self, kind, pk, amount=1):
+        self.incr_many([(kind, pk)], amount)
+
+    def incr_many(self, keys, amount=1):
+        with self._lock:
+            for kind, pk in keys:
+                member = self._members.get((kind, pk))
+                if member is None:
+                    continue
+                for prefix in prefixes(label_of(member)):
+                    scores = self._prefixes[prefix]
+                    scores[member] = scores.get(member, 0) + amount
+
+    def suggest(self, prefix, limit):
+        with self._lock:
+            scores = list(self._prefixes.get(normalize(prefix), {}).items())
+        ranked = sorted(scores, key=lambda item: (-item[1], item[0]))
+        return [decode(member) for member, _ in ranked[:limit]]
+
+    def _score(self, member):
+        return self._prefixes.get(score_prefix(label_of(member)), {}).get(member, 0)
+
+    def _discard(self, member):
+        for prefix in prefixes(label_of(member)):
+            scores = self._prefixes.get(prefix)
+            if scores is not None:
+                scores.pop(member, None)
+                if not scores:
+                    del self._prefixes[prefix]
+
+
+class RedisPrefixIndex:
+    # Un sorted set Redis par prefixe, une table de hachage id -> membre pour les mises a jour
+    KEY_PREFIX = 'autocomplete:p:'
+    MEMBERS_KEY = 'autocomplete:members'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection(_setting('CACHE_ALIAS', 'default'))
+        self.max_per_prefix = _setting('MAX_PER_PREFIX', 50)
+
+    def _key(self, prefix):
+        return f'{self.KEY_PREFIX}{prefix}'
+
+    def clear(self):
+        keys = list(self.redis.scan_iter(match=f'{self.KEY_PREFIX}*', count=1000))
+        keys.append(self.MEMBERS_KEY)
+        for i in range(0, len(keys), 1000):
+            self.redis.unlink(*keys[i:i + 1000])
+
+    def _previous(self, kind, pk):
+        previous = self.redis.hget(self.MEMBERS_KEY, f'{kind}:{pk}')
+        return previous.decode() if previous else None
+
+    def _write(self, pipe, kind, pk, label, score):
+        member = encode(kind, pk, label)
+        pipe.hset(self.MEMBERS_KEY, f'{kind}:{pk}', member)
+        for prefix in prefixes(label):
+            key = self._key(prefix)
+            pipe.zadd(key, {member: score})
+            pipe.zremrangebyrank(key, 0, -(self.max_per_prefix + 1))
+
+    def add(self, kind, pk, label, score=None):
+        previous = self._previous(kind, pk)
+        if score is None:
+            score = 0
+            if previous:
+                key = self._key(score_prefix(label_of(previous)))
+                score = self.redis.zscore(key, previous) or 0
+        pipe = self.redis.pipeline(transaction=False)
+        if previous:
+            self._discard(pipe, previous)
+        self._write(pipe, kind, pk, label, score)
+        pipe.execute()
+
+    def bulk_add(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        # Libelle modifie : anciens prefixes retires dans le meme pipeline
+        previous = self.redis.hmget(self.MEMBERS_KEY, [f'{kind}:{pk}' for kind, pk, _, _ in entries])
+        pipe = self.redis.pipeline(transaction=False)
+        for (kind, pk, label, score), member in zip(entries, previous):
+            if member and member.decode() != encode(kind, pk, label):
+                self._discard(pipe, member.decode())
+            self._write(pipe, kind, pk, label, score)
+        pipe.execute()
+
+    def remove(self, kind, pk):
+        previous = self._previous(kind, pk)
+        if previous is None:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        self._discard(pipe, previous)
+        pipe.hdel(self.MEMBERS_KEY, f'{kind}:{pk}')
+        pipe.execute()
+
+    def prune(self, keep, chunk_size=1000):
+        keep = {f'{kind}:{pk}' for kind, pk in keep}
+        stale = {}
+        for field, member in self.redis.hscan_iter(self.MEMBERS_KEY, count=chunk_size):
+            if field.decode() not in keep:
+                stale[field.decode()] = member.decode()
+        fields = list(stale)
+        for i in range(0, len(fields), chunk_size):
+            pipe = self.redis.pipeline(transaction=False)
+            for field in fields[i:i + chunk_size]:
+                self._discard(pipe, stale[field])
+                pipe.hdel(self.MEMBERS_KEY, field)
+            pipe.execute()
+        return len(fields)
+
+    def incr(self, kind, pk, amount=1):
+        self.incr_many([(kind, pk)], amount)
+
+    def incr_many(self, keys, amount=1):
+        # Un titre et ses auteurs : une lecture des membres, un seul pipeline. ZADD XX INCR : seuls les
+        # prefixes ou le membre est encore classe sont incrementes, un membre elague (max_per_prefix)
+        # n'y revient pas et l'ensemble reste borne
+        keys = list(keys)
+        if not keys:
+            return
+        members = self.redis.hmget(self.MEMBERS_KEY, [f'{kind}:{pk}' for kind, pk in keys])
+        pipe = self.redis.pipeline(transaction=False)
+        for member in filter(None, members):
+            member = member.decode()
+            for prefix in prefixes(label_of(member)):
+                pipe.zadd(self._key(prefix), {member: amount}, xx=True, incr=True)
+        pipe.execute()
+
+    def suggest(self, prefix, limit):
+        members = self.redis.zrevrange(self._key(normalize(prefix)), 0, limit - 1)
+        return [decode(member.decode()) for member in members]
+
+    def _discard(self, pipe, member):
+        for prefix in prefixes(label_of(member)):
+            pipe.zrem(self._key(prefix), member)
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = import_string(_setting('BACKEND', 'api.autocomplete.MemoryPrefixIndex'))()
+    return _index
+
+
+@receiver(setting_changed)
+def _reset_index(setting, **kwargs):
+    global _index
+    if setting == 'AUTOCOMPLETE':
+        _index = None
+
+
+def rebuild(chunk_size=2000):
+    # Sans vider l'index : les suggestions restent servies pendant la reconstruction. Chaque membre est
+    # reecrit en place (libelle et popularite), puis ceux dont l'objet n'existe plus sont retires.
+    index = get_index()
+    seen = set()
+    count = 0
+    titres = Title.objects.annotate(popularite=Count('reservations')).values_list('pk', 'title', 'popularite')
+    auteurs = Author.objects.annotate(popularite=Count('titles__reservations')).values_list('pk', 'author', 'popularite')
+    for kind, queryset in ((TITLE, titres), (AUTHOR, auteurs)):
+        batch = []
+        for pk, label, popularite in queryset.order_by().iterator(chunk_size=chunk_size):
+            batch.append((kind, pk, label, popularite))
+            seen.add((kind, pk))
+            if len(batch) >= chunk_size:
+                index.bulk_add(batch)
+                count += len(batch)
+                batch = []
+        index.bulk_add(batch)
+        count += len(batch)
+    index.prune(seen)
+    return count
@@ -0,0 +1,133 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import async_cache, catalog_cache, renderers
+from .models import Title
+
+# Disponibilite des titres (total_copies, available_count) hors des payloads du catalogue : une
+# reservation ne touche que ces deux compteurs, elle n'invalide donc plus la generation TITLES (toutes
+# les pages et tous les fragments) mais une entree par titre. Fragments et payloads en cache gardent
+# les valeurs de leur construction, remplacees au moment de repondre par celles de ce cache.
+# Le scope AVAILABILITY ne sert qu'aux ETag / Last-Modified (api/conditional.py).
+
+FIELDS = ('total_copies', 'available_count')
+KEY = 'catalog:availability:{pk}'
+# Cles de premier niveau d'un fragment de livre : les objets imbriques (auteurs, editeur) n'en ont pas,
+# et dans une chaine JSON le guillemet fermant serait echappe
+PATTERN = re.compile(rb'"(total_copies|available_count)":-?\d+')
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE', {}).get('TIMEOUT', 300)
+
+
+def invalidate(*title_ids):
+    # Immediatement, puis au commit (relecture concurrente de valeurs pas encore committees)
+    keys = [KEY.format(pk=pk) for pk in title_ids]
+    catalog_cache.bump_generation(catalog_cache.AVAILABILITY)
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _seeds(items):
+    # Valeurs lues a l'instant par le builder d'un fragment : pas de requete au prochain affichage
+    return {
+        KEY.format(pk=pk): [item[field] for field in FIELDS]
+        for pk, item in items if all(field in item for field in FIELDS)
+    }
+
+
+def remember(items):
+    seeds = _seeds(items)
+    if seeds:
+        cache.set_many(seeds, _timeout())
+
+
+async def aremember(items):
+    seeds = _seeds(items)
+    if seeds:
+        await async_cache.get_cache().set_many(seeds, _timeout())
+
+
+def _queryset(ids):
+    return Title.objects.filter(pk__in=ids).values_list('pk', *FIELDS)
+
+
+def counts(ids):
+    keys = {pk: KEY.format(pk=pk) for pk in ids}
+    found = cache.get_many(list(keys.values()))
+    valeurs = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in ids if pk not in valeurs]
+    if missing:
+        charges = {pk: [total, available] for pk, total, available in _queryset(missing)}
+        cache.set_many({keys[pk]: valeur for pk, valeur in charges.items()}, _timeout())
+        valeurs.update(charges)
+    return valeurs
+
+
+async def acounts(ids):
+    acache = async_cache.get_cache()
+    keys = {pk: KEY.format(pk=pk) for pk in ids}
+    found = await acache.get_many(list(keys.values()))
+    valeurs = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in ids if pk not in valeurs]
+    if missing:
+        charges = {pk: [total, available] async for pk, total, available in _queryset(missing)}
+        await acache.set_many({keys[pk]: valeur for pk, valeur in charges.items()}, _timeout())
+        valeurs.update(charges)
+    return valeurs
+
+
+def _cibles(listes):
+    return sorted({
+        fragment.pk for fragments in listes for fragment in fragments
+        if fragment.pk is not None and PATTERN.search(fragment.data)
+    })
+
+
+def _remplacer(fragment, valeurs):
+    if fragment.pk not in valeurs:
+        return fragment
+    courant = dict(zip(FIELDS, valeurs[fragment.pk]))
+    data = PATTERN.sub(lambda match: b'"%s":%d' % (match.group(1), courant[match.group(1).decode()]), fragment.data)
+    return renderers.Fragment(data, fragment.pk)
+
+
+def _appliquer(listes, valeurs):
+    return [[_remplacer(fragment, valeurs) for fragment in fragments] for fragments in listes]
+
+
+def apply(*listes):
+    # Listes de fragments de livres -> memes listes, compteurs a jour (une lecture pour toutes)
+    ids = _cibles(listes)
+    return _appliquer(listes, counts(ids) if ids else {})
+
+
+async def aapply(*listes):
+    ids = _cibles(listes)
+    return _appliquer(listes, await acounts(ids) if ids else {})
+
+
+def _item(data, pk, valeurs):
+    presents = [field for field in FIELDS if field in data]
+    if not presents or pk not in valeurs:
+        return data
+    data = dict(data)
+    data.update({field: valeur for field, valeur in zip(FIELDS, valeurs[pk]) if field in presents})
+    return data
+
+
+def apply_item(data, pk):
+    # Payload d'un livre (dict) : compteurs remplaces, ordre des cles conserve
+    if not any(field in data for field in FIELDS):
+        return data
+    return _item(data, pk, counts([pk]))
+
+
+async def aapply_item(data, pk):
+    if not any(field in data for field in FIELDS):
+        return data
+    return _item(data, pk, await acounts([pk]))
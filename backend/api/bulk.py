@@ -0,0 +1,146 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import catalog_cache
+
+
+def _item_errors(errors):
+    # ListSerializer.errors : liste alignee sur les items, ou dict {index: erreurs}
+    items = errors.items() if isinstance(errors, dict) else enumerate(errors)
+    return {'errors': [{'index': i, 'errors': e} for i, e in sorted(items) if e]}
+
+
+def _batch_duplicates(model, rows):
+    # UniqueValidator ne compare qu'aux lignes deja en base : doublons a l'interieur du lot,
+    # signales sur chaque item qui reprend la valeur d'un item precedent. rows : [(index, donnees)]
+    errors = {}
+    for field in model._meta.concrete_fields:
+        if not field.unique or field.primary_key:
+            continue
+        vus = {}
+        for i, data in rows:
+            value = data.get(field.name)
+            if value is None:
+                continue
+            if value in vus:
+                errors.setdefault(i, {})[field.name] = [f"Duplicate value in this batch (item {vus[value]})."]
+            else:
+                vus[value] = i
+    return errors
+
+
+class BulkActionsMixin:
+    # POST /<ressource>/bulk/ : liste d'objets a creer
+    # PATCH /<ressource>/bulk/ : liste d'objets portant leur cle primaire, champs modifies seulement
+    # DELETE /<ressource>/bulk/ : liste de cles primaires
+    # Tout est valide avant d'ecrire ; l'ecriture se fait en une transaction (bulk_create /
+    # bulk_update) et le cache du catalogue n'est invalide qu'une fois.
+    bulk_max_items = 1000
+    bulk_batch_size = 500
+    bulk_cache_scopes = ()
+
+    def bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError("Expected a non-empty list of items.")
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(f"At most {self.bulk_max_items} items per request.")
+        return items
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        items = self.bulk_items(request)
+        try:
+            with transaction.atomic(), catalog_cache.batched():
+                if request.method == 'POST':
+                    return self.bulk_create(items)
+                if request.method == 'PATCH':
+                    return self.bulk_update(items)
+                return self.bulk_destroy(items)
+        except IntegrityError:
+            # Le detail de la base (contraintes, valeurs) n'est pas renvoye au client
+            raise ValidationError("Bulk write rejected by the database.")
+
+    def bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(_item_errors(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+        doublons = _batch_duplicates(self.get_queryset().model, enumerate(serializer.validated_data))
+        if doublons:
+            return Response(_item_errors(doublons), status=status.HTTP_400_BAD_REQUEST)
+        instances = [self.build_instance(dict(data)) for data in serializer.validated_data]
+        self.get_queryset().model.objects.bulk_create(instances, batch_size=self.bulk_batch_size)
+        self.after_bulk_create(instances, serializer.validated_data)
+        return self.bulk_response(instances, status.HTTP_201_CREATED)
+
+    def bulk_update(self, items):
+        model = self.get_queryset().model
+        pk_name = model._meta.pk.name
+        ids = [item.get(pk_name) if isinstance(item, dict) else None for item in items]
+        instances = model.objects.in_bulk([pk for pk in ids if pk is not None])
+
+        has_updated_at = any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+        maintenant = timezone.now()
+        errors, changes, fields, modifies = [], [], set(), []
+        for i, (pk, item) in enumerate(zip(ids, items)):
+            instance = instances.get(pk)
+            if instance is None:
+                errors.append({pk_name: [f"Unknown {pk_name} {pk!r}."]})
+                continue
+            serializer = self.get_serializer(instance, data=item, partial=True)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            errors.append({})
+            data = dict(serializer.validated_data)
+            self.clean_update(data)
+            if has_updated_at:
+                # bulk_update ne passe pas par auto_now
+                data['updated_at'] = maintenant
+            for field, value in data.items():
+                setattr(instance, field, value)
+            fields.update(data)
+            changes.append((instance, data))
+            modifies.append((i, data))
+        if any(errors):
+            return Response(_item_errors(errors), status=status.HTTP_400_BAD_REQUEST)
+        doublons = _batch_duplicates(model, modifies)
+        if doublons:
+            return Response(_item_errors(doublons), status=status.HTTP_400_BAD_REQUEST)
+
+        updated = list({instance.pk: instance for instance, _ in changes}.values())
+        if fields:
+            model.objects.bulk_update(updated, sorted(fields), batch_size=self.bulk_batch_size)
+        self.after_bulk_update(changes, fields)
+        return self.bulk_response(updated, status.HTTP_200_OK)
+
+    def bulk_destroy(self, items):
+        model = self.get_queryset().model
+        try:
+            ids = [int(pk) for pk in items]
+        except (TypeError, ValueError):
+            raise ValidationError("Expected a list of primary keys.")
+        _, deleted = model.objects.filter(pk__in=ids).delete()
+        return Response({'deleted': deleted.get(model._meta.label, 0)}, status=status.HTTP_200_OK)
+
+    def bulk_response(self, instances, code):
+        rows = self.get_queryset().filter(pk__in=[instance.pk for instance in instances]).order_by('pk')
+        return Response(self.get_serializer(rows, many=True).data, status=code)
+
+    # Points d'extension : effets de bord que les signaux ne declenchent pas en masse
+
+    def build_instance(self, data):
+        return self.get_queryset().model(**data)
+
+    def clean_update(self, data):
+        pass
+
+    def after_bulk_create(self, instances, validated_data):
+        catalog_cache.bump_generation(*self.bulk_cache_scopes)
+
+    def after_bulk_update(self, changes, fields):
+        catalog_cache.bump_generation(*self.bulk_cache_scopes)
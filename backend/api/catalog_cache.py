@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import async_cache
+from .instrumentation import record_cache
+
+# Cache du catalogue : on stocke des payloads serialises (jamais des QuerySets) sous des cles
+# qui embarquent un compteur de generation par modele. Une ecriture incremente le compteur,
+# les anciennes cles deviennent donc inaccessibles immediatement.
+
+TITLES = 'title'
+AUTHORS = 'author'
+PUBLISHERS = 'publisher'
+# Compteurs de disponibilite (api/availability.py) : ETag et Last-Modified seulement, hors des cles
+AVAILABILITY = 'availability'
+
+# Payloads de livres : auteurs toujours imbriques, editeur seulement sur ?expand=pubid
+# (Fieldset.scopes, api/fieldsets.py)
+BOOK_SCOPES = (TITLES, AUTHORS)
+BOOK_EXPAND_SCOPES = {'pubid': PUBLISHERS}
+
+
+def book_scopes(fieldset):
+    return fieldset.scopes(BOOK_SCOPES, BOOK_EXPAND_SCOPES)
+
+GENERATION_KEY = 'catalog:gen:{scope}'
+# Date de la derniere incrementation : sert d'en-tete Last-Modified (api/conditional.py)
+MODIFIED_KEY = 'catalog:gen:{scope}:at'
+LOCK_KEY = '{key}:lock'
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def _initial_generation():
+    # Si un compteur est evince, on ne repart jamais d'une valeur deja utilisee
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    keys = {scope: GENERATION_KEY.format(scope=scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            cache.add(key, _initial_generation(), None)
+            generation = cache.get(key)
+        generations[scope] = generation
+    return generations
+
+
+def last_modified(*scopes):
+    keys = [MODIFIED_KEY.format(scope=scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Date inconnue (eviction) : on la fixe a maintenant, les clients revalideront
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return max(found.values())
+
+
+def _bump(scopes):
+    now = time.time()
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    cache.set_many({MODIFIED_KEY.format(scope=scope): now for scope in scopes}, None)
+
+
+_local = threading.local()
+
+
+def bump_generation(*scopes):
+    # Invalidation immediate, puis a nouveau au commit pour ecarter une reconstruction
+    # concurrente faite a partir de donnees pas encore committees.
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.update(scopes)
+        return
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+@contextmanager
+def batched():
+    # Ecritures en masse : les invalidations (signaux compris) sont regroupees et chaque
+    # scope n'est incremente qu'une fois, a la sortie du bloc.
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = set()
+    try:
+        yield
+    finally:
+        scopes, _local.pending = _local.pending, None
+        if scopes:
+            bump_generation(*sorted(scopes))
+
+
+def _key(name, scopes, generations, parts):
+    stamp = '.'.join(f'{scope}{generations[scope]}' for scope in scopes)
+    key = f'catalog:{name}:{stamp}'
+    if parts:
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+        key = f'{key}:{digest}'
+    return key
+
+
+def catalog_key(name, scopes, *parts):
+    return _key(name, scopes, get_generations(*scopes), parts)
+
+
+def get_or_build(key, builder, timeout=None):
+    # Verrou single-flight + stale-while-revalidate : l'entree survit STALE_TTL secondes a son
+    # expiration logique, pendant lesquelles un seul appelant reconstruit et les autres
+    # servent la valeur perimee.
+    timeout = timeout or _setting('TIMEOUT', 300)
+    stale_ttl = _setting('STALE_TTL', 60)
+    lock_timeout = _setting('LOCK_TIMEOUT', 10)
+    lock_key = LOCK_KEY.format(key=key)
+
+    entry = cache.get(key)
+    if entry is not None:
+        if entry['expires_at'] > time.time():
+            record_cache(hits=1)
+            return entry['value']
+        if not cache.add(lock_key, 1, lock_timeout):
+            record_cache(hits=1)
+            return entry['value']
+    record_cache(misses=1)
+    if entry is None and not cache.add(lock_key, 1, lock_timeout):
+        # Reconstruction deja en cours ailleurs : on attend brievement son resultat
+        deadline = time.monotonic() + _setting('WAIT_TIMEOUT', 0.5)
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        return builder()
+
+    try:
+        value = builder()
+        cache.set(key, {'value': value, 'expires_at': time.time() + timeout}, timeout + stale_ttl)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def cached_payload(name, scopes, builder, *parts, timeout=None):
+    return get_or_build(catalog_key(name, scopes, *parts), builder, timeout)
+
+
+def cached_fragments(name, scopes, ids, builder, *parts, timeout=None):
+    # Une entree par objet (JSON pre-encode) : un get_many pour la page, builder(ids manquants)
+    # -> {id: valeur} pour le reste. Les entrees servent a toutes les pages et URLs qui les contiennent.
+    # Renvoie {id: valeur} dans l'ordre de ids.
+    prefix = catalog_key(name, scopes, *parts)
+    keys = {pk: f'{prefix}:{pk}' for pk in ids}
+    found = cache.get_many(list(keys.values()))
+    missing = [pk for pk in ids if keys[pk] not in found]
+    record_cache(hits=len(ids) - len(missing), misses=len(missing))
+    if missing:
+        built = {keys[pk]: value for pk, value in builder(missing).items()}
+        cache.set_many(built, timeout or _setting('TIMEOUT', 300))
+        found.update(built)
+    return {pk: found[keys[pk]] for pk in ids if keys[pk] in found}
+
+
+# Pendants async (vues ASGI, api/async_views.py) : memes cles et memes entrees, cache lu par
+# api/async_cache.py ; builder est une coroutine
+
+
+async def aget_generations(*scopes):
+    acache = async_cache.get_cache()
+    keys = {scope: GENERATION_KEY.format(scope=scope) for scope in scopes}
+    found = await acache.get_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            await acache.add(key, _initial_generation(), None)
+            generation = await acache.get(key)
+        generations[scope] = generation
+    return generations
+
+
+async def alast_modified(*scopes):
+    acache = async_cache.get_cache()
+    keys = [MODIFIED_KEY.format(scope=scope) for scope in scopes]
+    found = await acache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            await acache.add(key, time.time(), None)
+            found[key] = await acache.get(key)
+    return max(found.values())
+
+
+async def acatalog_key(name, scopes, *parts):
+    return _key(name, scopes, await aget_generations(*scopes), parts)
+
+
+async def aget_or_build(key, builder, timeout=None):
+    acache = async_cache.get_cache()
+    timeout = timeout or _setting('TIMEOUT', 300)
+    stale_ttl = _setting('STALE_TTL', 60)
+    lock_timeout = _setting('LOCK_TIMEOUT', 10)
+    lock_key = LOCK_KEY.format(key=key)
+
+    entry = await acache.get(key)
+    if entry is not None:
+        if entry['expires_at'] > time.time():
+            record_cache(hits=1)
+            return entry['value']
+        if not await acache.add(lock_key, 1, lock_timeout):
+            record_cache(hits=1)
+            return entry['value']
+    record_cache(misses=1)
+    if entry is None and not await acache.add(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + _setting('WAIT_TIMEOUT', 0.5)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            entry = await acache.get(key)
+            if entry is not None:
+                return entry['value']
+        return await builder()
+
+    try:
+        value = await builder()
+        await acache.set(key, {'value': value, 'expires_at': time.time() + timeout}, timeout + stale_ttl)
+        return value
+    finally:
+        await acache.delete(lock_key)
+
+
+async def acached_payload(name, scopes, builder, *parts, timeout=None):
+    return await aget_or_build(await acatalog_key(name, scopes, *parts), builder, timeout)
+
+
+async def acached_fragments(name, scopes, ids, builder, *parts, timeout=None):
+    acache = async_cache.get_cache()
+    prefix = await acatalog_key(name, scopes, *parts)
+    keys = {pk: f'{prefix}:{pk}' for pk in ids}
+    found = await acache.get_many(list(keys.values()))
+    missing = [pk for pk in ids if keys[pk] not in found]
+    record_cache(hits=len(ids) - len(missing), misses=len(missing))
+    if missing:
+        built = {keys[pk]: value for pk, value in (await builder(missing)).items()}
+        await acache.set_many(built, timeout or _setting('TIMEOUT', 300))
+        found.update(built)
+    return {pk: found[keys[pk]] for pk in ids if keys[pk] in found}
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import catalog_cache
+from .fieldsets import Fieldset
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def _etag(request, scopes, generations, user_id):
+    stamp = ':'.join(f'{scope}{generations[scope]}' for scope in scopes)
+    digest = hashlib.md5(f'{stamp}:{request.get_full_path()}:{user_id or ""}'.encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def catalog_etag(request, scopes, user_id=None):
+    # Derive des compteurs de generation : aucune requete SQL, change a chaque ecriture
+    return _etag(request, scopes, catalog_cache.get_generations(*scopes), user_id)
+
+
+async def acatalog_etag(request, scopes, user_id=None):
+    return _etag(request, scopes, await catalog_cache.aget_generations(*scopes), user_id)
+
+
+def _cache_headers(response, etag, modified, private):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    if private:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=_setting('HTTP_MAX_AGE', 60),
+            s_maxage=_setting('HTTP_S_MAXAGE', 300),
+            stale_while_revalidate=_setting('HTTP_STALE_WHILE_REVALIDATE', 60),
+        )
+    return response
+
+
+def conditional_catalog(*scopes, per_user=False, expand_scopes=None):
+    # GET conditionnel (If-None-Match / If-Modified-Since) : le 304 est renvoye avant
+    # d'appeler la vue, donc sans cache applicatif ni serialiseur.
+    # per_user : la reponse depend de l'utilisateur connecte (cache prive, Vary: Authorization).
+    # expand_scopes : {nom ?expand=: scope} des objets imbriques a la demande (memes scopes que la vue).
+    # Vues async (api/async_views.py) : compteurs lus par le cache async, request.user deja authentifie.
+    def decorator(view):
+        def portee(request):
+            if not expand_scopes:
+                return scopes
+            return Fieldset.from_request(request).scopes(scopes, expand_scopes)
+
+        def finir(response, etag, modified, user_id):
+            if per_user:
+                patch_vary_headers(response, ['Authorization'])
+            return _cache_headers(response, etag, modified, user_id is not None)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapper(request, *args, **kwargs):
+                user_id = request.user.pk if per_user and request.user.is_authenticated else None
+                portees = portee(request)
+                # Deux lectures independantes du cache, en parallele
+                etag, modified = await asyncio.gather(
+                    acatalog_etag(request, portees, user_id), catalog_cache.alast_modified(*portees)
+                )
+                modified = int(modified)
+
+                response = get_conditional_response(request, etag=etag, last_modified=modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return finir(response, etag, modified, user_id)
+            return awrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user_id = request.user.pk if per_user and request.user.is_authenticated else None
+            portees = portee(request)
+            etag = catalog_etag(request, portees, user_id)
+            modified = int(catalog_cache.last_modified(*portees))
+
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return finir(response, etag, modified, user_id)
+        return wrapper
+    return decorator
+
+
+def conditional_books(per_user=False):
+    # Payloads de livres (liste, detail, livres d'un auteur) : memes scopes que catalog_cache.book_scopes
+    return conditional_catalog(
+        *catalog_cache.BOOK_SCOPES, catalog_cache.AVAILABILITY,
+        per_user=per_user, expand_scopes=catalog_cache.BOOK_EXPAND_SCOPES,
+    )
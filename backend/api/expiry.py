@@ -0,0 +1,98 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from . import availability, metrics, services
+from .models import Hold, Reservation, Title, User
+
+logger = logging.getLogger(__name__)
+
+
+def _delta_par_ligne(counts):
+    # Un seul UPDATE pour tout le lot : CASE pk WHEN ... THEN n
+    return Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in counts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _expire_batch(ids):
+    with transaction.atomic():
+        rows = list(
+            Reservation.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=ids, status=Reservation.Status.RESERVED)
+            .values_list('pk', 'user_id', 'book_id')
+        )
+        if not rows:
+            return []
+        Reservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(status=Reservation.Status.EXPIRED)
+
+        par_utilisateur = Counter(user_id for _, user_id, _ in rows)
+        par_livre = Counter(book_id for _, _, book_id in rows)
+        User.objects.filter(pk__in=par_utilisateur).update(
+            active_reservations=Greatest(F('active_reservations') - _delta_par_ligne(par_utilisateur), 0)
+        )
+        Title.objects.filter(pk__in=par_livre).update(
+            available_count=Least(F('available_count') + _delta_par_ligne(par_livre), F('total_copies'))
+        )
+
+        en_attente = (
+            Hold.objects.filter(book_id__in=par_livre, status=Hold.Status.WAITING)
+            .values_list('book_id', flat=True).distinct()
+        )
+        for book_id in en_attente:
+            services.promote_waitlist(book_id)
+    return rows
+
+
+def expire_overdue_reservations(batch_size=None, now=None):
+    # Parcours par curseur sur l'id : chaque lot est une transaction courte et les lignes
+    # deja verrouillees par une transition concurrente sont sautees (SKIP LOCKED).
+    batch_size = batch_size or getattr(settings, 'EXPIRY_BATCH_SIZE', 500)
+    now = now or timezone.now()
+    start = time.perf_counter()
+    expired = 0
+    last_id = 0
+    livres = set()
+
+    while True:
+        ids = list(
+            Reservation.objects.filter(
+                status=Reservation.Status.RESERVED, expires_at__lte=now, pk__gt=last_id
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        rows = _expire_batch(ids)
+        if not rows:
+            continue
+        expired += len(rows)
+        livres.update(book_id for _, _, book_id in rows)
+        cache.delete_many({key for _, user_id, _ in rows for key in services.user_reservation_keys(user_id)})
+
+    if livres:
+        availability.invalidate(*livres)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'expired': expired,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(expired / elapsed, 1) if elapsed else 0.0,
+    }
+    # Debit visible sur /metrics (le worker et la commande sont hors requete : envoi immediat)
+    metrics.inc(metrics.EXPIRED, amount=expired)
+    metrics.observe(metrics.EXPIRY_DURATION, elapsed)
+    metrics.get_registry().flush()
+    logger.info(
+        'reservations expired: %(expired)d in %(seconds)ss (%(rows_per_second)s rows/s)', stats, extra=stats
+    )
+    return stats
@@ -0,0 +1,103 @@
+import csv
+import io
+import zlib
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Title
+
+# Memes colonnes que l'import (api/importer.py) : un export se reimporte tel quel
+FIELDS = [
+    'title_id', 'isbn', 'title', 'year_published', 'pubid', 'description', 'notes', 'subject',
+    'comments', 'updated_at',
+]
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_since(value):
+    # Date ISO 8601 (2024-05-01) ou horodatage (2024-05-01T12:00:00Z)
+    moment = parse_datetime(value)
+    if moment is None and parse_date(value) is not None:
+        moment = parse_datetime(f'{value}T00:00:00')
+    if moment is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def iter_catalog(updated_since=None, chunk_size=2000):
+    # Curseur serveur (iterator) sur les colonnes seules, auteurs charges une fois par paquet
+    queryset = Title.objects.order_by('pk')
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    rows = queryset.values_list(*[('pubid_id' if f == 'pubid' else f) for f in FIELDS]).iterator(
+        chunk_size=chunk_size
+    )
+    Through = Title.authors.through
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        authors = {}
+        liens = (
+            Through.objects.filter(title_id__in=[row[0] for row in chunk])
+            # Meme ordre que les auteurs imbriques de l'API (api/fieldsets.py, api/fastpath.py)
+            .order_by('author_id')
+            .values_list('title_id', 'author__author', 'author__year_born')
+        )
+        for title_id, name, year in liens:
+            authors.setdefault(title_id, []).append({'author': name, 'year_born': year})
+        for row in chunk:
+            record = dict(zip(FIELDS, row))
+            record['authors'] = authors.get(row[0], [])
+            yield record
+
+
+def jsonl_lines(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+def csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS + ['authors'])
+    for record in records:
+        writer.writerow(
+            [record[f].isoformat() if f == 'updated_at' else record[f] for f in FIELDS]
+            + ['|'.join(f"{a['author']}:{a['year_born']}" for a in record['authors'])]
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def render(records, fmt):
+    return csv_lines(records) if fmt == 'csv' else jsonl_lines(records)
+
+
+def encode(lines, flush_every=500):
+    # Regroupe les lignes en blocs d'octets : moins d'appels d'ecriture sur la socket
+    bloc = []
+    for line in lines:
+        bloc.append(line)
+        if len(bloc) >= flush_every:
+            yield ''.join(bloc).encode()
+            bloc = []
+    if bloc:
+        yield ''.join(bloc).encode()
+
+
+def gzip_stream(chunks):
+    # Flux gzip (wbits=31) vide a chaque bloc pour que le client recoive les donnees au fil de l'eau
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
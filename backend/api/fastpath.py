@@ -0,0 +1,226 @@
+from functools import lru_cache
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField, ManyToManyRel
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .instrumentation import timed
+
+# Rendu des listes en lecture seule a partir de lignes values() : memes cles, memes valeurs et
+# meme ordre que les serialiseurs DRF (prouve par SerializerParityTests), sans instancier de
+# modeles ni parcourir les champs DRF objet par objet. Les relations M2M imbriquees sont
+# chargees par une seule requete groupee sur la table de liaison.
+#
+# Un serialiseur non pris en charge (champ calcule, source pointee, relation non PK...) retombe
+# sur le rendu DRF, derriere la meme interface queryset() / render().
+
+# Valeurs renvoyees telles quelles par la base : to_representation() serait l'identite
+PASSTHROUGH = (
+    serializers.BooleanField, serializers.CharField, serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _ordering(model, prefix=''):
+    # Meme ordre que le Prefetch de SparseFieldsMixin.optimize()
+    ordering = model._meta.ordering or ['pk']
+    return [f'-{prefix}{o[1:]}' if o.startswith('-') else f'{prefix}{o}' for o in ordering]
+
+
+def _iso_datetime(field):
+    # DateTimeField.to_representation sans relire le fuseau courant a chaque valeur
+    def convertir(value, tz):
+        if tz is None or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convertir
+
+
+class RowPlan:
+    def __init__(self, serializer, prefix=''):
+        model = serializer.Meta.model
+        self.pk_key = prefix + model._meta.pk.name
+        self.columns = [self.pk_key]
+        self.names, keys, converters = [], [], []
+        self.singles, self.manys = [], []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise Unsupported(name)
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+            self.names.append(name)
+
+            if isinstance(field, serializers.ListSerializer):
+                if not model_field.many_to_many:
+                    raise Unsupported(name)
+                self.manys.append((name, self._many(model_field, field.child)))
+                keys.append(self.pk_key)
+                converters.append(None)
+            elif isinstance(field, serializers.BaseSerializer):
+                if not model_field.many_to_one:
+                    raise Unsupported(name)
+                child = RowPlan(field, prefix=f'{prefix}{model_field.name}__')
+                if child.manys:
+                    raise Unsupported(name)
+                self.singles.append((name, child))
+                self.columns.extend(child.columns)
+                keys.append(self.pk_key)
+                converters.append(None)
+            elif model_field.many_to_many or model_field.one_to_many or (
+                isinstance(field, serializers.RelatedField)
+                and not (isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None)
+            ):
+                raise Unsupported(name)
+            else:
+                key = prefix + model_field.name
+                self.columns.append(key)
+                keys.append(key)
+                converters.append(self._converter(field, model_field))
+
+        self.columns = list(dict.fromkeys(self.columns))
+        self.getter = itemgetter(*keys) if len(keys) > 1 else (lambda row, key=keys[0]: (row[key],))
+        self.converters = [(i, convert) for i, convert in enumerate(converters) if convert is not None]
+
+    @staticmethod
+    def _converter(field, model_field):
+        # Convertisseurs (valeur, fuseau courant) ; le fuseau est lu une fois par rendu
+        if isinstance(model_field, FileField):
+            # values() renvoie le nom du fichier, DRF attend un FieldFile pour construire l'URL
+            return lambda name, tz: field.to_representation(model_field.attr_class(None, model_field, name))
+        if isinstance(field, PASSTHROUGH):
+            return None
+        if (
+            isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601
+        ):
+            return _iso_datetime(field)
+        return lambda value, tz: field.to_representation(value)
+
+    def _many(self, model_field, child_serializer):
+        if isinstance(model_field, ManyToManyRel):
+            m2m = model_field.field
+            parent, child = m2m.m2m_reverse_field_name(), m2m.m2m_field_name()
+        else:
+            m2m = model_field
+            parent, child = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+        through = m2m.remote_field.through
+        plan = RowPlan(child_serializer, prefix=f'{child}__')
+        ordering = _ordering(through._meta.get_field(child).related_model, prefix=f'{child}__')
+        return through, parent, ordering, plan
+
+    def convert(self, row, tz):
+        values = list(self.getter(row))
+        for i, convert in self.converters:
+            if values[i] is not None:
+                values[i] = convert(values[i], tz)
+        result = dict(zip(self.names, values))
+        for name, child in self.singles:
+            result[name] = child.convert(row, tz) if row[child.pk_key] is not None else None
+        return result
+
+    def queryset(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values(*self.columns)
+
+    def render(self, rows):
+        rows = list(rows)
+        with timed('serialize'):
+            return self._render(rows)
+
+    def _liens(self, rows, through, parent, ordering, plan):
+        ids = {row[self.pk_key] for row in rows}
+        return through.objects.filter(**{f'{parent}__in': ids}).order_by(*ordering).values(parent, *plan.columns)
+
+    def _render(self, rows, charges=None):
+        # charges : {relation: liens} deja lus (arender), sinon une requete par relation M2M
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        result = [self.convert(row, tz) for row in rows]
+        for name, (through, parent, ordering, plan) in self.manys:
+            if charges is not None:
+                liens = charges[name]
+            else:
+                liens = list(self._liens(rows, through, parent, ordering, plan))
+            groupes = {}
+            for lien, item in zip(liens, plan._render(liens)):
+                groupes.setdefault(lien[parent], []).append(item)
+            for item, row in zip(result, rows):
+                item[name] = groupes.get(row[self.pk_key], [])
+        return result
+
+    async def arender(self, rows):
+        # Vues async : liens M2M lus par l'ORM async, rendu sur la boucle d'evenements
+        rows = list(rows)
+        if any(plan.manys for _, (_, _, _, plan) in self.manys):
+            return await sync_to_async(self.render)(rows)
+        charges = {}
+        for name, many in self.manys:
+            charges[name] = [lien async for lien in self._liens(rows, *many)]
+        with timed('serialize'):
+            return self._render(rows, charges)
+
+    def serialize(self, queryset):
+        return self.render(self.queryset(queryset))
+
+    async def aserialize(self, queryset):
+        return await self.arender([row async for row in self.queryset(queryset)])
+
+    def pk(self, row):
+        return row[self.pk_key]
+
+
+class SerializerPlan:
+    # Repli : meme interface, rendu par le serialiseur DRF
+    def __init__(self, serializer_class, kwargs):
+        self.serializer_class = serializer_class
+        self.kwargs = kwargs
+
+    def queryset(self, queryset):
+        optimize = getattr(self.serializer_class(**self.kwargs), 'optimize', None)
+        return optimize(queryset) if optimize else queryset
+
+    def render(self, rows):
+        rows = list(rows)
+        with timed('serialize'):
+            return self.serializer_class(rows, many=True, **self.kwargs).data
+
+    async def arender(self, rows):
+        return await sync_to_async(self.render)(rows)
+
+    def serialize(self, queryset):
+        return self.render(self.queryset(queryset))
+
+    async def aserialize(self, queryset):
+        return await sync_to_async(self.serialize)(queryset)
+
+    def pk(self, row):
+        return row.pk
+
+
+@lru_cache(maxsize=128)
+def _plan(serializer_class, fields, expand):
+    kwargs = {'fields': list(fields), 'expand': expand} if fields or expand else {}
+    serializer = serializer_class(**kwargs)
+    try:
+        return RowPlan(serializer)
+    except Unsupported:
+        return SerializerPlan(serializer_class, kwargs)
+
+
+def plan(serializer_class, fieldset=None):
+    # Compile une fois par (serialiseur, champs demandes) ; ValidationError si un champ est inconnu
+    if fieldset is None:
+        return _plan(serializer_class, (), ())
+    return _plan(serializer_class, tuple(fieldset.fields or ()), tuple(fieldset.expand))
@@ -0,0 +1,120 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+# ?fields=title_id,title : champs emis ET colonnes lues (only())
+# ?expand=pubid : remplace une cle etrangere par l'objet imbrique (select_related / prefetch)
+# ?view=compact : representation de liste allegee (sans les longs champs texte)
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+class Fieldset:
+    def __init__(self, fields=None, expand=(), compact=False):
+        self.fields = fields or None
+        self.expand = tuple(expand)
+        self.compact = compact
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        view = params.get('view', 'full')
+        if view not in ('full', 'compact'):
+            raise ValidationError({'view': ["Expected 'full' or 'compact'."]})
+        return cls(_split(params.get('fields')), _split(params.get('expand')), view == 'compact')
+
+    @property
+    def kwargs(self):
+        return {'fields': self.fields, 'expand': self.expand}
+
+    def cache_parts(self):
+        return (','.join(self.fields or ()), ','.join(self.expand), self.compact)
+
+    def scopes(self, scopes, expand_scopes):
+        # Scopes du cache du catalogue : ceux de la ressource, plus ceux des objets imbriques demandes
+        extra = sorted({expand_scopes[name] for name in self.expand if name in expand_scopes} - set(scopes))
+        return [*scopes, *extra]
+
+    def serializer(self, full, compact=None):
+        return compact if self.compact and compact is not None else full
+
+    def queryset(self, serializer_class, queryset):
+        return serializer_class(**self.kwargs).optimize(queryset)
+
+
+class SparseFieldsMixin:
+    # Serialiseur a champs selectionnables ; expandable : {nom: fabrique du serialiseur imbrique}
+    expandable = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        inconnus = (set(fields or ()) - set(self.fields) - set(self.expandable)) | (set(expand) - set(self.expandable))
+        if inconnus:
+            raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(inconnus))}."]})
+        self.expanded = set(expand)
+        for name in self.expanded:
+            self.fields[name] = self.expandable[name]()
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def optimize(self, queryset):
+        # Colonnes et jointures strictement necessaires aux champs emis
+        model = queryset.model
+        colonnes, jointures, prefetches = {model._meta.pk.name}, [], []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                child = getattr(field, 'child', field)
+                related = model_field.related_model.objects.all()
+                if not related.ordered:
+                    # Ordre stable des elements imbriques (le rendu rapide api/fastpath.py suit le meme)
+                    related = related.order_by('pk')
+                if isinstance(child, SparseFieldsMixin):
+                    related = child.optimize(related)
+                prefetches.append(Prefetch(field.source, queryset=related))
+            elif model_field.many_to_one:
+                colonnes.add(model_field.name)
+                if name in self.expanded:
+                    jointures.append(model_field.name)
+            elif model_field.concrete:
+                colonnes.add(model_field.name)
+        return (
+            queryset.select_related(None).prefetch_related(None)
+            .only(*colonnes).select_related(*jointures).prefetch_related(*prefetches)
+        )
+
+
+class SparseFieldsViewSetMixin:
+    # Lectures seulement : les ecritures gardent la representation complete
+    compact_serializer_class = None
+
+    def get_fieldset(self):
+        if self.request.method != 'GET':
+            return Fieldset()
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = Fieldset.from_request(self.request)
+        return self._fieldset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return self.get_fieldset().serializer(super().get_serializer_class(), self.compact_serializer_class)
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs.update(self.get_fieldset().kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.get_fieldset().queryset(self.get_serializer_class(), queryset)
+        return queryset
@@ -0,0 +1,126 @@
+from django.db import connection
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from . import catalog_cache
+from .models import Title
+
+# Filtres du catalogue (?subject=Roman,Poesie&pubid=1&author=3&decade=1990&year_min=1980&year_max=2000)
+# et facettes (sujet, decennie, editeur) calculees en une requete d'agregation, mises en cache
+# par combinaison de filtres. Index composites : migration 0011.
+
+LIST_FILTERS = ['subject', 'pubid', 'author']
+INT_FILTERS = ['year_min', 'year_max', 'decade']
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def _int(name, value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: [f"Expected an integer, got {value!r}."]})
+
+
+def clean_filters(params):
+    # Forme normalisee (listes triees) : sert aussi de cle de cache des facettes
+    filtres = {}
+    for name in LIST_FILTERS:
+        values = _split(params.get(name))
+        if values:
+            if name != 'subject':
+                values = [_int(name, value) for value in values]
+            filtres[name] = sorted(set(values))
+    for name in INT_FILTERS:
+        if params.get(name):
+            filtres[name] = _int(name, params[name])
+    return filtres
+
+
+def apply_filters(queryset, filtres):
+    if 'subject' in filtres:
+        queryset = queryset.filter(subject__in=filtres['subject'])
+    if 'pubid' in filtres:
+        queryset = queryset.filter(pubid__in=filtres['pubid'])
+    if 'author' in filtres:
+        # Sous-requete sur la table de liaison : pas de doublons ni de DISTINCT
+        liens = Title.authors.through.objects.filter(author_id__in=filtres['author']).values('title_id')
+        queryset = queryset.filter(pk__in=liens)
+    if 'decade' in filtres:
+        queryset = queryset.filter(year_published__range=(filtres['decade'], filtres['decade'] + 9))
+    if 'year_min' in filtres:
+        queryset = queryset.filter(year_published__gte=filtres['year_min'])
+    if 'year_max' in filtres:
+        queryset = queryset.filter(year_published__lte=filtres['year_max'])
+    return queryset
+
+
+class TitleFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return apply_filters(queryset, clean_filters(request.query_params))
+
+
+class TitleOrderingFilter(OrderingFilter):
+    # ?ordering=-year_published,title ; pubid trie sur la colonne (le curseur lit pubid_id),
+    # title_id departage les ex aequo pour que l'ordre (et la pagination par curseur) soit total
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        ordering = [f'{field}_id' if field.lstrip('-') == 'pubid' else field for field in ordering]
+        if ordering[-1].lstrip('-') != 'title_id':
+            ordering.append('title_id')
+        return ordering
+
+
+# GROUPING SETS : un seul parcours des lignes filtrees. Ailleurs (SQLite) : UNION ALL, une seule requete.
+FACETS_SQL = {
+    'postgresql': (
+        'SELECT GROUPING(f_subject), GROUPING(f_decade), f_subject, f_decade, f_pubid, f_name, COUNT(*) '
+        'FROM ({inner}) f GROUP BY GROUPING SETS ((f_subject), (f_decade), (f_pubid, f_name))'
+    ),
+}
+FACETS_UNION_SQL = (
+    'SELECT 0, 1, f_subject, NULL, NULL, NULL, COUNT(*) FROM ({inner}) f GROUP BY f_subject '
+    'UNION ALL SELECT 1, 0, NULL, f_decade, NULL, NULL, COUNT(*) FROM ({inner}) f GROUP BY f_decade '
+    'UNION ALL SELECT 1, 1, NULL, NULL, f_pubid, f_name, COUNT(*) FROM ({inner}) f GROUP BY f_pubid, f_name'
+)
+
+
+def compute_facets(filtres):
+    lignes = apply_filters(Title.objects.all(), filtres).values(
+        f_subject=F('subject'),
+        f_decade=F('year_published') / 10 * 10,
+        f_pubid=F('pubid_id'),
+        f_name=F('pubid__name'),
+    ).order_by()
+    inner, params = lignes.query.sql_with_params()
+    sql = FACETS_SQL.get(connection.vendor)
+    if sql is None:
+        sql, params = FACETS_UNION_SQL, params * 3
+    facettes = {'subject': [], 'decade': [], 'publisher': []}
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(inner=inner), params)
+        for hors_sujet, hors_decennie, sujet, decennie, pubid, nom, total in cursor.fetchall():
+            if not hors_sujet:
+                facettes['subject'].append({'value': sujet, 'count': total})
+            elif not hors_decennie:
+                facettes['decade'].append({'value': decennie, 'count': total})
+            else:
+                facettes['publisher'].append({'pubid': pubid, 'name': nom, 'count': total})
+    facettes['subject'].sort(key=lambda f: (-f['count'], f['value']))
+    facettes['decade'].sort(key=lambda f: f['value'])
+    facettes['publisher'].sort(key=lambda f: (-f['count'], f['name'], f['pubid']))
+    # Un sujet par livre (non nul) : total des livres filtres, sans COUNT(*) supplementaire
+    facettes['count'] = sum(f['count'] for f in facettes['subject'])
+    return facettes
+
+
+def facets(filtres):
+    return catalog_cache.cached_payload(
+        'title-facets', [catalog_cache.TITLES, catalog_cache.AUTHORS, catalog_cache.PUBLISHERS],
+        lambda: compute_facets(filtres), sorted(filtres.items()),
+    )
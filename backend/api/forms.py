@@ -15,10 +15,22 @@ class CustomUserCreationForm(UserCreationForm):
         strip=False,
     )
 
+    # Hachage deja calcule (pool de api/hashing.py, vue async inscription) : save() ne le refait pas
+    encoded_password = None
+
     class Meta:
         model = User
         fields = ('email', 'first_name', 'last_name')
 
+    def set_password_and_save(self, user, password_field_name='password1', commit=True):
+        if self.encoded_password is None:
+            return super().set_password_and_save(user, password_field_name, commit)
+        user.password = self.encoded_password
+        user._password = self.cleaned_data[password_field_name]
+        if commit:
+            user.save()
+        return user
+
     def clean_password1(self):
         password1 = self.cleaned_data.get('password1')
         
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import APIException
+
+# Hachage des mots de passe (PBKDF2, ~100 ms et plus) hors de la boucle d'evenements et des threads de
+# requete : un pool borne par processus (hashlib libere le GIL, des threads suffisent), et au-dela de
+# MAX_PENDING operations en cours ou en attente, refus immediat (503 + Retry-After) plutot qu'une file
+# qui grossit pendant une vague de connexions.
+
+
+def _setting(name, default):
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, default)
+
+
+class HashingPoolFull(APIException):
+    status_code = 503
+    default_detail = "Too many authentication requests in progress, retry shortly."
+    default_code = 'hashing_pool_full'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class HashingPool:
+    def __init__(self, workers, max_pending, retry_after=1):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='hashing')
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HashingPoolFull(self.retry_after)
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = HashingPool(_setting('WORKERS', 2), _setting('MAX_PENDING', 16), _setting('RETRY_AFTER', 1))
+    return _pool
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    global _pool
+    if setting == 'PASSWORD_HASHING' and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+async def ahash(password):
+    return await get_pool().run(make_password, password)
+
+
+async def averify(password, encoded):
+    # (correct, a re-hacher) : mot de passe encode avec un ancien algorithme ou moins d'iterations
+    return await get_pool().run(verify_password, password, encoded)
@@ -0,0 +1,289 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import autocomplete, catalog_cache, search
+from .models import Author, Copy, Publishers, Title
+
+# Champs ecrases quand l'ISBN existe deja ; les compteurs d'inventaire ne sont jamais touches
+UPDATE_FIELDS = ['title', 'year_published', 'pubid', 'description', 'notes', 'subject', 'comments', 'updated_at']
+MAX_REPORTED_ERRORS = 1000
+MAX_AUTHOR_CACHE = 200_000
+
+
+class RowError(ValueError):
+    pass
+
+
+# LECTURE EN FLUX
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, row
+        return
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except json.JSONDecodeError as exc:
+            yield line, RowError(f"invalid JSON: {exc}")
+
+
+def _int(value, field):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be an integer")
+    if not -32768 <= number <= 32767:
+        raise RowError(f"{field} out of range")
+    return number
+
+
+def parse_authors(value):
+    # CSV : "Victor Hugo:1802|Emile Zola:1840" ; JSONL : liste de {"author", "year_born"} ou de chaines
+    if isinstance(value, str):
+        value = [part for part in value.split('|') if part.strip()]
+    authors = []
+    for item in value or []:
+        if isinstance(item, str):
+            name, _, year = item.rpartition(':')
+            item = {'author': name, 'year_born': year}
+        name = (item.get('author') or '').strip()
+        if not name or len(name) > 50:
+            raise RowError(f"invalid author name {name!r}")
+        authors.append((name, _int(item.get('year_born'), 'year_born')))
+    return list(dict.fromkeys(authors))
+
+
+class CatalogImporter:
+    # Memoire bornee par batch_size ; nombre de requetes par lot constant (auteurs, upsert des
+    # titres, liens M2M, exemplaires, vecteurs de recherche). bulk_create ne declenche pas les
+    # signaux : l'indexation et l'invalidation du cache sont faites ici, une fois par lot.
+    def __init__(self, batch_size=2000, default_publisher=None, stdout=None):
+        self.batch_size = batch_size
+        self.default_publisher = default_publisher
+        self.stdout = stdout
+        self.publishers = set(Publishers.objects.values_list('pk', flat=True))
+        self.author_ids = {}
+        self.errors = []
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'authors_created': 0, 'errors': 0}
+
+    def validate(self, record):
+        if isinstance(record, Exception):
+            raise record
+        if not isinstance(record, dict):
+            raise RowError("record must be an object")
+        isbn = (record.get('isbn') or '').strip()
+        if not isbn or len(isbn) > 20:
+            raise RowError("isbn is required (20 characters max)")
+        title = (record.get('title') or '').strip()
+        if not title or len(title) > 255:
+            raise RowError("title is required (255 characters max)")
+        pubid = record.get('pubid') or self.default_publisher
+        try:
+            pubid = int(pubid)
+        except (TypeError, ValueError):
+            pubid = None
+        if pubid not in self.publishers:
+            raise RowError(f"unknown publisher {record.get('pubid')!r}")
+        copies = _int(record.get('copies') or 1, 'copies')
+        if copies < 0:
+            raise RowError("copies must be positive")
+        return {
+            'isbn': isbn,
+            'title': title,
+            'year_published': _int(record.get('year_published'), 'year_published'),
+            'pubid_id': pubid,
+            'description': record.get('description') or '',
+            'notes': record.get('notes') or None,
+            'subject': (record.get('subject') or 'Non catégorisé')[:100],
+            'comments': record.get('comments') or None,
+            'copies': copies,
+            # Absent : les auteurs existants du titre sont conserves
+            'authors': parse_authors(record['authors']) if record.get('authors') is not None else None,
+        }
+
+    def error(self, line, message):
+        self.stats['errors'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def run(self, records):
+        start = time.perf_counter()
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.batch_size))
+            if not chunk:
+                break
+            rows = {}
+            for line, record in chunk:
+                try:
+                    row = self.validate(record)
+                except RowError as exc:
+                    self.error(line, str(exc))
+                    continue
+                # Un ISBN repete dans le lot : la derniere ligne l'emporte
+                rows.pop(row['isbn'], None)
+                rows[row['isbn']] = row
+            if rows:
+                self.import_batch(list(rows.values()))
+            self.stats['rows'] += len(chunk)
+            if self.stdout:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{self.stats['rows']} rows ({self.stats['rows'] / elapsed:.0f} rows/s)")
+
+        if self.stats['created'] or self.stats['updated']:
+            catalog_cache.bump_generation(catalog_cache.TITLES, catalog_cache.AUTHORS)
+        elapsed = time.perf_counter() - start
+        self.stats['seconds'] = round(elapsed, 3)
+        self.stats['rows_per_second'] = round(self.stats['rows'] / elapsed, 1) if elapsed else 0.0
+        return self.stats
+
+    def resolve_authors(self, rows):
+        # Eviction avant le calcul des manquants : tous les auteurs du lot restent resolus
+        if len(self.author_ids) > MAX_AUTHOR_CACHE:
+            self.author_ids.clear()
+        missing = {author for row in rows for author in row['authors'] or ()} - self.author_ids.keys()
+        if not missing:
+            return
+        # Une requete par lot sur l'index (author, year_born), puis un seul INSERT pour les nouveaux
+        existing = Author.objects.filter(
+            author__in={name for name, _ in missing}, year_born__in={year for _, year in missing}
+        ).values_list('author', 'year_born', 'pk')
+        for name, year, pk in existing:
+            self.author_ids.setdefault((name, year), pk)
+        nouveaux = [Author(author=name, year_born=year) for name, year in missing - self.author_ids.keys()]
+        if not nouveaux:
+            return
+        Author.objects.bulk_create(nouveaux)
+        for author in nouveaux:
+            self.author_ids[(author.author, author.year_born)] = author.pk
+        transaction.on_commit(lambda: autocomplete.get_index().bulk_add(
+            [(autocomplete.AUTHOR, a.pk, a.author, 0) for a in nouveaux]
+        ))
+        self.stats['authors_created'] += len(nouveaux)
+
+    def import_batch(self, rows):
+        with transaction.atomic():
+            self.resolve_authors(rows)
+            anciens_titres = dict(
+                Title.objects.filter(isbn__in=[row['isbn'] for row in rows]).values_list('isbn', 'title')
+            )
+            ids = upsert_titles(rows)
+
+            crees = [row for row in rows if row['isbn'] not in anciens_titres]
+            maintenant = timezone.now()
+            insert_rows(Copy, ['title_id', 'acquired_at'], [
+                (ids[row['isbn']], maintenant) for row in crees for _ in range(row['copies'])
+            ])
+
+            Through = Title.authors.through
+            lies = [row for row in rows if row['authors'] is not None]
+            Through.objects.filter(title_id__in=[ids[row['isbn']] for row in lies]).delete()
+            insert_rows(Through, ['title_id', 'author_id'], [
+                (ids[row['isbn']], self.author_ids[author]) for row in lies for author in row['authors']
+            ])
+            if connection.vendor == 'postgresql':
+                # Vecteurs ecrits par l'upsert ; auteurs absents de la ligne (conserves) : recalcul
+                search.update_search_vectors([ids[row['isbn']] for row in rows if row['authors'] is None])
+            else:
+                search.update_search_vectors(list(ids.values()))
+
+            renommes = [
+                (ids[row['isbn']], row['title']) for row in rows
+                if row['isbn'] in anciens_titres and anciens_titres[row['isbn']] != row['title']
+            ]
+            transaction.on_commit(
+                lambda: self.index_titles([(ids[row['isbn']], row['title']) for row in crees], renommes)
+            )
+
+        self.stats['created'] += len(crees)
+        self.stats['updated'] += len(rows) - len(crees)
+
+    def index_titles(self, crees, renommes):
+        index = autocomplete.get_index()
+        index.bulk_add([(autocomplete.TITLE, pk, label, 0) for pk, label in crees])
+        for pk, label in renommes:
+            # add() sans score conserve la popularite deja indexee
+            index.add(autocomplete.TITLE, pk, label)
+
+
+# ECRITURE PAR LOTS
+# PostgreSQL : un INSERT ... SELECT FROM unnest() par lot, parametres passes en tableaux (pas de
+# construction d'instances ni de VALUES geant). Ailleurs : bulk_create.
+
+TITLE_COLUMNS = UPDATE_FIELDS + ['isbn', 'total_copies', 'available_count']
+
+
+def _unnest_insert(model, fields, values, suffix=''):
+    meta = model._meta
+    qn = connection.ops.quote_name
+    colonnes = [meta.get_field(name) for name in fields]
+    sql = 'INSERT INTO {} ({}) SELECT * FROM unnest({}) {}'.format(
+        qn(meta.db_table),
+        ', '.join(qn(field.column) for field in colonnes),
+        ', '.join(f'%s::{field.db_type(connection)}[]' for field in colonnes),
+        suffix,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(column) for column in zip(*values)])
+        return cursor.fetchall() if 'RETURNING' in suffix else None
+
+
+def insert_rows(model, fields, values):
+    if not values:
+        return
+    if connection.vendor == 'postgresql':
+        _unnest_insert(model, fields, values)
+        return
+    model.objects.bulk_create([model(**dict(zip(fields, value))) for value in values])
+
+
+def upsert_titles(rows):
+    # Retourne {isbn: title_id}, titres crees comme mis a jour
+    fields = [('pubid_id' if name == 'pubid' else name) for name in TITLE_COLUMNS]
+    maintenant = timezone.now()
+    derives = {'total_copies': 'copies', 'available_count': 'copies'}
+    values = [
+        tuple(maintenant if name == 'updated_at' else row[derives.get(name, name)] for name in fields)
+        for row in rows
+    ]
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        meta = Title._meta
+        maj = ', '.join(
+            f'{qn(col)} = EXCLUDED.{qn(col)}' for col in (meta.get_field(name).column for name in UPDATE_FIELDS)
+        )
+        # Vecteur de recherche calcule dans l'INSERT (meme expression que search.search_vector_expression) :
+        # chaque ligne n'est ecrite qu'une fois, sans UPDATE ni seconde entree dans l'index GIN
+        colonnes = [meta.get_field(name).column for name in fields]
+        alias = [f'c{i}' for i in range(len(fields))]
+        u = dict(zip(fields, alias))
+        vecteur = ' || '.join(
+            f"setweight(to_tsvector(%s::regconfig, COALESCE(u.{col}::text, '')), '{poids}')"
+            for col, poids in ((u['title'], 'A'), ('noms', 'A'), (u['subject'], 'B'), (u['description'], 'C'))
+        )
+        sql = (
+            'INSERT INTO {table} ({colonnes}, {sv}) SELECT {alias}, {vecteur} FROM unnest({tableaux}, %s::text[]) '
+            'AS u({alias}, noms) ON CONFLICT ({isbn}) DO UPDATE SET {maj}, {sv} = EXCLUDED.{sv} RETURNING {isbn}, {pk}'
+        ).format(
+            table=qn(meta.db_table), colonnes=', '.join(qn(col) for col in colonnes), sv=qn('search_vector'),
+            alias=', '.join(alias), vecteur=vecteur,
+            tableaux=', '.join(f'%s::{meta.get_field(name).db_type(connection)}[]' for name in fields),
+            isbn=qn('isbn'), maj=maj, pk=qn(meta.pk.column),
+        )
+        noms = [' '.join(name for name, _ in row['authors'] or ()) for row in rows]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [search.search_config()] * 4 + [list(column) for column in zip(*values)] + [noms])
+            return dict(cursor.fetchall())
+    Title.objects.bulk_create(
+        [Title(**dict(zip(fields, value))) for value in values],
+        update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS,
+    )
+    return dict(Title.objects.filter(isbn__in=[row['isbn'] for row in rows]).values_list('isbn', 'pk'))
@@ -0,0 +1,212 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Mesures par requete : nombre de requetes SQL et temps base (execute_wrapper pose sur chaque
+# connexion a sa creation), hits/miss du cache du catalogue, temps de serialisation et d'encodage.
+# Exposees en en-tete Server-Timing et en log structure ; les budgets de requetes declares sur
+# les vues (query_budget / query_budgets) sont verifies a chaque requete.
+
+_current = ContextVar('request_metrics', default=None)
+_listeners = []
+_enforce = False
+
+
+def _setting(name, default):
+    return getattr(settings, 'REQUEST_METRICS', {}).get(name, default)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {}
+        self.actifs = set()
+        self.view = None
+        self.route = None
+        self.method = None
+        self.status = None
+        self.budget = None
+        self.duration = None
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            'query_budget': self.budget,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            **{f'{name}_ms': round(value * 1000, 2) for name, value in self.timings.items()},
+            'total_ms': round((self.duration or 0) * 1000, 2),
+        }
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        parts += [f'{name};dur={value * 1000:.1f}' for name, value in self.timings.items()]
+        parts.append(f'total;dur={(self.duration or 0) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    return _current.get()
+
+
+def add_listener(listener):
+    # Appele avec le RequestMetrics de chaque requete terminee (metriques Prometheus : api/metrics.py)
+    _listeners.append(listener)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    debut = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - debut
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # Branche sur connection_created (api/apps.py) : une fois par connexion, pas par requete
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def timed(name):
+    # Reentrant : un rendu imbrique (auteurs d'un livre) n'est compte qu'une fois
+    metrics = _current.get()
+    if metrics is None or name in metrics.actifs:
+        yield
+        return
+    metrics.actifs.add(name)
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.actifs.discard(name)
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + time.perf_counter() - debut
+
+
+def query_budget(limit):
+    # Vues fonctions : @query_budget(n) au-dessus de @api_view
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_budget(request, view_func):
+    # ViewSets : query_budgets = {'list': n, ...} sur la classe, resolu par l'action de la methode HTTP
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+        return getattr(view_func.cls, 'query_budgets', {}).get(action), f'{view_func.cls.__name__}.{action}'
+    cls = getattr(view_func, 'cls', None)
+    return getattr(view_func, 'query_budget', None), getattr(cls, '__name__', view_func.__name__)
+
+
+@contextmanager
+def capture_metrics():
+    # Aide de test : mesures des requetes HTTP terminees dans le bloc
+    mesures = []
+    _listeners.append(mesures.append)
+    try:
+        yield mesures
+    finally:
+        _listeners.remove(mesures.append)
+
+
+@contextmanager
+def enforce_budgets(enabled=True):
+    # Depassement de budget -> QueryBudgetExceeded (la suite de tests echoue au lieu d'un simple log)
+    global _enforce
+    precedent, _enforce = _enforce, enabled
+    try:
+        yield
+    finally:
+        _enforce = precedent
+
+
+class RequestMetricsMiddleware:
+    # Synchrone et asynchrone : sous ASGI, les vues async ne passent par aucun thread. Vue et budget
+    # sont lus sur resolver_match en fin de requete (un process_view synchrone serait execute dans
+    # un thread sous ASGI)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, metrics, response)
+
+    async def __acall__(self, request):
+        metrics, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, metrics, response)
+
+    def start(self, request):
+        metrics = RequestMetrics()
+        metrics.method = request.method
+        request.metrics = metrics
+        return metrics, _current.set(metrics)
+
+    def finish(self, request, metrics, response):
+        metrics.duration = time.perf_counter() - metrics.started
+        metrics.status = response.status_code
+        match = request.resolver_match
+        if match is not None:
+            metrics.budget, metrics.view = view_budget(request, match.func)
+            metrics.route = match.view_name
+
+        if _setting('SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing()
+        for listener in list(_listeners):
+            listener(metrics)
+        if metrics.budget is not None and metrics.queries > metrics.budget:
+            message = f'{metrics.view}: {metrics.queries} queries, budget {metrics.budget}'
+            if _enforce or _setting('ENFORCE_BUDGETS', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning('query budget exceeded', extra=metrics.as_dict())
+        else:
+            logger.debug('request metrics', extra=metrics.as_dict())
+        return response
@@ -0,0 +1,324 @@
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, connections
+from django.test import AsyncClient, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import catalog_cache
+from .authentication import LibraryRefreshToken
+from .models import Author, Copy, Publishers, Reservation, Title, User
+
+# Banc de charge des endpoints chauds (manage.py benchmark_api) : catalogue synthetique insere par
+# bulk_create, puis requetes HTTP en processus (client de test Django, un client par worker/thread).
+# Latences mesurees cote client ; nombre de requetes SQL lu sur request.metrics (api/instrumentation.py).
+
+
+class Catalogue:
+    # Lignes inserees par seed(), etiquetees par run pour pouvoir etre supprimees
+    def __init__(self, run, publishers, authors, titles, users):
+        self.run = run
+        self.publishers = publishers
+        self.authors = authors
+        self.titles = titles
+        self.users = users
+
+    def delete(self):
+        Reservation.objects.filter(user__in=self.users).delete()
+        Title.objects.filter(pk__in=[livre.pk for livre in self.titles]).delete()
+        Author.objects.filter(pk__in=[auteur.pk for auteur in self.authors]).delete()
+        Publishers.objects.filter(pk__in=[editeur.pk for editeur in self.publishers]).delete()
+        User.objects.filter(pk__in=[user.pk for user in self.users]).delete()
+        invalidate_catalog()
+
+
+def invalidate_catalog():
+    catalog_cache.bump_generation(catalog_cache.TITLES, catalog_cache.AUTHORS, catalog_cache.PUBLISHERS)
+
+
+def seed(titles, authors=None, publishers=None, users=1, reservations=0, copies=2, authors_per_title=2,
+         batch_size=2000):
+    run = uuid.uuid4().hex[:8]
+    authors = authors or max(titles // 4, 1)
+    publishers = publishers or max(titles // 100, 1)
+    editeurs = Publishers.objects.bulk_create([
+        Publishers(
+            name=f'Bench {run} {i}', company_name='Benchmark', address='-', city='-', state='-',
+            zip='-', telephone='-', fax='-', comments='',
+        )
+        for i in range(publishers)
+    ])
+    auteurs = Author.objects.bulk_create([
+        Author(author=f'Bench author {run} {i}', year_born=1800 + i % 200) for i in range(authors)
+    ], batch_size=batch_size)
+    livres = Title.objects.bulk_create([
+        Title(
+            isbn=f'bench-{run}-{i}', title=f'Benchmark title {i}', year_published=1900 + i % 120,
+            subject=('Roman', 'Poesie', 'Essai', 'Histoire')[i % 4], pubid=editeurs[i % len(editeurs)],
+            description='Generated by the benchmark harness ' * 8, notes='Notes', comments=None,
+            total_copies=copies, available_count=copies,
+        )
+        for i in range(titles)
+    ], batch_size=batch_size)
+    Copy.objects.bulk_create([Copy(title=livre) for livre in livres for _ in range(copies)], batch_size=batch_size)
+    Through = Title.authors.through
+    Through.objects.bulk_create([
+        Through(title_id=livre.pk, author_id=auteurs[(i + k) % len(auteurs)].pk)
+        for i, livre in enumerate(livres) for k in range(min(authors_per_title, len(auteurs)))
+    ], batch_size=batch_size)
+    # Mots de passe non utilisables : les workers s'authentifient par JWT, sans hachage couteux
+    lecteurs = User.objects.bulk_create([
+        User(email=f'bench-{run}-{i}@example.com', first_name='Bench', last_name=str(i), password='!')
+        for i in range(users)
+    ], batch_size=batch_size)
+    # Historique (reservations rendues) : n'entame ni les stocks ni la limite de reservations actives
+    Reservation.objects.bulk_create([
+        Reservation(user=lecteurs[i % len(lecteurs)], book=livres[i % len(livres)], status=Reservation.Status.RETURNED)
+        for i in range(reservations)
+    ], batch_size=batch_size)
+    invalidate_catalog()
+    return Catalogue(run, editeurs, auteurs, livres, lecteurs)
+
+
+def percentile(valeurs, p):
+    # Rang le plus proche sur une liste triee
+    if not valeurs:
+        return None
+    return valeurs[min(len(valeurs) - 1, max(0, round(p / 100 * len(valeurs) + 0.5) - 1))]
+
+
+class Run:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def request(self, label, client, method, url, **kwargs):
+        debut = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        self.record(label, time.perf_counter() - debut, response, response.wsgi_request)
+        return response
+
+    async def arequest(self, label, client, method, url, **kwargs):
+        debut = time.perf_counter()
+        response = await getattr(client, method)(url, **kwargs)
+        self.record(label, time.perf_counter() - debut, response, response.asgi_request)
+        return response
+
+    def record(self, label, duree, response, request):
+        mesures = getattr(request, 'metrics', None)
+        with self._lock:
+            self.samples.setdefault(label, []).append(
+                (duree, response.status_code, mesures.queries if mesures else None)
+            )
+
+    def report(self, wall):
+        resultats = {}
+        for label, samples in self.samples.items():
+            durees = sorted(duree for duree, _, _ in samples)
+            # Les reponses 500 (page de debogage, verrous SQLite...) faussent le compte de requetes
+            requetes = [queries for _, status, queries in samples if queries is not None and status < 500]
+            resultats[label] = {
+                'requests': len(samples),
+                'errors': sum(1 for _, status, _ in samples if status >= 400),
+                'throughput': round(len(samples) / wall, 1) if wall else None,
+                'p50_ms': round(percentile(durees, 50) * 1000, 2),
+                'p95_ms': round(percentile(durees, 95) * 1000, 2),
+                'p99_ms': round(percentile(durees, 99) * 1000, 2),
+                'queries_mean': round(sum(requetes) / len(requetes), 2) if requetes else None,
+                'queries_max': max(requetes) if requetes else None,
+            }
+        return resultats
+
+
+TOKENS = {
+    # Claims du Principal (api/authentication.py) : pas de lecture de User par requete
+    'principal': LibraryRefreshToken,
+    # Jeton simplejwt nu : User charge depuis la base a chaque requete
+    'legacy': RefreshToken,
+}
+
+
+def _client(user=None, tokens='principal'):
+    client = APIClient(raise_request_exception=False)
+    if user is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {TOKENS[tokens].for_user(user).access_token}')
+    return client
+
+
+READS = {
+    # Scenarios GET du catalogue : (url, parametres) ; rejoues sous ASGI par run_asgi_scenario
+    'books': lambda catalogue, rng: ('/api/v1/books/', {'page_size': 20}),
+    'books_user': lambda catalogue, rng: ('/api/v1/books/', {'page_size': 20}),
+    'book_detail': lambda catalogue, rng: (f'/api/v1/books/{rng.choice(catalogue.titles).pk}/', None),
+    'author_books': lambda catalogue, rng: (f'/api/v1/authors/{rng.choice(catalogue.authors).pk}/livres/', None),
+}
+
+
+def lecture(name):
+    def action(run, catalogue, client, rng):
+        url, data = READS[name](catalogue, rng)
+        run.request(name, client, 'get', url, data=data)
+    return action
+
+
+def my_reservations(run, catalogue, client, rng):
+    run.request('my_reservations', client, 'get', '/api/v1/my-reservations/')
+
+
+def reserve_cancel(run, catalogue, client, rng):
+    livre = rng.choice(catalogue.titles)
+    response = run.request('reserve', client, 'post', f'/api/v1/books/{livre.pk}/reserver/')
+    if response.status_code == 201:
+        reservation = Reservation.objects.active().filter(user=client.bench_user, book=livre).values('pk').first()
+        if reservation:
+            run.request('cancel', client, 'delete', f"/api/v1/reservations/{reservation['pk']}/")
+
+
+SCENARIOS = {
+    'books': (lecture('books'), False),
+    'books_user': (lecture('books_user'), True),
+    'book_detail': (lecture('book_detail'), False),
+    'author_books': (lecture('author_books'), False),
+    'my_reservations': (my_reservations, True),
+    'reserve': (reserve_cancel, True),
+}
+
+
+def run_scenario(name, catalogue, requests, workers=1, seed=0, tokens='principal'):
+    # requests iterations par worker ; un lecteur distinct par worker (limite de reservations actives)
+    action, authentifie = SCENARIOS[name]
+    run = Run()
+    erreurs = []
+
+    def worker(i):
+        try:
+            user = catalogue.users[i % len(catalogue.users)] if authentifie else None
+            client = _client(user, tokens)
+            client.bench_user = user
+            rng = random.Random(f'{seed}:{name}:{i}')
+            for _ in range(requests):
+                action(run, catalogue, client, rng)
+        except Exception as exc:
+            erreurs.append(exc)
+        finally:
+            if workers > 1:
+                connections.close_all()
+
+    close_old_connections()
+    debut = time.perf_counter()
+    if workers == 1:
+        worker(0)
+    else:
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - debut
+    if erreurs:
+        raise erreurs[0]
+    return run.report(wall)
+
+
+# Passes ASGI : urls du serveur ASGI (backend/asgi.py), catalogue en lecture par les vues async
+ASGI_URLCONF = 'backend.urls_asgi'
+
+
+async def _asgi_lectures(name, catalogue, clients, requests, seed):
+    run = Run()
+
+    async def worker(i, client):
+        rng = random.Random(f'{seed}:{name}:{i}')
+        for _ in range(requests):
+            url, data = READS[name](catalogue, rng)
+            await run.arequest(f'asgi_{name}', client, 'get', url, data=data)
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(worker(i, client) for i, client in enumerate(clients)))
+    wall = time.perf_counter() - debut
+    await sync_to_async(connections.close_all)()
+    return run.report(wall)
+
+
+def run_asgi_scenario(name, catalogue, requests, workers=1, seed=0, tokens='principal'):
+    # Meme scenario que run_scenario, sous ASGI (AsyncClient) : workers coroutines concurrentes sur
+    # une boucle d'evenements au lieu d'un thread par worker
+    _, authentifie = SCENARIOS[name]
+    clients = []
+    for i in range(workers):
+        headers = {}
+        if authentifie:
+            user = catalogue.users[i % len(catalogue.users)]
+            headers['Authorization'] = f'Bearer {TOKENS[tokens].for_user(user).access_token}'
+        clients.append(AsyncClient(raise_request_exception=False, headers=headers))
+    close_old_connections()
+    with override_settings(ROOT_URLCONF=ASGI_URLCONF):
+        return asyncio.run(_asgi_lectures(name, catalogue, clients, requests, seed))
+
+
+LOGIN_PASSWORD = 'Bench-pass-1'
+
+
+async def _asgi_books(catalogue, requests, workers, storm, label):
+    # workers lecteurs de /books/ ; pendant leur passe, storm clients enchainent les connexions
+    # (POST /token/) et attendent Retry-After quand le pool de hachage est plein (503)
+    run = Run()
+    fin = asyncio.Event()
+
+    async def lecteur():
+        client = AsyncClient(raise_request_exception=False)
+        for _ in range(requests):
+            await run.arequest(label, client, 'get', '/api/v1/books/', data={'page_size': 20})
+
+    async def connexions(i):
+        client = AsyncClient(raise_request_exception=False)
+        data = {'email': catalogue.users[i % len(catalogue.users)].email, 'password': LOGIN_PASSWORD}
+        while not fin.is_set():
+            response = await run.arequest('asgi_login', client, 'post', '/api/v1/token/', data=data)
+            if response.status_code == 503:
+                await asyncio.sleep(float(response['Retry-After']))
+
+    vague = [asyncio.create_task(connexions(i)) for i in range(storm)]
+    await asyncio.sleep(0)
+    debut = time.perf_counter()
+    await asyncio.gather(*(lecteur() for _ in range(workers)))
+    wall = time.perf_counter() - debut
+    fin.set()
+    await asyncio.gather(*vague)
+    # Connexion ouverte par les vues synchrones dans le thread de sync_to_async (le client de test
+    # ne ferme pas les connexions en fin de requete)
+    await sync_to_async(connections.close_all)()
+    return run.report(wall)
+
+
+def run_login_storm(catalogue, requests, workers=1, storm=8):
+    # Sous ASGI (AsyncClient, en processus) : /books/ seul, puis pendant une vague de connexions dont
+    # le hachage passe par le pool borne (api/hashing.py) ; les latences du catalogue doivent rester proches
+    User.objects.filter(pk__in=[user.pk for user in catalogue.users]).update(password=make_password(LOGIN_PASSWORD))
+    close_old_connections()
+    with override_settings(ROOT_URLCONF=ASGI_URLCONF):
+        resultats = asyncio.run(_asgi_books(catalogue, requests, workers, 0, 'asgi_books_alone'))
+        resultats.update(asyncio.run(_asgi_books(catalogue, requests, workers, storm, 'asgi_books_storm')))
+    return resultats
+
+
+def compare(baseline, resultats):
+    # Ecarts par endpoint : debit (ratio) et p95 (ratio), None si absent de la reference
+    ecarts = {}
+    for label, courant in resultats.items():
+        reference = baseline.get(label)
+        if not reference:
+            ecarts[label] = None
+            continue
+        ecarts[label] = {
+            'throughput': round(courant['throughput'] / reference['throughput'], 2) if reference['throughput'] else None,
+            'p95': round(courant['p95_ms'] / reference['p95_ms'], 2) if reference['p95_ms'] else None,
+            'queries_max': (reference['queries_max'], courant['queries_max']),
+        }
+    return ecarts
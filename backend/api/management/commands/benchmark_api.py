@@ -0,0 +1,162 @@
+import json
+import platform
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from api import loadtest
+
+LOCAL_CACHE = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+    'AUTOCOMPLETE': {'BACKEND': 'api.autocomplete.MemoryPrefixIndex'},
+    'METRICS': {'BACKEND': 'api.metrics.MemoryStore'},
+    'TOKEN_REVOCATION': {'BACKEND': 'api.revocation.MemoryRevocationStore'},
+}
+
+
+def throttling(local_cache):
+    # Limites relevees : le controle (un appel au stockage par requete) reste mesure sans refuser le banc
+    config = getattr(settings, 'THROTTLING', {})
+    rates = {scope: {kind: '1000000000/s' for kind in regles} for scope, regles in config.get('RATES', {}).items()}
+    if local_cache:
+        return {**config, 'RATES': rates, 'BACKEND': 'api.throttling.CacheSlidingWindow'}
+    return {**config, 'RATES': rates}
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc de charge des endpoints chauds (/books/, /books/<id>/, /authors/<id>/livres/, /my-reservations/, "
+        "reservation + annulation) sur un catalogue synthetique : debit, latences p50/p95/p99 et requetes SQL "
+        "par endpoint. Les lignes inserees sont supprimees a la fin (sauf --keep)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=None, help="Defaut : titles / 4.")
+        parser.add_argument('--publishers', type=int, default=None, help="Defaut : titles / 100.")
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--reservations', type=int, default=2000, help="Historique (reservations rendues).")
+        parser.add_argument('--requests', type=int, default=200, help="Iterations par worker et par scenario.")
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help="Une passe par valeur.")
+        parser.add_argument('--scenarios', nargs='+', choices=list(loadtest.SCENARIOS), default=list(loadtest.SCENARIOS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--tokens', choices=list(loadtest.TOKENS), default='principal',
+            help="legacy : jetons sans claims, User lu en base a chaque requete (comparaison).",
+        )
+        parser.add_argument(
+            '--local-cache', action='store_true',
+            help=(
+                "Cache, autocompletion, metriques, revocation des jetons et limitation de debit en memoire du "
+                "processus (sans Redis)."
+            ),
+        )
+        parser.add_argument(
+            '--asgi', action='store_true',
+            help=(
+                "Rejoue aussi les scenarios GET du catalogue sous ASGI (vues async, backend/urls_asgi.py) : "
+                "asgi_<scenario>, compare au chemin WSGI."
+            ),
+        )
+        parser.add_argument(
+            '--login-storm', type=int, default=0, metavar='N',
+            help="Passe ASGI : /books/ seul puis pendant N connexions concurrentes (POST /token/).",
+        )
+        parser.add_argument('--save', help="Ecrit les resultats (JSON) : reference pour --compare.")
+        parser.add_argument('--compare', help="Compare a une reference ecrite par --save.")
+        parser.add_argument('--keep', action='store_true', help="Conserve le catalogue synthetique.")
+
+    def handle(self, *args, **options):
+        if options['users'] < max(options['workers']):
+            raise CommandError("--users must be at least the largest --workers value.")
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as fichier:
+                baseline = json.load(fichier)
+
+        with ExitStack() as stack:
+            if options['local_cache']:
+                stack.enter_context(override_settings(**LOCAL_CACHE))
+            stack.enter_context(override_settings(THROTTLING=throttling(options['local_cache'])))
+            catalogue = loadtest.seed(
+                options['titles'], options['authors'], options['publishers'], options['users'],
+                options['reservations'],
+            )
+            try:
+                resultats = self.run(catalogue, options)
+            finally:
+                if not options['keep']:
+                    catalogue.delete()
+
+        rapport = {
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'local_cache': options['local_cache'],
+            'tokens': options['tokens'],
+            'asgi': options['asgi'],
+            'login_storm': options['login_storm'],
+            'titles': options['titles'],
+            'requests': options['requests'],
+            'results': resultats,
+        }
+        if options['save']:
+            with open(options['save'], 'w') as fichier:
+                json.dump(rapport, fichier, indent=2)
+            self.stdout.write(f"saved {options['save']}")
+        if baseline is not None:
+            self.comparer(baseline, rapport)
+
+    def run(self, catalogue, options):
+        resultats = {}
+        for workers in options['workers']:
+            passe = resultats[str(workers)] = {}
+            for nom in options['scenarios']:
+                if options['asgi']:
+                    # Chaque passe WSGI / ASGI part d'un cache du catalogue vide
+                    loadtest.invalidate_catalog()
+                passe.update(loadtest.run_scenario(
+                    nom, catalogue, options['requests'], workers, options['seed'], options['tokens'],
+                ))
+            if options['asgi']:
+                for nom in options['scenarios']:
+                    if nom in loadtest.READS:
+                        loadtest.invalidate_catalog()
+                        passe.update(loadtest.run_asgi_scenario(
+                            nom, catalogue, options['requests'], workers, options['seed'], options['tokens'],
+                        ))
+            if options['login_storm']:
+                passe.update(loadtest.run_login_storm(catalogue, options['requests'], workers, options['login_storm']))
+            self.stdout.write(f"{workers} worker(s)")
+            for label, r in passe.items():
+                self.stdout.write(
+                    f"  {label:<16} {r['requests']:>6} req  {r['throughput']:>8} req/s  "
+                    f"p50 {r['p50_ms']:>7} ms  p95 {r['p95_ms']:>7} ms  p99 {r['p99_ms']:>7} ms  "
+                    f"queries {r['queries_mean']} (max {r['queries_max']})  errors {r['errors']}"
+                )
+            for label, r in passe.items():
+                wsgi = passe.get(label[len('asgi_'):]) if label.startswith('asgi_') else None
+                if wsgi and wsgi['throughput']:
+                    self.stdout.write(
+                        f"  asgi/wsgi {label[len('asgi_'):]:<10} throughput x{round(r['throughput'] / wsgi['throughput'], 2)}  "
+                        f"p95 {wsgi['p95_ms']} -> {r['p95_ms']} ms"
+                    )
+        return resultats
+
+    def comparer(self, baseline, rapport):
+        self.stdout.write(f"compared with {self.style.NOTICE(baseline.get('vendor', '?'))} baseline")
+        for workers, passe in rapport['results'].items():
+            ecarts = loadtest.compare(baseline.get('results', {}).get(workers, {}), passe)
+            for label, ecart in ecarts.items():
+                if ecart is None:
+                    self.stdout.write(f"  {workers}w {label:<16} not in baseline")
+                    continue
+                ligne = (
+                    f"  {workers}w {label:<16} throughput x{ecart['throughput']}  p95 x{ecart['p95']}  "
+                    f"queries max {ecart['queries_max'][0]} -> {ecart['queries_max'][1]}"
+                )
+                avant, apres = ecart['queries_max']
+                regression = (ecart['p95'] or 0) > 1.2 or (apres or 0) > (avant or 0)
+                self.stdout.write(self.style.WARNING(ligne) if regression else ligne)
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api import fastpath, loadtest, renderers
+from api.fieldsets import Fieldset
+from api.models import Author, Publishers, Reservation, Title
+from api.serializers import (
+    AuthorSerializer, PublishersSerializer, ReservationSerializer, TitleListSerializer, TitleSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le rendu des listes par les serialiseurs DRF et par le chemin rapide (api/fastpath.py), "
+        "puis l'encodage JSON (DRF, FastJSONRenderer, fragments pre-encodes), sur des donnees "
+        "synthetiques inserees dans une transaction annulee."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3, help="Meilleur temps sur N essais.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            loadtest.seed(rows, users=1, reservations=rows)
+            cas = [
+                ('Title', TitleSerializer, Title.objects.for_catalog().order_by('pk')),
+                ('Title compact', TitleListSerializer, Title.objects.for_catalog().order_by('pk')),
+                ('Author', AuthorSerializer, Author.objects.order_by('pk')),
+                ('Publishers', PublishersSerializer, Publishers.objects.order_by('pk')),
+                ('Reservation', ReservationSerializer, Reservation.objects.order_by('pk')),
+            ]
+            for label, serializer_class, queryset in cas:
+                if hasattr(serializer_class, 'optimize'):
+                    drf_queryset = Fieldset().queryset(serializer_class, queryset)
+                else:
+                    drf_queryset = queryset
+                drf = self.best(repeat, lambda: serializer_class(drf_queryset.all(), many=True).data)
+                rapide = self.best(repeat, lambda: fastpath.plan(serializer_class).serialize(queryset.all()))
+                total = queryset.count()
+                self.stdout.write(
+                    f"{label:<14} {total:>7} rows  DRF {drf:.3f}s ({total / drf:,.0f} rows/s)  "
+                    f"fast path {rapide:.3f}s ({total / rapide:,.0f} rows/s)  x{drf / rapide:.1f}"
+                )
+            self.rendering(repeat)
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("benchmark rolled back."))
+
+    def rendering(self, repeat):
+        livres = fastpath.plan(TitleSerializer).serialize(Title.objects.order_by('pk'))
+        fragments = [renderers.Fragment(renderers.dumps(livre)) for livre in livres]
+        moteur = 'orjson' if renderers.orjson is not None else 'json'
+        drf = self.best(repeat, lambda: JSONRenderer().render({'books': livres}))
+        rapide = self.best(repeat, lambda: renderers.FastJSONRenderer().render({'books': livres}))
+        pre = self.best(repeat, lambda: renderers.FastJSONRenderer().render({'books': fragments}))
+        self.stdout.write(
+            f"JSON {len(livres)} titles  DRF JSONRenderer {drf:.3f}s  FastJSONRenderer ({moteur}) {rapide:.3f}s "
+            f"x{drf / rapide:.1f}  pre-encoded fragments {pre:.3f}s x{drf / pre:.1f}"
+        )
+
+    def best(self, repeat, fonction):
+        temps = []
+        for _ in range(repeat):
+            debut = time.perf_counter()
+            fonction()
+            temps.append(time.perf_counter() - debut)
+        return min(temps)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api import expiry
+
+
+class Command(BaseCommand):
+    help = "Passe a l'etat expire les reservations non retirees dont l'echeance est depassee."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        stats = expiry.expire_overdue_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['expired']} reservation(s) expired in {stats['seconds']}s "
+            f"({stats['rows_per_second']} rows/s)."
+        ))
@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import export
+
+
+class Command(BaseCommand):
+    help = "Exporte le catalogue en flux (JSON Lines ou CSV), a memoire constante."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Fichier de sortie, '-' pour la sortie standard.")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--updated-since', default=None, help="Date ISO : seuls les titres modifies depuis.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = export.parse_since(options['updated_since'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        start = time.perf_counter()
+        compteur = [0]
+
+        def compter(records):
+            for record in records:
+                compteur[0] += 1
+                yield record
+
+        records = compter(export.iter_catalog(updated_since, chunk_size=options['chunk_size']))
+        flux = export.encode(export.render(records, options['format']))
+        if options['gzip']:
+            flux = export.gzip_stream(flux)
+
+        sortie = sys.stdout.buffer if options['path'] == '-' else open(options['path'], 'wb')
+        try:
+            for chunk in flux:
+                sortie.write(chunk)
+        finally:
+            if sortie is not sys.stdout.buffer:
+                sortie.close()
+
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"{compteur[0]} title(s) exported in {elapsed:.2f}s.")
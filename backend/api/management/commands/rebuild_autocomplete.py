@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import autocomplete
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index d'autocompletion (titres et auteurs) sans l'interrompre."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = autocomplete.rebuild(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'{count} entries indexed in {elapsed:.2f}s.'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import services
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'exemplaires des titres et de reservations actives des utilisateurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        titles = services.reconcile_inventory(batch_size=options['batch_size'])
+        users = services.reconcile_user_counters(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{titles} title(s) and {users} user(s) repaired in {elapsed:.2f}s.'
+        ))
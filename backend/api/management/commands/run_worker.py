@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.scheduler import PeriodicWorker
+
+
+class Command(BaseCommand):
+    help = "Execute les taches periodiques (PERIODIC_TASKS) dans ce processus, sans broker externe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Execute chaque tache une fois puis s'arrete.")
+
+    def rapport(self, path, result):
+        # Statistiques renvoyees par la tache (expiration : lignes, duree, debit)
+        if isinstance(result, dict):
+            details = ', '.join(f'{key}={value}' for key, value in result.items())
+            self.stdout.write(f'{path}: {details}')
+
+    def handle(self, *args, **options):
+        worker = PeriodicWorker(on_result=self.rapport)
+        if options['once']:
+            worker.run_pending()
+            return
+        self.stdout.write(f'Running {len(worker.tasks)} periodic task(s). Ctrl+C to stop.')
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,248 @@
+import hmac
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Metriques d'exploitation au format texte Prometheus (GET /metrics). Enregistrer une valeur ne
+# coute qu'un increment de dict local au processus, sous un verrou jamais tenu longtemps. Les workers
+# gunicorn poussent leurs deltas vers un stockage partage (RedisStore : une table de hachage,
+# HINCRBYFLOAT en pipeline) au plus une fois par FLUSH_INTERVAL, depuis un thread hors du chemin de la
+# requete (vues async : pas d'E/S bloquante dans la boucle d'evenements) ; /metrics lit l'agregat.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = 'api_request_duration_seconds'
+DB_QUERIES = 'api_db_queries_total'
+DB_SECONDS = 'api_db_seconds_total'
+CATALOG_CACHE = 'api_catalog_cache_requests_total'
+RESERVATIONS = 'api_reservations_total'
+THROTTLED = 'api_throttled_requests_total'
+EXPIRED = 'api_expired_reservations_total'
+EXPIRY_DURATION = 'api_expiry_run_duration_seconds'
+
+FAMILIES = {
+    REQUEST_DURATION: ('histogram', 'Request latency by URL name, method and status.'),
+    DB_QUERIES: ('counter', 'ORM queries executed, by URL name.'),
+    DB_SECONDS: ('counter', 'Time spent in ORM queries, by URL name.'),
+    CATALOG_CACHE: ('counter', 'Catalog cache lookups (hit or miss), by URL name.'),
+    RESERVATIONS: ('counter', 'Reservation attempts by outcome.'),
+    THROTTLED: ('counter', 'Requests rejected by rate limiting, by throttle scope.'),
+    EXPIRED: ('counter', 'Reservations expired by the periodic expiry pass.'),
+    EXPIRY_DURATION: ('histogram', 'Duration of the periodic expiry pass.'),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, 'METRICS', {}).get(name, default)
+
+
+def _add(valeurs, deltas):
+    for key, amount in deltas.items():
+        valeurs[key] = valeurs.get(key, 0) + amount
+
+
+class MemoryStore:
+    # Un seul processus : developpement et tests
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valeurs = {}
+
+    def push(self, deltas):
+        with self._lock:
+            _add(self._valeurs, deltas)
+
+    def read(self):
+        with self._lock:
+            return dict(self._valeurs)
+
+    def clear(self):
+        with self._lock:
+            self._valeurs = {}
+
+
+class RedisStore:
+    # Partage entre workers : une table de hachage, champ = serie (nom + etiquettes en JSON)
+    KEY = 'metrics'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection(_setting('CACHE_ALIAS', 'default'))
+
+    def push(self, deltas):
+        pipe = self.redis.pipeline(transaction=False)
+        for (name, labels), amount in deltas.items():
+            pipe.hincrbyfloat(self.KEY, json.dumps([name, labels]), amount)
+        pipe.execute()
+
+    def read(self):
+        valeurs = {}
+        for field, value in self.redis.hgetall(self.KEY).items():
+            name, labels = json.loads(field)
+            valeurs[(name, tuple(tuple(label) for label in labels))] = float(value)
+        return valeurs
+
+    def clear(self):
+        self.redis.delete(self.KEY)
+
+
+class Registry:
+    def __init__(self, store, buckets=DEFAULT_BUCKETS, flush_interval=5):
+        self.store = store
+        self.buckets = [(bound, f'{bound:g}') for bound in buckets]
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._deltas = {}
+        self._flushed = time.monotonic()
+        self._flushing = False
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._deltas[key] = self._deltas.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        # Compteur du seul intervalle atteint : les buckets cumulatifs sont calcules au rendu
+        le = next((texte for bound, texte in self.buckets if value <= bound), '+Inf')
+        bucket = (name + '_bucket', labels + (('le', le),))
+        somme, total = (name + '_sum', labels), (name + '_count', labels)
+        with self._lock:
+            deltas = self._deltas
+            deltas[bucket] = deltas.get(bucket, 0) + 1
+            deltas[somme] = deltas.get(somme, 0) + value
+            deltas[total] = deltas.get(total, 0) + 1
+
+    def maybe_flush(self):
+        # Appele a chaque requete : l'envoi part dans un thread, un seul a la fois
+        if time.monotonic() - self._flushed < self.flush_interval:
+            return
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+            self._flushed = time.monotonic()
+        threading.Thread(target=self._background_flush, name='metrics-flush', daemon=True).start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._flushed = time.monotonic()
+        if not deltas:
+            return
+        try:
+            self.store.push(deltas)
+        except Exception:
+            # Stockage indisponible : les deltas sont conserves pour le prochain envoi
+            logger.warning('metrics flush failed', exc_info=True)
+            with self._lock:
+                _add(self._deltas, deltas)
+
+    def render(self):
+        self.flush()
+        return render(self.store.read(), [texte for _, texte in self.buckets])
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    echappe = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, echappe)) + '}'
+
+
+def render(valeurs, buckets):
+    series = {}
+    for (name, labels), value in valeurs.items():
+        family = next((f for f in FAMILIES if name == f or name.startswith(f + '_')), name)
+        series.setdefault(family, []).append((name, tuple(labels), value))
+
+    lignes = []
+    for family in sorted(series):
+        kind, aide = FAMILIES.get(family, ('untyped', ''))
+        lignes += [f'# HELP {family} {aide}', f'# TYPE {family} {kind}']
+        if kind != 'histogram':
+            lignes += [f'{name}{_labels(labels)} {_format(value)}' for name, labels, value in sorted(series[family])]
+            continue
+        cumuls, autres = {}, []
+        for name, labels, value in series[family]:
+            if name.endswith('_bucket'):
+                sans_le = tuple(label for label in labels if label[0] != 'le')
+                cumuls.setdefault(sans_le, {})[dict(labels)['le']] = value
+            else:
+                autres.append((labels, name, value))
+        for labels, name, value in sorted(autres):
+            if name.endswith('_count'):
+                cumul, vus = 0, cumuls.get(labels, {})
+                for le in [*buckets, '+Inf']:
+                    cumul += vus.get(le, 0)
+                    lignes.append(f'{family}_bucket{_labels(labels + (("le", le),))} {_format(cumul)}')
+            lignes.append(f'{name}{_labels(labels)} {_format(value)}')
+    return '\n'.join(lignes) + '\n'
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = Registry(
+            import_string(_setting('BACKEND', 'api.metrics.MemoryStore'))(),
+            buckets=_setting('BUCKETS', DEFAULT_BUCKETS),
+            flush_interval=_setting('FLUSH_INTERVAL', 5),
+        )
+    return _registry
+
+
+@receiver(setting_changed)
+def _reset_registry(setting, **kwargs):
+    global _registry
+    if setting == 'METRICS':
+        _registry = None
+
+
+def authorized(request):
+    # Sans jeton configure, /metrics est ferme
+    token = _setting('TOKEN', '')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def inc(name, labels=(), amount=1):
+    get_registry().inc(name, labels, amount)
+
+
+def observe(name, value, labels=()):
+    get_registry().observe(name, value, labels)
+
+
+def record_request(mesures):
+    # Ecouteur de RequestMetricsMiddleware (api/instrumentation.py), branche dans api/apps.py
+    registry = get_registry()
+    view = (('view', mesures.route or 'unmatched'),)
+    registry.observe(
+        REQUEST_DURATION, mesures.duration, view + (('method', mesures.method), ('status', str(mesures.status)))
+    )
+    if mesures.queries:
+        registry.inc(DB_QUERIES, view, mesures.queries)
+        registry.inc(DB_SECONDS, view, mesures.db_time)
+    if mesures.cache_hits:
+        registry.inc(CATALOG_CACHE, view + (('result', 'hit'),), mesures.cache_hits)
+    if mesures.cache_misses:
+        registry.inc(CATALOG_CACHE, view + (('result', 'miss'),), mesures.cache_misses)
+    registry.maybe_flush()
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:51
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Index GIN et remplissage initial : PostgreSQL uniquement
+REMPLISSAGE_SQL = """
+UPDATE api_title t SET search_vector =
+    setweight(to_tsvector(%(config)s, coalesce(t.title, '')), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(a.author, ' ')
+        FROM api_author a
+        JOIN api_title_authors ta ON ta.author_id = a.au_id
+        WHERE ta.title_id = t.title_id
+    ), '')), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce(t.subject, '')), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce(t.description, '')), 'C')
+"""
+
+
+def creer_index_recherche(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    config = getattr(settings, 'CATALOG_SEARCH_CONFIG', 'simple')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(REMPLISSAGE_SQL, {'config': config})
+    schema_editor.execute(
+        'CREATE INDEX api_title_search_vector_gin ON api_title USING gin (search_vector)'
+    )
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS api_title_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_remove_title_api_title_year_pu_8e4881_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.db import migrations, models
+from django.utils import timezone
+
+LIMITE = 3
+
+
+def reparer_reservations(apps, schema_editor):
+    # Les doublons et depassements crees par l'ancienne verification non atomique sont clotures
+    # (on garde les plus anciennes) avant de poser les contraintes, puis les compteurs sont calcules.
+    Reservation = apps.get_model('api', 'Reservation')
+    User = apps.get_model('api', 'User')
+    maintenant = timezone.now()
+
+    a_clore = []
+    vus = set()
+    par_utilisateur = {}
+    actives = Reservation.objects.filter(returned_at__isnull=True).order_by('reserved_at', 'id')
+    for pk, user_id, book_id in actives.values_list('pk', 'user_id', 'book_id').iterator():
+        if (user_id, book_id) in vus or par_utilisateur.get(user_id, 0) >= LIMITE:
+            a_clore.append(pk)
+            continue
+        vus.add((user_id, book_id))
+        par_utilisateur[user_id] = par_utilisateur.get(user_id, 0) + 1
+
+    for i in range(0, len(a_clore), 1000):
+        Reservation.objects.filter(pk__in=a_clore[i:i + 1000]).update(returned_at=maintenant)
+    for user_id, nombre in par_utilisateur.items():
+        User.objects.filter(pk=user_id).update(active_reservations=nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_title_search_vector'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='active_reservations',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(reparer_reservations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned_at__isnull', True)), fields=('user', 'book'), name='unique_active_reservation'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.CheckConstraint(condition=models.Q(('active_reservations__lte', 3)), name='user_active_reservations_limit'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def un_exemplaire_par_titre(apps, schema_editor):
+    # Jusqu'ici chaque titre etait traite comme un exemplaire unique
+    Title = apps.get_model('api', 'Title')
+    Copy = apps.get_model('api', 'Copy')
+    Reservation = apps.get_model('api', 'Reservation')
+
+    ids = Title.objects.order_by('pk').values_list('pk', flat=True)
+    batch = []
+    for title_id in ids.iterator(chunk_size=2000):
+        batch.append(Copy(title_id=title_id))
+        if len(batch) >= 2000:
+            Copy.objects.bulk_create(batch)
+            batch = []
+    Copy.objects.bulk_create(batch)
+
+    actives = Reservation.objects.filter(book=models.OuterRef('pk'), returned_at__isnull=True)
+    Title.objects.update(
+        total_copies=1,
+        available_count=models.Case(
+            models.When(models.Exists(actives), then=models.Value(0)),
+            default=models.Value(1),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_reservation_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Copy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('acquired_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='available_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='title',
+            constraint=models.CheckConstraint(condition=models.Q(('available_count__lte', models.F('total_copies'))), name='title_available_lte_total'),
+        ),
+        migrations.AddField(
+            model_name='copy',
+            name='title',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='api.title'),
+        ),
+        migrations.RunPython(un_exemplaire_par_titre, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+def statut_depuis_retour(apps, schema_editor):
+    Reservation = apps.get_model('api', 'Reservation')
+    Reservation.objects.filter(returned_at__isnull=False).update(status='returned')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_title_inventory'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reservation',
+            name='unique_active_reservation',
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='checked_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('reserved', 'Réservé'), ('checked_out', 'Emprunté'), ('returned', 'Rendu'), ('expired', 'Expiré'), ('cancelled', 'Annulé')], db_index=True, default='reserved', max_length=12),
+        ),
+        migrations.RunPython(statut_depuis_retour, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status__in', ['reserved', 'checked_out'])), fields=['book'], name='reservation_active_book_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['reserved', 'checked_out'])), fields=('user', 'book'), name='unique_active_reservation'),
+        ),
+    ]
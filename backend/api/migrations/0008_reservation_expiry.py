@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def echeance_des_reservations(apps, schema_editor):
+    Reservation = apps.get_model('api', 'Reservation')
+    Reservation.objects.filter(status='reserved').update(
+        expires_at=models.F('reserved_at') + settings.RESERVATION_PICKUP_DELAY
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_hold_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(echeance_des_reservations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'reserved')), fields=['expires_at', 'id'], name='reservation_expiry_idx'),
+        ),
+    ]
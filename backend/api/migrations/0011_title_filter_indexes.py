@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['subject', 'year_published'], name='api_title_subject_dea820_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['pubid', 'year_published'], name='api_title_pubid_i_0ee79b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['year_published', 'title_id'], name='api_title_year_pu_788cea_idx'),
+        ),
+    ]
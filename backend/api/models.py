@@ -1,10 +1,17 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
+
+from . import hashing
+
+MAX_ACTIVE_RESERVATIONS = 3
 
 class Author(models.Model):
     au_id = models.AutoField(primary_key=True)
     author = models.CharField(max_length=50, db_index=True)
     year_born = models.SmallIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
@@ -26,11 +33,21 @@ class Publishers(models.Model):
     telephone = models.CharField(max_length=15)
     fax = models.CharField(max_length=15)
     comments = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+class TitleQuerySet(models.QuerySet):
+    def for_catalog(self):
+        return self.select_related('pubid').prefetch_related('authors')
+
+    def touch(self):
+        # Les ecritures en masse (update, liens M2M) ne passent pas par auto_now
+        return self.update(updated_at=timezone.now())
+
+
 class Title(models.Model):
     title_id = models.AutoField(primary_key=True)
     isbn = models.CharField(max_length=20, unique=True)
@@ -43,6 +60,15 @@ class Title(models.Model):
     comments = models.TextField(blank=True, null=True)
     cover_image = models.ImageField(upload_to='book_covers/', null=True, blank=True)
     authors = models.ManyToManyField(Author, related_name='titles')
+    # Maintenu par api/signals.py, indexe en GIN (migration 0003)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Compteurs d'inventaire denormalises (api/services.py), reparables via reconcile_inventory
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+    available_count = models.PositiveIntegerField(default=0, editable=False)
+    # Date de derniere modification du catalogue (hors compteurs), filtre updated_since de l'export
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = TitleQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -51,7 +77,26 @@ class Title(models.Model):
         indexes = [
             models.Index(fields=['title']),
             models.Index(fields=['isbn']),
+            # Filtres et tris du catalogue (api/filters.py)
+            models.Index(fields=['subject', 'year_published']),
+            models.Index(fields=['pubid', 'year_published']),
+            models.Index(fields=['year_published', 'title_id']),
         ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available_count__lte=models.F('total_copies')),
+                name='title_available_lte_total',
+            ),
+        ]
+
+
+class Copy(models.Model):
+    title = models.ForeignKey(Title, on_delete=models.CASCADE, related_name='copies')
+    barcode = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    acquired_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title_id} - {self.barcode or self.pk}"
 
 class UserManager(BaseUserManager):
     def create_user(self, email, first_name, last_name, password=None, **extra_fields):
@@ -82,6 +127,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     date_of_birth = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Compteur maintenu par api/services.py : la limite se verifie sans COUNT(*)
+    active_reservations = models.PositiveSmallIntegerField(default=0, editable=False)
 
     groups = models.ManyToManyField(
         'auth.Group',
@@ -104,17 +151,57 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    async def acheck_password(self, raw_password):
+        # Verification et mise a niveau du hachage dans le pool borne de api/hashing.py, pas dans la
+        # boucle d'evenements (aauthenticate de ModelBackend passe par ici)
+        correct, rehacher = await hashing.averify(raw_password, self.password)
+        if correct and rehacher:
+            # Pas un changement de mot de passe : la version des jetons ne bouge pas (_password a None)
+            self.password = await hashing.ahash(raw_password)
+            await self.asave(update_fields=['password'])
+        return correct
+
     class Meta:
         indexes = [
             models.Index(fields=['email']),
         ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(active_reservations__lte=MAX_ACTIVE_RESERVATIONS),
+                name='user_active_reservations_limit',
+            ),
+        ]
+
+
+class ReservationQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__in=Reservation.ACTIVE_STATUSES)
 
 
 class Reservation(models.Model):
+    class Status(models.TextChoices):
+        RESERVED = 'reserved', 'Réservé'
+        CHECKED_OUT = 'checked_out', 'Emprunté'
+        RETURNED = 'returned', 'Rendu'
+        EXPIRED = 'expired', 'Expiré'
+        CANCELLED = 'cancelled', 'Annulé'
+
+    ACTIVE_STATUSES = [Status.RESERVED, Status.CHECKED_OUT]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
     book = models.ForeignKey(Title, on_delete=models.CASCADE, related_name='reservations')
+    status = models.CharField(max_length=12, choices=Status.choices, default=Status.RESERVED, db_index=True)
     reserved_at = models.DateTimeField(auto_now_add=True)
+    checked_out_at = models.DateTimeField(blank=True, null=True)
     returned_at = models.DateTimeField(blank=True, null=True)
+    # Date limite de retrait d'une reservation non empruntee (api/expiry.py)
+    expires_at = models.DateTimeField(blank=True, null=True)
+
+    objects = ReservationQuerySet.as_manager()
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
 
     def __str__(self):
         return f"{self.user.email} - {self.book.title}"
@@ -123,4 +210,58 @@ class Reservation(models.Model):
         indexes = [
             models.Index(fields=['user', 'book']),
             models.Index(fields=['reserved_at']),
-        ]
\ No newline at end of file
+            models.Index(
+                fields=['book'],
+                condition=models.Q(status__in=['reserved', 'checked_out']),
+                name='reservation_active_book_idx',
+            ),
+            models.Index(
+                fields=['expires_at', 'id'],
+                condition=models.Q(status='reserved'),
+                name='reservation_expiry_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(status__in=['reserved', 'checked_out']),
+                name='unique_active_reservation',
+            ),
+        ]
+
+
+class Hold(models.Model):
+    # File d'attente FIFO par titre : l'ordre est celui de l'id, indexe pour les attentes en cours
+    class Status(models.TextChoices):
+        WAITING = 'waiting', 'En attente'
+        FULFILLED = 'fulfilled', 'Servie'
+        CANCELLED = 'cancelled', 'Annulée'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    book = models.ForeignKey(Title, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    fulfilled_at = models.DateTimeField(blank=True, null=True)
+    reservation = models.OneToOneField(
+        Reservation, on_delete=models.SET_NULL, null=True, blank=True, related_name='hold'
+    )
+
+    def __str__(self):
+        return f"{self.user_id} - {self.book_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['book', 'id'],
+                condition=models.Q(status='waiting'),
+                name='hold_waiting_queue_idx',
+            ),
+            models.Index(fields=['user', 'status']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(status='waiting'),
+                name='unique_waiting_hold',
+            ),
+        ]
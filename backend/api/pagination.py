@@ -0,0 +1,57 @@
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CatalogCursorPagination(CursorPagination):
+    # Pagination par curseur (keyset) sur title_id : pas d'OFFSET, cout constant par page
+    ordering = 'title_id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchPagination(BasePagination):
+    # Pas de COUNT(*) : on lit page_size + 1 lignes pour savoir s'il existe une page suivante.
+    # Le nombre de pages est borne pour garder un cout constant sur les gros resultats.
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    page_query_param = 'page'
+    max_page = 50
+
+    def _parse(self, request, param, default, maximum):
+        try:
+            value = int(request.query_params.get(param, default))
+        except (TypeError, ValueError):
+            return default
+        return min(max(value, 1), maximum)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self._parse(request, self.page_size_query_param, self.page_size, self.max_page_size)
+        self.page = self._parse(request, self.page_query_param, 1, self.max_page)
+        offset = (self.page - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size and self.page < self.max_page
+        return rows[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
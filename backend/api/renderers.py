@@ -0,0 +1,120 @@
+import json
+import re
+import secrets
+from collections.abc import Mapping
+
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import timed
+
+try:
+    import orjson
+except ImportError:
+    # Dependance optionnelle : sans orjson on retombe sur le module json de la bibliotheque standard
+    orjson = None
+
+# Memes octets que le JSONRenderer de DRF (separateurs compacts, UTF-8, dates DRF, \u2028 echappe),
+# encodes par orjson quand il est installe. Les objets Fragment (JSON deja encode, typiquement mis
+# en cache par objet) sont inseres tels quels, sans decodage ni re-encodage.
+
+FRAGMENT_MARK = '\x1ffragment'
+
+
+class Fragment(Mapping):
+    # Lecture comme un dict (tests, code Python) : decode a la demande, jamais pour le rendu.
+    # pk : objet represente (compteurs de disponibilite remplaces par api/availability.py)
+    pk = None
+
+    def __init__(self, data, pk=None):
+        self.data = data
+        self.pk = pk
+        self._valeur = None
+
+    def _decode(self):
+        if self._valeur is None:
+            self._valeur = json.loads(self.data)
+        return self._valeur
+
+    def __getitem__(self, key):
+        return self._decode()[key]
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __getstate__(self):
+        return {'data': self.data, 'pk': self.pk, '_valeur': None}
+
+    def __repr__(self):
+        return f'Fragment({self.data!r})'
+
+
+class _Encodeur:
+    # default() commun a orjson et json : Fragment -> marqueur unique, le reste -> encodeur DRF
+    def __init__(self):
+        self.fragments = []
+        self.nonce = None
+        self.drf = JSONEncoder()
+
+    def default(self, obj):
+        if isinstance(obj, Fragment):
+            if self.nonce is None:
+                self.nonce = secrets.token_hex(8)
+            self.fragments.append(obj.data)
+            return f'{FRAGMENT_MARK}:{self.nonce}:{len(self.fragments) - 1}'
+        return self.drf.default(obj)
+
+    def splice(self, output, ensure_ascii):
+        if not self.fragments:
+            return output
+        mark = json.dumps(FRAGMENT_MARK, ensure_ascii=ensure_ascii)[1:-1].encode()
+        pattern = re.compile(b'"' + re.escape(mark) + b':' + self.nonce.encode() + rb':(\d+)"')
+        return pattern.sub(lambda match: self.fragments[int(match.group(1))], output)
+
+
+def _escape_separators(output):
+    # Comme DRF : \u2028 et \u2029 echappes pour rester un sous-ensemble strict de JavaScript
+    return output.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def dumps(data):
+    # Encode un fragment a mettre en cache (memes regles que FastJSONRenderer)
+    return FastJSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        encodeur = _Encodeur()
+
+        output = None
+        if orjson is not None and indent is None and self.compact and not self.ensure_ascii:
+            try:
+                output = orjson.dumps(
+                    data, default=encodeur.default,
+                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+                )
+            except orjson.JSONEncodeError:
+                # Entiers hors 64 bits... : le module json tranche comme DRF
+                encodeur = _Encodeur()
+        if output is None:
+            if indent is None:
+                separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+            else:
+                separators = INDENT_SEPARATORS
+            output = json.dumps(
+                data, default=encodeur.default, indent=indent, ensure_ascii=self.ensure_ascii,
+                allow_nan=not self.strict, separators=separators,
+            ).encode()
+        return encodeur.splice(_escape_separators(output), self.ensure_ascii)
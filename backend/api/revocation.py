@@ -0,0 +1,122 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .async_cache import async_redis
+
+# Revocation des jetons JWT sans tables en base : identifiants (jti) revoques avec une duree de vie
+# egale au temps restant du jeton, et un compteur de version par utilisateur (tous les jetons dont
+# la claim "ver" est inferieure sont refuses). Une verification = une lecture (MGET de deux cles).
+
+
+def _setting(name, default):
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, default)
+
+
+class MemoryRevocationStore:
+    # En memoire du processus : developpement et tests
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._versions = {}
+            self._revoked = {}
+
+    def _alive(self, jti):
+        expires_at = self._revoked.get(jti)
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._revoked[jti]
+            return False
+        return expires_at is not None
+
+    def state(self, user_id, jti):
+        with self._lock:
+            return self._versions.get(user_id, 0), jti is not None and self._alive(jti)
+
+    async def astate(self, user_id, jti):
+        return self.state(user_id, jti)
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            return self._versions[user_id]
+
+    def revoke(self, jti, ttl):
+        # False si le jti etait deja revoque (rotation : un refresh token ne sert qu'une fois)
+        with self._lock:
+            if self._alive(jti):
+                return False
+            self._revoked[jti] = time.monotonic() + max(ttl, 1)
+            return True
+
+
+class RedisRevocationStore:
+    VERSION_PREFIX = 'auth:ver:'
+    REVOKED_PREFIX = 'auth:revoked:'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.alias = _setting('CACHE_ALIAS', 'default')
+        self.redis = get_redis_connection(self.alias)
+
+    def clear(self):
+        for prefix in (self.VERSION_PREFIX, self.REVOKED_PREFIX):
+            keys = list(self.redis.scan_iter(match=f'{prefix}*', count=1000))
+            for i in range(0, len(keys), 1000):
+                self.redis.unlink(*keys[i:i + 1000])
+
+    def state(self, user_id, jti):
+        if jti is None:
+            return self.version(user_id), False
+        version, revoked = self.redis.mget(f'{self.VERSION_PREFIX}{user_id}', f'{self.REVOKED_PREFIX}{jti}')
+        return int(version or 0), revoked is not None
+
+    async def astate(self, user_id, jti):
+        # Vues async : client redis.asyncio de la boucle courante (api/async_cache.py)
+        redis = async_redis(self.alias)
+        if jti is None:
+            return int(await redis.get(f'{self.VERSION_PREFIX}{user_id}') or 0), False
+        version, revoked = await redis.mget(f'{self.VERSION_PREFIX}{user_id}', f'{self.REVOKED_PREFIX}{jti}')
+        return int(version or 0), revoked is not None
+
+    def version(self, user_id):
+        return int(self.redis.get(f'{self.VERSION_PREFIX}{user_id}') or 0)
+
+    def bump(self, user_id):
+        # Sans expiration : un compteur perdu rendrait valides des jetons revoques
+        return self.redis.incr(f'{self.VERSION_PREFIX}{user_id}')
+
+    def revoke(self, jti, ttl):
+        return bool(self.redis.set(f'{self.REVOKED_PREFIX}{jti}', 1, ex=max(int(ttl), 1), nx=True))
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(_setting('BACKEND', 'api.revocation.MemoryRevocationStore'))()
+    return _store
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting == 'TOKEN_REVOCATION':
+        _store = None
+
+
+def remaining(token):
+    # Secondes jusqu'a l'expiration du jeton : duree de vie de l'entree de revocation
+    return token['exp'] - time.time()
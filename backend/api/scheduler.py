@@ -0,0 +1,51 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    # Ordonnanceur local, sans broker : chaque tache (chemin -> intervalle en secondes) est
+    # executee dans le processus courant. Les memes fonctions peuvent etre branchees sur un
+    # ordonnanceur externe. on_result(path, resultat) : compte rendu de chaque execution (run_worker).
+    def __init__(self, tasks=None, clock=time.monotonic, on_result=None):
+        tasks = getattr(settings, 'PERIODIC_TASKS', {}) if tasks is None else tasks
+        self.clock = clock
+        self.tasks = [(path, import_string(path), interval) for path, interval in tasks.items()]
+        self.next_run = {path: clock() for path, _, _ in self.tasks}
+        self.on_result = on_result
+        self._stop = threading.Event()
+
+    def run_pending(self):
+        for path, func, interval in self.tasks:
+            if self.clock() < self.next_run[path]:
+                continue
+            close_old_connections()
+            try:
+                result = func()
+                if self.on_result is not None:
+                    self.on_result(path, result)
+            except Exception:
+                logger.exception('periodic task failed', extra={'task': path})
+            finally:
+                close_old_connections()
+            self.next_run[path] = self.clock() + interval
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            delay = min(self.next_run.values(), default=self.clock() + 1) - self.clock()
+            self._stop.wait(max(delay, 0.1))
+
+    def start(self):
+        thread = threading.Thread(target=self.run_forever, name='periodic-worker', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Title
+
+
+def search_config():
+    return getattr(settings, 'CATALOG_SEARCH_CONFIG', 'simple')
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector_expression():
+    # Part de la table de liaison (index sur title_id) puis joint l'auteur par sa cle primaire
+    noms_auteurs = Subquery(
+        Title.authors.through.objects.filter(title_id=OuterRef('pk'))
+        .order_by()
+        .values('title_id')
+        .annotate(noms=StringAgg('author__author', delimiter=' '))
+        .values('noms')
+    )
+    config = search_config()
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(Coalesce(noms_auteurs, Value(''), output_field=TextField()), weight='A', config=config)
+        + SearchVector('subject', weight='B', config=config)
+        + SearchVector('description', weight='C', config=config)
+    )
+
+
+def update_search_vectors(titles=None):
+    # Recalcule le vecteur stocke en une seule requete UPDATE (titres et noms d'auteurs joints)
+    if not is_supported():
+        return 0
+    queryset = Title.objects.all() if titles is None else Title.objects.filter(pk__in=titles)
+    return queryset.update(search_vector=search_vector_expression())
+
+
+def search_titles(terms):
+    if is_supported():
+        query = SearchQuery(terms, config=search_config(), search_type='websearch')
+        return (
+            Title.objects.for_catalog()
+            .filter(search_vector=query)
+            .annotate(score=SearchRank(F('search_vector'), query))
+            .order_by('-score', 'title_id')
+        )
+
+    # Repli hors PostgreSQL (developpement) : pas de classement
+    matching = Title.objects.filter(
+        Q(title__icontains=terms)
+        | Q(description__icontains=terms)
+        | Q(subject__icontains=terms)
+        | Q(authors__author__icontains=terms)
+    ).values('pk')
+    return (
+        Title.objects.for_catalog()
+        .filter(pk__in=matching)
+        .annotate(score=Value(1.0, output_field=FloatField()))
+        .order_by('title_id')
+    )
@@ -1,33 +1,65 @@
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
-from .models import Author, Publishers, Title, User, Reservation
+from . import services
+from .fieldsets import SparseFieldsMixin
+from .models import Author, Copy, Hold, Publishers, Title, User, Reservation
+
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable = {'titles': lambda: TitleListSerializer(many=True, read_only=True)}
 
-class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
-        fields = ['au_id', 'author', 'year_born']
+        fields = ['au_id', 'author', 'year_born', 'updated_at']
 
-class PublishersSerializer(serializers.ModelSerializer):
+class PublishersSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Publishers
         fields = '__all__'
 
-class TitleSerializer(serializers.ModelSerializer):
+class TitleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     authors = AuthorSerializer(many=True, read_only=True) 
+    copies = serializers.IntegerField(write_only=True, min_value=0, required=False, default=1)
+    expandable = {'pubid': lambda: PublishersSerializer(read_only=True)}
     
     class Meta:
         model = Title
-        fields = ['title_id', 'isbn', 'title', 'year_published', 'pubid', 'description', 'notes', 'subject', 'comments', 'cover_image', 'authors']
+        fields = ['title_id', 'isbn', 'title', 'year_published', 'pubid', 'description', 'notes', 'subject', 'comments', 'cover_image', 'authors', 'total_copies', 'available_count', 'updated_at', 'copies']
     
    
     def create(self, validated_data):
         cover_image = validated_data.pop('cover_image', None)
+        copies = validated_data.pop('copies', 1)
         title = Title.objects.create(**validated_data)
         if cover_image:
             title.cover_image = cover_image
             title.save()
+        services.add_copies(title, copies)
+        title.refresh_from_db(fields=['total_copies', 'available_count'])
         return title
 
+    def update(self, instance, validated_data):
+        validated_data.pop('copies', None)
+        return super().update(instance, validated_data)
+
+class TitleListSerializer(TitleSerializer):
+    # Representation de liste (?view=compact) : sans les champs texte longs, auteurs reduits
+    authors = AuthorSerializer(many=True, read_only=True, fields=['au_id', 'author'])
+
+    class Meta(TitleSerializer.Meta):
+        fields = ['title_id', 'isbn', 'title', 'year_published', 'pubid', 'subject', 'cover_image', 'authors', 'total_copies', 'available_count']
+
+class TitleSearchSerializer(TitleSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(TitleSerializer.Meta):
+        fields = TitleSerializer.Meta.fields + ['score']
+
+class CopySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Copy
+        fields = ['id', 'title', 'barcode', 'acquired_at']
+        read_only_fields = ['acquired_at']
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -36,7 +68,9 @@ class UserSerializer(serializers.ModelSerializer):
             'password': {'write_only': True},  
         }
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
+        # Vue async creer_compte : mot de passe deja hache dans le pool de api/hashing.py
+        if not self.context.get('password_hashed'):
+            validated_data['password'] = make_password(validated_data['password'])
         return super().create(validated_data)
 
 class ReservationSerializer(serializers.ModelSerializer):
@@ -45,19 +79,13 @@ class ReservationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Reservation
-        fields = ['id', 'user', 'book', 'reserved_at', 'returned_at']
-        read_only_fields = ['reserved_at', 'returned_at']  
+        fields = ['id', 'user', 'book', 'status', 'reserved_at', 'checked_out_at', 'returned_at']
+        read_only_fields = ['status', 'reserved_at', 'checked_out_at', 'returned_at']  
 
     def create(self, validated_data):
         user = self.context['request'].user
         book = validated_data.pop('book')
-        
-       
-        if not book.reservations.filter(returned_at__isnull=True).exists():
-            reservation = Reservation.objects.create(user=user, book=book, **validated_data)
-            return reservation
-        else:
-            raise serializers.ValidationError("Ce livre n'est pas disponible pour la réservation.")
+        return services.reserve(user, book)
 
    
     def update(self, instance, validated_data):
@@ -66,4 +94,11 @@ class ReservationSerializer(serializers.ModelSerializer):
         
         instance.returned_at = validated_data.get('returned_at', instance.returned_at)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+class HoldSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Hold
+        fields = ['id', 'book', 'status', 'position', 'created_at', 'fulfilled_at', 'reservation']
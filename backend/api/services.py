@@ -0,0 +1,334 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import async_cache, availability, metrics
+from .models import MAX_ACTIVE_RESERVATIONS, Copy, Hold, Reservation, Title, User
+
+
+class ReservationError(ValidationError):
+    pass
+
+
+class AlreadyReserved(ReservationError):
+    default_detail = "You have already reserved this book."
+
+
+class ReservationLimitReached(ReservationError):
+    default_detail = (
+        f"You already have {MAX_ACTIVE_RESERVATIONS} active reservations. "
+        "Please return a book before reserving another."
+    )
+
+
+class NotAvailable(ReservationError):
+    default_detail = "This book is not available for reservation."
+
+
+class InvalidTransition(ReservationError):
+    default_detail = "This reservation cannot change to that state."
+
+
+class HoldError(ValidationError):
+    pass
+
+
+# Emis apres commit quand un lecteur en attente obtient une reservation (hold=, reservation=)
+hold_promoted = Signal()
+
+
+def user_reservation_keys(user_id):
+    # Reservations du lecteur (mes_reservations) et titres qu'il a reserves (liste_livres)
+    return [f'reservations_{user_id}', f'reserved_titles_{user_id}']
+
+
+def invalidate_user_reservations(user_id):
+    keys = user_reservation_keys(user_id)
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def reserved_title_ids(user_id):
+    cache_key = f'reserved_titles_{user_id}'
+    ids = cache.get(cache_key)
+    if ids is None:
+        ids = sorted(set(Reservation.objects.active().filter(user_id=user_id).values_list('book_id', flat=True)))
+        cache.set(cache_key, ids, 300)
+    return ids
+
+
+async def areserved_title_ids(user_id):
+    acache = async_cache.get_cache()
+    cache_key = f'reserved_titles_{user_id}'
+    ids = await acache.get(cache_key)
+    if ids is None:
+        ids = sorted({
+            pk async for pk in Reservation.objects.active().filter(user_id=user_id).values_list('book_id', flat=True)
+        })
+        await acache.set(cache_key, ids, 300)
+    return ids
+
+
+def reserve(user, book):
+    try:
+        reservation = _reserve(user, book)
+    except ReservationError as exc:
+        metrics.inc(metrics.RESERVATIONS, (('outcome', 'failed'), ('reason', type(exc).__name__)))
+        raise
+    metrics.inc(metrics.RESERVATIONS, (('outcome', 'created'),))
+    return reservation
+
+
+def _reserve(user, book):
+    # Le verrou sur la ligne utilisateur serialise les reservations concurrentes d'un meme
+    # utilisateur ; l'index unique partiel et la contrainte CHECK garantissent les invariants en base.
+    with transaction.atomic():
+        active = (
+            User.objects.select_for_update()
+            .values_list('active_reservations', flat=True)
+            .get(pk=user.pk)
+        )
+        if active >= MAX_ACTIVE_RESERVATIONS:
+            raise ReservationLimitReached()
+        try:
+            with transaction.atomic():
+                reservation = Reservation.objects.create(
+                    user=user, book=book, expires_at=timezone.now() + settings.RESERVATION_PICKUP_DELAY
+                )
+        except IntegrityError:
+            raise AlreadyReserved()
+        taken = Title.objects.filter(pk=book.pk, available_count__gt=0).update(
+            available_count=F('available_count') - 1
+        )
+        if not taken:
+            raise NotAvailable()
+        User.objects.filter(pk=user.pk).update(active_reservations=F('active_reservations') + 1)
+
+    invalidate_user_reservations(user.pk)
+    # Seuls les compteurs du titre changent : le reste du cache du catalogue reste valide
+    availability.invalidate(book.pk)
+    return reservation
+
+
+# CYCLE DE VIE : reserved -> checked_out -> returned, reserved -> expired / cancelled
+Status = Reservation.Status
+
+TRANSITIONS = {
+    Status.CHECKED_OUT: [Status.RESERVED],
+    Status.RETURNED: [Status.RESERVED, Status.CHECKED_OUT],
+    Status.EXPIRED: [Status.RESERVED],
+    Status.CANCELLED: [Status.RESERVED],
+}
+
+TIMESTAMPS = {
+    Status.CHECKED_OUT: 'checked_out_at',
+    Status.RETURNED: 'returned_at',
+}
+
+
+def transition(reservation, status):
+    # UPDATE conditionnel sur l'etat courant : deux transitions concurrentes ne peuvent pas
+    # toutes les deux reussir, et la liberation des compteurs n'a lieu qu'une fois.
+    fields = {'status': status}
+    if status in TIMESTAMPS:
+        fields[TIMESTAMPS[status]] = timezone.now()
+    with transaction.atomic():
+        updated = Reservation.objects.filter(pk=reservation.pk, status__in=TRANSITIONS[status]).update(**fields)
+        if not updated:
+            raise InvalidTransition(f"Cannot move this reservation to '{status}' from its current state.")
+        if status not in Reservation.ACTIVE_STATUSES:
+            release(reservation)
+        else:
+            invalidate_user_reservations(reservation.user_id)
+    for field, value in fields.items():
+        setattr(reservation, field, value)
+    return reservation
+
+
+def check_out(reservation):
+    return transition(reservation, Status.CHECKED_OUT)
+
+
+def return_reservation(reservation):
+    return transition(reservation, Status.RETURNED)
+
+
+def cancel(reservation):
+    return transition(reservation, Status.CANCELLED)
+
+
+def release(reservation, promote=True):
+    # Une reservation active se termine : on rend l'exemplaire et la place de l'utilisateur,
+    # puis l'exemplaire passe au premier lecteur de la file d'attente, dans la meme transaction.
+    User.objects.filter(pk=reservation.user_id, active_reservations__gt=0).update(
+        active_reservations=F('active_reservations') - 1
+    )
+    Title.objects.filter(pk=reservation.book_id, available_count__lt=F('total_copies')).update(
+        available_count=F('available_count') + 1
+    )
+    invalidate_user_reservations(reservation.user_id)
+    availability.invalidate(reservation.book_id)
+    if promote:
+        promote_waitlist(reservation.book_id)
+
+
+# FILE D'ATTENTE
+
+def join_waitlist(user, book):
+    if book.available_count > 0:
+        raise HoldError("This book is available, reserve it directly.")
+    if Reservation.objects.active().filter(user=user, book=book).exists():
+        raise AlreadyReserved()
+    with transaction.atomic():
+        # Relu sous verrou (avant l'insertion : ordre de verrouillage fixe) : un exemplaire rendu depuis
+        # la verification ci-dessus a ete promu sans voir cette attente, on la sert donc ici
+        disponibles = Title.objects.select_for_update().values_list('available_count', flat=True).get(pk=book.pk)
+        try:
+            with transaction.atomic():
+                hold = Hold.objects.create(user=user, book=book)
+        except IntegrityError:
+            raise HoldError("You are already waiting for this book.")
+        if disponibles > 0:
+            _promote_waitlist(book.pk)
+            hold.refresh_from_db()
+        return hold
+
+
+def leave_waitlist(user, book):
+    return Hold.objects.filter(user=user, book=book, status=Hold.Status.WAITING).update(
+        status=Hold.Status.CANCELLED
+    )
+
+
+def waitlist_position(hold):
+    # Comptage sur l'index partiel (book, id) WHERE status = 'waiting'
+    return Hold.objects.filter(book_id=hold.book_id, status=Hold.Status.WAITING, id__lte=hold.id).count()
+
+
+def with_positions(holds):
+    rang = (
+        Hold.objects.filter(book=OuterRef('book'), status=Hold.Status.WAITING, id__lte=OuterRef('id'))
+        .order_by().values('book').annotate(n=Count('pk')).values('n')
+    )
+    return holds.annotate(position=Subquery(rang))
+
+
+def promote_waitlist(book_id):
+    # Tete de file (ORDER BY id LIMIT 1 sur l'index partiel) tant qu'il reste un exemplaire.
+    # Un lecteur deja a la limite garde sa place ; le suivant est servi.
+    with transaction.atomic():
+        _promote_waitlist(book_id)
+
+
+def _promote_waitlist(book_id):
+    skipped = []
+    while True:
+        hold = (
+            Hold.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('user', 'book')
+            .filter(book_id=book_id, status=Hold.Status.WAITING)
+            .exclude(pk__in=skipped)
+            .order_by('id')
+            .first()
+        )
+        if hold is None:
+            return
+        try:
+            reservation = reserve(hold.user, hold.book)
+        except NotAvailable:
+            return
+        except ReservationLimitReached:
+            skipped.append(hold.pk)
+            continue
+        except AlreadyReserved:
+            Hold.objects.filter(pk=hold.pk).update(status=Hold.Status.CANCELLED)
+            continue
+
+        hold.status = Hold.Status.FULFILLED
+        hold.fulfilled_at = timezone.now()
+        hold.reservation = reservation
+        hold.save(update_fields=['status', 'fulfilled_at', 'reservation'])
+        transaction.on_commit(
+            lambda hold=hold, reservation=reservation: hold_promoted.send(
+                sender=Hold, hold=hold, reservation=reservation
+            )
+        )
+
+
+# INVENTAIRE
+
+def adjust_inventory(title_id, delta):
+    if delta >= 0:
+        available = F('available_count') + delta
+    else:
+        available = Greatest(F('available_count') + delta, 0)
+    Title.objects.filter(pk=title_id).update(total_copies=F('total_copies') + delta, available_count=available)
+    availability.invalidate(title_id)
+    if delta > 0:
+        promote_waitlist(title_id)
+
+
+def add_copies(title, count):
+    if count <= 0:
+        return
+    with transaction.atomic():
+        Copy.objects.bulk_create([Copy(title=title) for _ in range(count)])
+        adjust_inventory(title.pk, count)
+
+
+def reconcile_inventory(batch_size=5000):
+    # Recalcule les compteurs par plages de title_id : chaque UPDATE reste court
+    copies = Copy.objects.filter(title=OuterRef('pk')).order_by().values('title').annotate(n=Count('pk')).values('n')
+    actives = (
+        Reservation.objects.active().filter(book=OuterRef('pk'))
+        .order_by().values('book').annotate(n=Count('pk')).values('n')
+    )
+    total = Coalesce(Subquery(copies), 0)
+    available = Greatest(total - Coalesce(Subquery(actives), 0), 0)
+    return _by_ranges(
+        Title.objects.annotate(expected_total=total, expected_available=available).filter(
+            ~Q(total_copies=F('expected_total')) | ~Q(available_count=F('expected_available'))
+        ),
+        batch_size,
+        total_copies=total,
+        available_count=available,
+    )
+
+
+def reconcile_user_counters(batch_size=5000):
+    actives = (
+        Reservation.objects.active().filter(user=OuterRef('pk'))
+        .order_by().values('user').annotate(n=Count('pk')).values('n')
+    )
+    expected = Coalesce(Subquery(actives), 0)
+    return _by_ranges(
+        User.objects.annotate(expected=expected).filter(~Q(active_reservations=F('expected'))),
+        batch_size,
+        active_reservations=expected,
+    )
+
+
+def _by_ranges(queryset, batch_size, **values):
+    model = queryset.model
+    repaired = []
+    start = 0
+    while True:
+        bornes = list(
+            model.objects.filter(pk__gt=start).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not bornes:
+            break
+        with transaction.atomic():
+            ids = list(queryset.filter(pk__gte=bornes[0], pk__lte=bornes[-1]).values_list('pk', flat=True))
+            if ids:
+                model.objects.filter(pk__in=ids).update(**values)
+                repaired.extend(ids)
+        start = bornes[-1]
+    if repaired and model is Title:
+        availability.invalidate(*repaired)
+    return len(repaired)
@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import authentication, autocomplete, catalog_cache, search, services
+from .models import Author, Copy, Publishers, Reservation, Title, User
+
+
+def reindexer_livres(titres):
+    search.update_search_vectors(titres)
+    Title.objects.filter(pk__in=titres).touch()
+
+
+@receiver([post_save, post_delete], sender=Title)
+def invalider_livres(sender, **kwargs):
+    catalog_cache.bump_generation(catalog_cache.TITLES)
+
+
+# Index d'autocompletion (Redis) : ecrit au commit, jamais pour une transaction annulee ni pendant
+# que la transaction tient ses verrous
+
+
+@receiver(post_save, sender=Title)
+def indexer_livre(sender, instance, **kwargs):
+    search.update_search_vectors([instance.pk])
+    pk, titre = instance.pk, instance.title
+    transaction.on_commit(lambda: autocomplete.get_index().add(autocomplete.TITLE, pk, titre))
+
+
+@receiver(post_delete, sender=Title)
+def desindexer_livre(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.get_index().remove(autocomplete.TITLE, pk))
+
+
+@receiver(m2m_changed, sender=Title.authors.through)
+def invalider_auteurs_des_livres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._titres_a_indexer = list(instance.titles.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    catalog_cache.bump_generation(catalog_cache.TITLES, catalog_cache.AUTHORS)
+    if not reverse:
+        titres = [instance.pk]
+    elif action == 'post_clear':
+        titres = getattr(instance, '_titres_a_indexer', [])
+    else:
+        titres = pk_set
+    reindexer_livres(titres)
+
+
+@receiver([post_save, post_delete], sender=Author)
+def invalider_auteurs(sender, **kwargs):
+    catalog_cache.bump_generation(catalog_cache.AUTHORS)
+
+
+@receiver(pre_delete, sender=Author)
+def memoriser_livres_auteur(sender, instance, **kwargs):
+    instance._titres_a_indexer = list(instance.titles.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Author)
+def reindexer_livres_auteur(sender, instance, created, **kwargs):
+    if not created:
+        reindexer_livres(instance.titles.values('pk'))
+    pk, nom = instance.pk, instance.author
+    transaction.on_commit(lambda: autocomplete.get_index().add(autocomplete.AUTHOR, pk, nom))
+
+
+@receiver(post_delete, sender=Author)
+def reindexer_livres_auteur_supprime(sender, instance, **kwargs):
+    reindexer_livres(getattr(instance, '_titres_a_indexer', []))
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.get_index().remove(autocomplete.AUTHOR, pk))
+
+
+@receiver([post_save, post_delete], sender=Publishers)
+def invalider_editeurs(sender, **kwargs):
+    catalog_cache.bump_generation(catalog_cache.PUBLISHERS)
+
+
+def populariser(title_id):
+    auteurs = Title.authors.through.objects.filter(title_id=title_id).values_list('author_id', flat=True)
+    autocomplete.get_index().incr_many(
+        [(autocomplete.TITLE, title_id)] + [(autocomplete.AUTHOR, au_id) for au_id in auteurs]
+    )
+
+
+@receiver(post_save, sender=Reservation)
+def compter_popularite(sender, instance, created, **kwargs):
+    # Apres le commit : ni requete ni aller-retour Redis sous les verrous de services.reserve
+    if created:
+        title_id = instance.book_id
+        transaction.on_commit(lambda: populariser(title_id))
+
+
+@receiver(post_delete, sender=Reservation)
+def liberer_reservation(sender, instance, **kwargs):
+    # Annulation ou suppression en cascade d'une reservation active
+    if instance.is_active:
+        services.release(instance, promote=False)
+
+
+@receiver(post_save, sender=Copy)
+def ajouter_exemplaire(sender, instance, created, **kwargs):
+    if created:
+        services.adjust_inventory(instance.title_id, 1)
+
+
+@receiver(post_delete, sender=Copy)
+def retirer_exemplaire(sender, instance, origin=None, **kwargs):
+    # Suppression en cascade d'un titre : pas de compteur a maintenir
+    if isinstance(origin, Title) or getattr(origin, 'model', None) is Title:
+        return
+    services.adjust_inventory(instance.title_id, -1)
+
+
+@receiver(post_save, sender=Reservation)
+def invalider_reservations_lecteur(sender, instance, **kwargs):
+    # Creations et modifications hors api/services.py (ReservationViewSet, admin)
+    services.invalidate_user_reservations(instance.user_id)
+
+
+# Droits recopies dans les jetons (api/authentication.py) : un changement doit revoquer les jetons emis
+DROITS = ('is_staff', 'is_superuser')
+
+
+@receiver(pre_save, sender=User)
+def memoriser_droits(sender, instance, update_fields=None, **kwargs):
+    instance._droits_avant = None
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & set(DROITS)):
+        return
+    instance._droits_avant = User.objects.filter(pk=instance.pk).values_list(*DROITS).first()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalider_utilisateur(sender, instance, created=False, **kwargs):
+    authentication.invalidate_user(instance.pk)
+    # Suppression, desactivation, nouveau mot de passe (set_password avant save) ou droits modifies :
+    # sessions revoquees
+    mot_de_passe = not created and getattr(instance, '_password', None) is not None
+    avant = getattr(instance, '_droits_avant', None)
+    droits = avant is not None and avant != tuple(getattr(instance, champ) for champ in DROITS)
+    if kwargs.get('signal') is post_delete or not instance.is_active or mot_de_passe or droits:
+        authentication.bump_token_version(instance.pk)
@@ -1,3 +1,1932 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    async_cache, authentication, autocomplete, availability, catalog_cache, expiry, fastpath, hashing, instrumentation,
+    metrics, renderers, revocation, search, services, throttling, views,
+)
+from .fieldsets import Fieldset
+from .forms import CustomUserCreationForm
+from .models import Author, Copy, Hold, Publishers, Reservation, Title, User
+from .serializers import (
+    AuthorSerializer, PublishersSerializer, ReservationSerializer, TitleListSerializer, TitleSearchSerializer,
+    TitleSerializer,
+)
+from .scheduler import PeriodicWorker
+
+
+def creer_catalogue(nb_livres, nb_auteurs=3, exemplaires=1):
+    editeur = Publishers.objects.create(
+        name='Gallimard', company_name='Editions Gallimard', address='5 rue Gaston-Gallimard',
+        city='Paris', state='FR', zip='75007', telephone='01-44-39-33-00',
+        fax='01-44-39-33-01', comments='',
+    )
+    auteurs = [Author.objects.create(author=f'Auteur {i}', year_born=1900 + i) for i in range(nb_auteurs)]
+    livres = Title.objects.bulk_create([
+        Title(
+            isbn=f'978{i:010d}', title=f'Livre {i}', year_published=2000, pubid=editeur, description='',
+            total_copies=exemplaires, available_count=exemplaires,
+        )
+        for i in range(nb_livres)
+    ])
+    Copy.objects.bulk_create([Copy(title=livre) for livre in livres for _ in range(exemplaires)])
+    for livre in livres:
+        livre.authors.set(auteurs)
+    return livres
+
+
+def setUpModule():
+    # Toute la suite echoue si une vue depasse son budget de requetes (query_budget / query_budgets)
+    unittest.enterModuleContext(instrumentation.enforce_budgets())
+
+
+class CatalogPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        creer_catalogue(30)
+
+    def test_liste_livres_query_count_is_fixed_per_page(self):
+        # 1 requete pour les livres (+ editeur) et 1 pour les auteurs, quelle que soit la taille de page
+        for page_size in (5, 25):
+            cache.clear()
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('liste_livres'), {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['books']), page_size)
+            self.assertEqual(len(response.data['books'][0]['authors']), 3)
+
+    def test_liste_livres_cursor_walks_whole_catalog(self):
+        ids = []
+        url = reverse('liste_livres') + '?page_size=7'
+        while url:
+            response = self.client.get(url)
+            ids.extend(book['title_id'] for book in response.data['books'])
+            url = response.data['next']
+        self.assertEqual(ids, sorted(Title.objects.values_list('title_id', flat=True)))
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get(reverse('liste_livres'), {'page_size': 10000})
+        self.assertEqual(len(response.data['books']), 30)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('titles-list'), {'page_size': 10000})
+        self.assertIn('LIMIT 101', ctx.captured_queries[0]['sql'])
+
+    def test_title_viewset_list_paginated(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('titles-list'), {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_lists_without_params_return_first_page(self):
+        # Pas de parametre : premiere page par defaut (20), jamais la table entiere
+        response = self.client.get(reverse('titles-list'))
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(reverse('liste_livres'))
+        self.assertEqual(len(response.data['books']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(3)
+
+    def test_payload_is_served_from_cache_and_invalidated_on_write(self):
+        url = reverse('detail_livre', args=[self.livres[0].pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['book']['title'], 'Livre 0')
+
+        Title.objects.filter(pk=self.livres[0].pk).update(title='Inchange')
+        self.assertEqual(self.client.get(url).data['book']['title'], 'Livre 0')
+
+        livre = Title.objects.get(pk=self.livres[0].pk)
+        livre.title = 'Nouveau titre'
+        livre.save()
+        self.assertEqual(self.client.get(url).data['book']['title'], 'Nouveau titre')
+
+    def test_author_changes_invalidate_nested_books(self):
+        url = reverse('liste_livres')
+        self.client.get(url)
+        auteur = Author.objects.first()
+        auteur.author = 'Victor Hugo'
+        auteur.save()
+        noms = [a['author'] for a in self.client.get(url).data['books'][0]['authors']]
+        self.assertIn('Victor Hugo', noms)
+
+        self.livres[0].authors.clear()
+        livres = {b['title_id']: b for b in self.client.get(url).data['books']}
+        self.assertEqual(livres[self.livres[0].pk]['authors'], [])
+
+    def test_expanded_publisher_changes_invalidate_books(self):
+        urls = [
+            reverse('liste_livres'), reverse('detail_livre', args=[self.livres[0].pk]),
+            reverse('livres_par_auteur', args=[Author.objects.first().pk]),
+        ]
+        etags = {url: self.client.get(url, {'expand': 'pubid'})['ETag'] for url in urls}
+        editeur = Publishers.objects.get(name='Gallimard')
+        editeur.name = 'Seuil'
+        editeur.save()
+        for url in urls:
+            reponse = self.client.get(url, {'expand': 'pubid'}, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(reponse.status_code, 200, url)
+            self.assertNotEqual(reponse['ETag'], etags[url], url)
+            livres = reponse.data['books'] if 'books' in reponse.data else [reponse.data['book']]
+            self.assertEqual({livre['pubid']['name'] for livre in livres}, {'Seuil'}, url)
+
+    def test_reservation_only_refreshes_availability(self):
+        lecteur = User.objects.create_user('dispo@example.com', 'Jean', 'Valjean')
+        liste, detail = reverse('liste_livres'), reverse('detail_livre', args=[self.livres[0].pk])
+        auteur = reverse('livres_par_auteur', args=[Author.objects.first().pk])
+        etags = {url: self.client.get(url)['ETag'] for url in (liste, detail, auteur)}
+        generation = catalog_cache.get_generations(catalog_cache.TITLES)
+
+        services.reserve(lecteur, self.livres[0])
+        self.assertEqual(catalog_cache.get_generations(catalog_cache.TITLES), generation)
+        for url in (liste, detail, auteur):
+            # Pages et fragments gardes ; seuls les compteurs du titre reserve sont relus (une requete)
+            with self.assertNumQueries(1):
+                reponse = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(reponse.status_code, 200)
+            livres = reponse.data['books'] if 'books' in reponse.data else [reponse.data['book']]
+            compteurs = {livre['title_id']: livre['available_count'] for livre in livres}
+            self.assertEqual(compteurs[self.livres[0].pk], 0)
+            self.assertEqual(set(compteurs.values()) - {0}, {1} if len(compteurs) > 1 else set())
+            cache.delete(availability.KEY.format(pk=self.livres[0].pk))
+
+        # Fragment imbrique (?expand=titles) : compteurs dans la cle du payload
+        url = reverse('liste_auteurs') + '?expand=titles'
+        self.client.get(url)
+        services.cancel(Reservation.objects.get(user=lecteur))
+        titres = self.client.get(url).data['authors'][0]['titles']
+        self.assertEqual({t['title_id']: t['available_count'] for t in titres}[self.livres[0].pk], 1)
+
+    def test_cold_rebuild_is_single_flight(self):
+        appels = []
+
+        def construire():
+            appels.append(1)
+            time.sleep(0.1)
+            return 'valeur'
+
+        resultats = []
+        threads = [
+            threading.Thread(target=lambda: resultats.append(catalog_cache.get_or_build('cle', construire)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(resultats, ['valeur'] * 10)
+
+    def test_stale_value_served_while_rebuilding(self):
+        cache.set('cle', {'value': 'ancienne', 'expires_at': time.time() - 1}, 60)
+        cache.add('cle:lock', 1, 10)
+        self.assertEqual(catalog_cache.get_or_build('cle', lambda: 'nouvelle'), 'ancienne')
+        cache.delete('cle:lock')
+        self.assertEqual(catalog_cache.get_or_build('cle', lambda: 'nouvelle'), 'nouvelle')
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(3)
+        hugo = Author.objects.create(author='Victor Hugo', year_born=1802)
+        self.miserables = self.livres[0]
+        self.miserables.title = 'Les Misérables'
+        self.miserables.save()
+        self.miserables.authors.add(hugo)
+        self.livres[1].description = 'Une étude sur les misérables de Paris'
+        self.livres[1].save()
+
+    def test_search_requires_query(self):
+        self.assertEqual(self.client.get(reverse('recherche_livres')).status_code, 400)
+
+    def test_search_matches_author_names(self):
+        response = self.client.get(reverse('recherche_livres'), {'q': 'hugo'})
+        self.assertEqual([b['title_id'] for b in response.data['books']], [self.miserables.pk])
+        self.assertIn('score', response.data['books'][0])
+
+    def test_search_action_is_paginated(self):
+        response = self.client.get(reverse('titles-search'), {'q': 'livre', 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn('page=2', response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Recherche plein texte PostgreSQL')
+    def test_title_match_ranks_above_description_match(self):
+        response = self.client.get(reverse('recherche_livres'), {'q': 'misérables'})
+        ids = [b['title_id'] for b in response.data['books']]
+        self.assertEqual(ids, [self.miserables.pk, self.livres[1].pk])
+        self.assertGreater(response.data['books'][0]['score'], response.data['books'][1]['score'])
+
+
+@override_settings(AUTOCOMPLETE={'BACKEND': 'api.autocomplete.MemoryPrefixIndex'})
+class AutocompleteTests(APITestCase):
+    # Index ecrit au commit (api/signals.py) : callbacks executes par captureOnCommitCallbacks
+    def setUp(self):
+        autocomplete.get_index().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.livres = creer_catalogue(2)
+            self.gatsby = Title.objects.create(
+                isbn='9780743273565', title='The Great Gatsby', year_published=1925,
+                pubid=Publishers.objects.first(), description='',
+            )
+            self.expectations = Title.objects.create(
+                isbn='9780141439563', title='Great Expectations', year_published=1861,
+                pubid=Publishers.objects.first(), description='',
+            )
+
+    def suggestions(self, q):
+        response = self.client.get(reverse('autocompletion'), {'q': q})
+        return [(s['type'], s['label']) for s in response.data['suggestions']]
+
+    def test_matches_prefix_of_any_word_ignoring_accents_and_case(self):
+        self.assertCountEqual(self.suggestions('GREAT'), [('title', 'Great Expectations'), ('title', 'The Great Gatsby')])
+        self.assertEqual(self.suggestions('gats'), [('title', 'The Great Gatsby')])
+        with self.captureOnCommitCallbacks(execute=True):
+            Author.objects.create(author='Émile Zola', year_born=1840)
+        self.assertEqual(self.suggestions('emi'), [('author', 'Émile Zola')])
+
+    def test_ranked_by_reservation_popularity(self):
+        user = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        auteur = Author.objects.get(author='Auteur 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gatsby.authors.add(auteur)
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(user=user, book=self.gatsby)
+        self.assertEqual(self.suggestions('great')[0], ('title', 'The Great Gatsby'))
+        self.assertEqual(self.suggestions('auteur')[0], ('author', 'Auteur 1'))
+
+    def test_writes_wait_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Title.objects.create(
+                isbn='9780141439600', title='Great Illusions', year_published=1900,
+                pubid=Publishers.objects.first(), description='',
+            )
+            self.gatsby.delete()
+        # Transaction pas encore committee (ou annulee) : index inchange
+        self.assertCountEqual(self.suggestions('great'), [('title', 'Great Expectations'), ('title', 'The Great Gatsby')])
+        for callback in callbacks:
+            callback()
+        self.assertCountEqual(self.suggestions('great'), [('title', 'Great Expectations'), ('title', 'Great Illusions')])
+
+    def test_incremental_updates_keep_popularity(self):
+        user = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(user=user, book=self.gatsby)
+            self.gatsby.title = 'Great Gatsby'
+            self.gatsby.save()
+            self.expectations.delete()
+        self.assertEqual(self.suggestions('great'), [('title', 'Great Gatsby')])
+        self.assertEqual(self.suggestions('the'), [])
+
+    def test_rebuild_command(self):
+        autocomplete.get_index().clear()
+        call_command('rebuild_autocomplete', stdout=StringIO())
+        self.assertEqual(len(self.suggestions('livre')), 2)
+        self.assertEqual(len(self.suggestions('auteur')), 3)
+
+    def verifier_reconstruction_sans_vidage(self, index):
+        # Changements hors signaux (update(), suppression pas encore indexee) rattrapes par rebuild()
+        Title.objects.filter(pk=self.gatsby.pk).update(title='Tender Is the Night')
+        self.expectations.delete()
+        with mock.patch.object(type(index), 'clear', side_effect=AssertionError('index vide')):
+            autocomplete.rebuild(chunk_size=2)
+        self.assertEqual(self.suggestions('great'), [])
+        self.assertEqual(self.suggestions('tender'), [('title', 'Tender Is the Night')])
+        self.assertEqual(len(self.suggestions('livre')), 2)
+        self.assertEqual(len(self.suggestions('auteur')), 3)
+
+    def test_rebuild_keeps_serving_and_drops_stale_members(self):
+        self.verifier_reconstruction_sans_vidage(autocomplete.get_index())
+
+    @skipUnless('django_redis' in settings.CACHES['default']['BACKEND'], 'Index Redis')
+    def test_redis_rebuild_keeps_serving_and_drops_stale_members(self):
+        with override_settings(AUTOCOMPLETE={'BACKEND': 'api.autocomplete.RedisPrefixIndex'}):
+            index = autocomplete.get_index()
+            index.clear()
+            try:
+                autocomplete.rebuild()
+                self.verifier_reconstruction_sans_vidage(index)
+            finally:
+                index.clear()
+
+    @skipUnless('django_redis' in settings.CACHES['default']['BACKEND'], 'Index Redis')
+    def test_redis_popularity_keeps_prefixes_bounded(self):
+        with override_settings(AUTOCOMPLETE={
+            'BACKEND': 'api.autocomplete.RedisPrefixIndex', 'MAX_PER_PREFIX': 2,
+        }):
+            index = autocomplete.get_index()
+            index.clear()
+            try:
+                index.bulk_add([
+                    (autocomplete.TITLE, 1, 'Zola', 5), (autocomplete.TITLE, 2, 'Zweig', 3),
+                    (autocomplete.TITLE, 3, 'Zadig', 1),
+                ])
+                # Zadig, elague du prefixe 'z', n'y revient pas ; ses autres prefixes sont incrementes
+                index.incr_many([(autocomplete.TITLE, 3), (autocomplete.TITLE, 1)], 10)
+                self.assertEqual(index.redis.zcard(index._key('z')), 2)
+                self.assertEqual([s['label'] for s in index.suggest('z', 5)], ['Zola', 'Zweig'])
+                self.assertEqual(index.redis.zscore(index._key('zadig'), 't:3:Zadig'), 11)
+            finally:
+                index.clear()
+
+
+class ReservationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(5)
+        self.user = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        self.client.force_authenticate(self.user)
+
+    def reserver(self, livre):
+        return self.client.post(reverse('reserver_livre', args=[livre.pk]))
+
+    def test_duplicate_and_limit_are_rejected(self):
+        self.assertEqual(self.reserver(self.livres[0]).status_code, 201)
+        response = self.reserver(self.livres[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already reserved', str(response.data))
+
+        self.reserver(self.livres[1])
+        response = self.client.post(reverse('titles-reserver', args=[self.livres[2].pk]))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('reservations-list'), {'book': self.livres[3].pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('3 active reservations', str(response.data))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_reservations, 3)
+
+    def test_counter_released_on_cancel(self):
+        self.reserver(self.livres[0])
+        reservation = Reservation.objects.get()
+        self.client.delete(reverse('reservations-detail', args=[reservation.pk]))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_reservations, 0)
+
+        self.reserver(self.livres[1])
+        self.livres[1].delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_reservations, 0)
+
+    def test_limit_check_does_not_count_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.reserver(self.livres[0])
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+
+class InventoryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livre = creer_catalogue(1, exemplaires=2)[0]
+        self.lecteurs = [
+            User.objects.create_user(f'lecteur{i}@example.com', 'Jean', 'Valjean') for i in range(3)
+        ]
+
+    def reserver(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('reserver_livre', args=[self.livre.pk]))
+
+    def disponibles(self):
+        return self.client.get(reverse('detail_livre', args=[self.livre.pk])).data['book']['available_count']
+
+    def test_copies_limit_reservations(self):
+        self.assertEqual(self.disponibles(), 2)
+        self.assertEqual(self.reserver(self.lecteurs[0]).status_code, 201)
+        self.assertEqual(self.reserver(self.lecteurs[1]).status_code, 201)
+        self.assertEqual(self.disponibles(), 0)
+        response = self.reserver(self.lecteurs[2])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not available', str(response.data))
+        self.assertEqual(Reservation.objects.count(), 2)
+        self.lecteurs[2].refresh_from_db()
+        self.assertEqual(self.lecteurs[2].active_reservations, 0)
+
+        Reservation.objects.filter(user=self.lecteurs[0]).delete()
+        self.assertEqual(self.disponibles(), 1)
+
+    def test_copies_endpoint_updates_counters(self):
+        admin = User.objects.create_superuser('admin@example.com', 'Ad', 'Min')
+        self.client.force_authenticate(admin)
+        response = self.client.post(reverse('copies-list'), {'title': self.livre.pk, 'barcode': 'B-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.disponibles(), 3)
+        self.client.delete(reverse('copies-detail', args=[response.data['id']]))
+        self.livre.refresh_from_db()
+        self.assertEqual((self.livre.total_copies, self.livre.available_count), (2, 2))
+
+    def test_reconcile_command_repairs_drift(self):
+        self.reserver(self.lecteurs[0])
+        Title.objects.filter(pk=self.livre.pk).update(total_copies=7, available_count=7)
+        User.objects.filter(pk=self.lecteurs[0].pk).update(active_reservations=0)
+        out = StringIO()
+        call_command('reconcile_inventory', batch_size=1, stdout=out)
+        self.assertIn('1 title(s) and 1 user(s) repaired', out.getvalue())
+        self.livre.refresh_from_db()
+        self.assertEqual((self.livre.total_copies, self.livre.available_count), (2, 1))
+        self.assertEqual(services.reconcile_inventory(), 0)
+
+
+class ReservationLifecycleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livre = creer_catalogue(1)[0]
+        self.user = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        self.admin = User.objects.create_superuser('admin@example.com', 'Ad', 'Min')
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('reserver_livre', args=[self.livre.pk]))
+        self.reservation = Reservation.objects.get()
+
+    def compteurs(self):
+        self.user.refresh_from_db()
+        self.livre.refresh_from_db()
+        return self.user.active_reservations, self.livre.available_count
+
+    def test_checkout_then_return(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse('reservations-emprunter', args=[self.reservation.pk]))
+        self.assertEqual(response.data['status'], 'checked_out')
+        self.assertEqual(self.compteurs(), (1, 0))
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('reservations-retourner', args=[self.reservation.pk]))
+        self.assertEqual(response.data['status'], 'returned')
+        self.assertIsNotNone(response.data['returned_at'])
+        self.assertEqual(self.compteurs(), (0, 1))
+
+        response = self.client.post(reverse('reservations-retourner', args=[self.reservation.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.compteurs(), (0, 1))
+
+    def test_cancel_keeps_history_and_frees_slot(self):
+        response = self.client.delete(reverse('reservations-detail', args=[self.reservation.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'cancelled')
+        self.assertEqual(self.compteurs(), (0, 1))
+        self.assertEqual(self.client.post(reverse('reserver_livre', args=[self.livre.pk])).status_code, 201)
+
+    def test_checked_out_reservation_cannot_be_cancelled(self):
+        services.check_out(self.reservation)
+        response = self.client.delete(reverse('reservations-detail', args=[self.reservation.pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_owner_can_return(self):
+        autre = User.objects.create_user('autre@example.com', 'Autre', 'Lecteur')
+        self.client.force_authenticate(autre)
+        response = self.client.post(reverse('reservations-retourner', args=[self.reservation.pk]))
+        self.assertEqual(response.status_code, 400)
+
+
+class WaitlistTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(4)
+        self.livre = self.livres[0]
+        self.lecteurs = [
+            User.objects.create_user(f'lecteur{i}@example.com', 'Jean', 'Valjean') for i in range(3)
+        ]
+        self.reservation = services.reserve(self.lecteurs[0], self.livre)
+
+    def attendre(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('file_attente', args=[self.livre.pk]))
+
+    def test_positions_and_promotion_on_return(self):
+        self.assertEqual(self.attendre(self.lecteurs[1]).data['position'], 1)
+        self.assertEqual(self.attendre(self.lecteurs[2]).data['position'], 2)
+        self.assertEqual(self.attendre(self.lecteurs[2]).status_code, 400)
+
+        promotions = []
+
+        def recevoir(sender, hold, reservation, **kwargs):
+            promotions.append(reservation)
+
+        services.hold_promoted.connect(recevoir)
+        self.addCleanup(services.hold_promoted.disconnect, recevoir)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.return_reservation(self.reservation)
+
+        promue = Reservation.objects.active().get(book=self.livre)
+        self.assertEqual(promue.user, self.lecteurs[1])
+        self.assertEqual(promotions, [promue])
+        self.assertEqual(Hold.objects.get(user=self.lecteurs[1]).status, 'fulfilled')
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.available_count, 0)
+
+        response = self.client.get(reverse('mes_attentes'))
+        self.assertEqual([h['position'] for h in response.data['holds']], [1])
+
+    def test_copy_returned_while_joining_is_given_to_the_new_holder(self):
+        # Retour committe entre la verification (instance perimee) et l'insertion de l'attente
+        livre = Title.objects.get(pk=self.livre.pk)
+        with mock.patch.object(services, 'promote_waitlist'):
+            services.return_reservation(self.reservation)
+        with self.captureOnCommitCallbacks(execute=True):
+            hold = services.join_waitlist(self.lecteurs[1], livre)
+
+        self.assertEqual(hold.status, Hold.Status.FULFILLED)
+        self.assertEqual(Reservation.objects.active().get(book=self.livre).user, self.lecteurs[1])
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.available_count, 0)
+
+    def test_cannot_wait_for_available_book(self):
+        self.client.force_authenticate(self.lecteurs[1])
+        response = self.client.post(reverse('file_attente', args=[self.livres[1].pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_holder_at_limit_is_skipped_but_keeps_place(self):
+        self.attendre(self.lecteurs[1])
+        self.attendre(self.lecteurs[2])
+        for livre in self.livres[1:]:
+            services.reserve(self.lecteurs[1], livre)
+        services.cancel(self.reservation)
+        self.assertEqual(Reservation.objects.active().get(book=self.livre).user, self.lecteurs[2])
+        self.assertEqual(services.waitlist_position(Hold.objects.get(user=self.lecteurs[1])), 1)
+
+    def test_leave_waitlist(self):
+        self.attendre(self.lecteurs[1])
+        self.assertEqual(self.client.delete(reverse('file_attente', args=[self.livre.pk])).status_code, 200)
+        self.assertEqual(self.client.delete(reverse('file_attente', args=[self.livre.pk])).status_code, 404)
+
+
+class ExpiryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(3)
+        self.lecteurs = [
+            User.objects.create_user(f'lecteur{i}@example.com', 'Jean', 'Valjean') for i in range(3)
+        ]
+
+    def test_expires_overdue_reserved_rows_in_batches(self):
+        echues = [services.reserve(self.lecteurs[0], livre) for livre in self.livres[:2]]
+        empruntee = services.check_out(services.reserve(self.lecteurs[1], self.livres[2]))
+        Reservation.objects.filter(pk__in=[r.pk for r in echues] + [empruntee.pk]).update(
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+        cache.set(f'reservations_{self.lecteurs[0].pk}', ['obsolete'])
+        Hold.objects.create(user=self.lecteurs[2], book=self.livres[0])
+
+        with override_settings(METRICS={'BACKEND': 'api.metrics.MemoryStore'}):
+            stats = expiry.expire_overdue_reservations(batch_size=1)
+            # Compteurs deja pousses dans le stockage partage (/metrics)
+            valeurs = metrics.get_registry().store.read()
+
+        self.assertEqual(stats['expired'], 2)
+        self.assertIn('rows_per_second', stats)
+        self.assertEqual(valeurs[(metrics.EXPIRED, ())], 2)
+        self.assertEqual(valeurs[(metrics.EXPIRY_DURATION + '_count', ())], 1)
+        self.assertEqual(
+            set(Reservation.objects.filter(pk__in=[r.pk for r in echues]).values_list('status', flat=True)),
+            {'expired'},
+        )
+        empruntee.refresh_from_db()
+        self.assertEqual(empruntee.status, 'checked_out')
+        self.lecteurs[0].refresh_from_db()
+        self.assertEqual(self.lecteurs[0].active_reservations, 0)
+        self.assertIsNone(cache.get(f'reservations_{self.lecteurs[0].pk}'))
+        self.assertEqual(Reservation.objects.active().get(book=self.livres[0]).user, self.lecteurs[2])
+        self.assertEqual(Title.objects.get(pk=self.livres[1].pk).available_count, 1)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(2)
+
+    def test_unchanged_resources_return_304_without_queries(self):
+        for url in [
+            reverse('detail_livre', args=[self.livres[0].pk]), reverse('liste_livres'),
+            reverse('liste_auteurs'), reverse('liste_editeurs'),
+            reverse('livres_par_auteur', args=[Author.objects.first().pk]),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('s-maxage=300', response['Cache-Control'])
+            with self.assertNumQueries(0):
+                revalide = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalide.status_code, 304)
+            self.assertEqual(revalide['ETag'], response['ETag'])
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+            )
+
+    def test_writes_change_the_validators(self):
+        url = reverse('detail_livre', args=[self.livres[0].pk])
+        etag = self.client.get(url)['ETag']
+        livre = Title.objects.get(pk=self.livres[0].pk)
+        livre.title = 'Nouveau titre'
+        livre.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['book']['title'], 'Nouveau titre')
+
+        etag = self.client.get(reverse('liste_editeurs'))['ETag']
+        Author.objects.create(author='Emile Zola', year_born=1840)
+        self.assertEqual(self.client.get(reverse('liste_editeurs'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('liste_auteurs'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_personalised_list_is_private_and_per_user(self):
+        url = reverse('liste_livres')
+        anonyme = self.client.get(url)
+        self.assertIn('Authorization', anonyme['Vary'])
+        lecteur = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        self.client.force_authenticate(lecteur)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonyme['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+        services.reserve(lecteur, self.livres[0])
+        reponse = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(len(reponse.data['reserved_books_by_user']), 1)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(3)
+
+    def test_fields_restrict_output_and_selected_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('titles-list'), {'fields': 'title_id,title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'title_id', 'title'})
+        # Une seule requete : ni auteurs prefetches, ni colonnes texte lues
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('search_vector', sql)
+
+    def test_expand_nests_publisher_with_a_join(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('detail_livre', args=[self.livres[0].pk]), {'fields': 'title,pubid', 'expand': 'pubid'}
+            )
+        self.assertEqual(response.data['book']['pubid']['name'], 'Gallimard')
+        default = self.client.get(reverse('detail_livre', args=[self.livres[0].pk]))
+        self.assertEqual(default.data['book']['pubid'], self.livres[0].pubid_id)
+        self.assertIn('description', default.data['book'])
+
+    def test_compact_list_view(self):
+        response = self.client.get(reverse('liste_livres'), {'view': 'compact'})
+        livre = response.data['books'][0]
+        self.assertNotIn('description', livre)
+        self.assertNotIn('comments', livre)
+        self.assertEqual(set(livre['authors'][0]), {'au_id', 'author'})
+        self.assertIn('description', self.client.get(reverse('titles-detail', args=[livre['title_id']])).data)
+        self.assertNotIn('notes', self.client.get(reverse('titles-list'), {'view': 'compact'}).data['results'][0])
+
+    def test_author_and_publisher_endpoints(self):
+        auteurs = self.client.get(reverse('liste_auteurs'), {'fields': 'author'}).data['authors']
+        self.assertEqual(set(auteurs[0]), {'author'})
+        self.assertEqual(set(self.client.get(reverse('liste_auteurs')).data['authors'][0]),
+                         {'au_id', 'author', 'year_born', 'updated_at'})
+        editeurs = self.client.get(reverse('liste_editeurs'), {'fields': 'pubid,name'}).data['publishers']
+        self.assertEqual(editeurs, [{'pubid': self.livres[0].pubid_id, 'name': 'Gallimard'}])
+        auteur = Author.objects.first()
+        response = self.client.get(reverse('authors-detail', args=[auteur.pk]), {'expand': 'titles'})
+        self.assertEqual(len(response.data['titles']), 3)
+        self.assertNotIn('description', response.data['titles'][0])
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('titles-list'), {'fields': 'title,password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('liste_livres'), {'expand': 'copies'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('liste_livres'), {'view': 'tiny'}).status_code, 400)
+
+
+class SerializerParityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(4)
+        Title.objects.filter(pk=self.livres[0].pk).update(
+            cover_image='book_covers/couverture.jpg', notes='Première édition', comments=None,
+        )
+        self.livres[1].authors.remove(*self.livres[1].authors.all())
+        self.lecteur = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+        services.reserve(self.lecteur, self.livres[2])
+        services.check_out(services.reserve(self.lecteur, self.livres[3]))
+
+    def assertParity(self, serializer_class, queryset, fieldset=None):
+        rendu = fastpath.plan(serializer_class, fieldset)
+        self.assertIsInstance(rendu, fastpath.RowPlan)
+        fieldset = fieldset or Fieldset()
+        if hasattr(serializer_class, 'optimize'):
+            attendu = serializer_class(
+                fieldset.queryset(serializer_class, queryset), many=True, **fieldset.kwargs
+            ).data
+        else:
+            attendu = serializer_class(queryset, many=True).data
+        self.assertEqual(JSONRenderer().render(rendu.serialize(queryset)), JSONRenderer().render(attendu))
+
+    def test_fast_path_is_byte_identical_to_serializers(self):
+        livres = Title.objects.for_catalog().order_by('pk')
+        self.assertParity(TitleSerializer, livres)
+        self.assertParity(TitleListSerializer, livres)
+        self.assertParity(TitleSerializer, livres, Fieldset(['title', 'pubid', 'authors'], ['pubid']))
+        self.assertParity(TitleSerializer, livres, Fieldset(['cover_image']))
+        self.assertParity(AuthorSerializer, Author.objects.order_by('pk'))
+        self.assertParity(AuthorSerializer, Author.objects.order_by('pk'), Fieldset(expand=['titles']))
+        self.assertParity(PublishersSerializer, Publishers.objects.order_by('pk'))
+        self.assertParity(ReservationSerializer, Reservation.objects.order_by('pk'))
+
+    def test_nested_authors_use_one_grouped_query(self):
+        with self.assertNumQueries(2):
+            livres = fastpath.plan(TitleSerializer).serialize(Title.objects.order_by('pk'))
+        self.assertEqual(len(livres[0]['authors']), 3)
+        self.assertEqual(livres[1]['authors'], [])
+
+    def test_unsupported_serializer_falls_back_to_drf(self):
+        rendu = fastpath.plan(TitleSearchSerializer)
+        self.assertIsInstance(rendu, fastpath.SerializerPlan)
+
+
+class RendererTests(APITestCase):
+    donnees = {
+        'titre': 'Les Misérables', 'ligne': 'a\u2028b', 'prix': Decimal('12.50'), 'date': date(2024, 5, 1),
+        'maj': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc), 'vide': None,
+        'erreurs': {0: ['Obligatoire'], 3: ['Trop long']}, 'liste': (1, 2.5, True),
+    }
+
+    def test_output_matches_drf_renderer(self):
+        attendu = JSONRenderer().render(self.donnees)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.donnees), attendu)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.donnees), attendu)
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(self.donnees, 'application/json; indent=2'),
+            JSONRenderer().render(self.donnees, 'application/json; indent=2'),
+        )
+
+    def test_fragments_are_spliced_verbatim(self):
+        livres = [{'title_id': 1, 'title': 'Été'}, {'title_id': 2, 'title': '"Cité"'}]
+        fragments = [renderers.Fragment(renderers.dumps(livre)) for livre in livres]
+        attendu = JSONRenderer().render({'books': livres, 'next': None})
+        self.assertEqual(renderers.FastJSONRenderer().render({'books': fragments, 'next': None}), attendu)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render({'books': fragments, 'next': None}), attendu)
+        self.assertEqual(fragments[1]['title'], '"Cité"')
+        self.assertEqual(fragments, livres)
+
+    def test_list_endpoints_reuse_cached_fragments(self):
+        cache.clear()
+        creer_catalogue(5)
+        url = reverse('liste_livres')
+        premiere = self.client.get(url, {'page_size': 5})
+        self.assertEqual(premiere.content, JSONRenderer().render(premiere.json()))
+        # Autre URL (autre taille de page) : lignes relues, mais auteurs et encodage servis par le cache
+        with self.assertNumQueries(1):
+            seconde = self.client.get(url, {'page_size': 3})
+        self.assertEqual(seconde.json()['books'], premiere.json()['books'][:3])
+        self.assertEqual(len(self.client.get(reverse('liste_auteurs')).json()['authors']), 3)
+
+
+class ImportCatalogTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.get_index().clear()
+        creer_catalogue(0, nb_auteurs=0)
+        self.editeur = Publishers.objects.get()
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def importer(self, nom, contenu, **options):
+        chemin = os.path.join(self.dossier.name, nom)
+        with open(chemin, 'w', encoding='utf-8') as fichier:
+            fichier.write(contenu)
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_catalog', chemin, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_upsert_dedupes_authors_and_reports_errors(self):
+        Author.objects.create(author='Victor Hugo', year_born=1802)
+        lignes = [
+            {'isbn': '111', 'title': 'Les Misérables', 'year_published': 1862, 'pubid': self.editeur.pk,
+             'authors': [{'author': 'Victor Hugo', 'year_born': 1802}], 'copies': 2},
+            {'isbn': '222', 'title': 'Germinal', 'year_published': 1885, 'pubid': self.editeur.pk,
+             'authors': ['Émile Zola:1840']},
+            {'isbn': '333', 'title': 'Sans éditeur', 'year_published': 1900, 'pubid': 999},
+        ]
+        out, err = self.importer('catalogue.jsonl', '\n'.join(json.dumps(l) for l in lignes) + '\n{oops\n')
+        self.assertIn('2 created, 0 updated, 1 new author(s), 2 rejected', out)
+        self.assertIn('line 3: unknown publisher 999', err)
+        self.assertIn('line 4: invalid JSON', err)
+
+        miserables = Title.objects.get(isbn='111')
+        self.assertEqual((miserables.total_copies, miserables.available_count), (2, 2))
+        self.assertEqual(miserables.copies.count(), 2)
+        self.assertEqual(list(miserables.authors.values_list('author', flat=True)), ['Victor Hugo'])
+        self.assertEqual(Author.objects.filter(author='Victor Hugo').count(), 1)
+        self.assertEqual(
+            autocomplete.get_index().suggest('germ', 5),
+            [{'type': 'title', 'id': Title.objects.get(isbn='222').pk, 'label': 'Germinal'}],
+        )
+
+        # Reimport CSV : mise a jour par ISBN, inventaire inchange
+        csv = 'isbn,title,year_published,pubid,authors\n111,Les Misérables (édition intégrale),1862,{0},Victor Hugo:1802|Émile Zola:1840\n'
+        out, _ = self.importer('catalogue.csv', csv.format(self.editeur.pk))
+        self.assertIn('0 created, 1 updated, 0 new author(s)', out)
+        miserables.refresh_from_db()
+        self.assertEqual(miserables.title, 'Les Misérables (édition intégrale)')
+        self.assertEqual((miserables.total_copies, miserables.copies.count()), (2, 2))
+        self.assertEqual(miserables.authors.count(), 2)
+        self.assertEqual(Title.objects.count(), 2)
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        def requetes(nb, debut):
+            contenu = ''.join(
+                json.dumps({'isbn': f'{debut + i}', 'title': f'Livre {i}', 'year_published': 2000,
+                            'pubid': self.editeur.pk, 'authors': [f'Auteur {i}:1950']}) + '\n'
+                for i in range(nb)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                self.importer(f'{debut}.jsonl', contenu, batch_size=1000)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(requetes(5, 1000), requetes(50, 5000))
+
+    def test_author_cache_eviction_keeps_batch_authors(self):
+        # Lot 3 : un nouvel auteur et un deja vu, cache au-dela de la limite -> vide puis tout resolu
+        auteurs = ['A0:1900', 'A1:1900', 'A2:1900', 'A0:1900', 'A3:1900', 'A1:1900']
+        contenu = ''.join(
+            json.dumps({'isbn': f'9{i}', 'title': f'Livre {i}', 'year_published': 2000,
+                        'pubid': self.editeur.pk, 'authors': [auteur]}) + '\n'
+            for i, auteur in enumerate(auteurs)
+        )
+        with mock.patch('api.importer.MAX_AUTHOR_CACHE', 2):
+            out, _ = self.importer('auteurs.jsonl', contenu, batch_size=2)
+        self.assertIn('6 created, 0 updated, 4 new author(s), 0 rejected', out)
+        self.assertEqual(Author.objects.count(), 4)
+        self.assertEqual(
+            list(Title.objects.get(isbn='95').authors.values_list('author', flat=True)), ['A1'],
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Recherche plein texte PostgreSQL')
+    def test_search_vectors_written_by_upsert(self):
+        contenu = json.dumps({
+            'isbn': '444', 'title': 'Notre-Dame de Paris', 'year_published': 1831, 'pubid': self.editeur.pk,
+            'subject': 'Roman', 'description': 'Quasimodo', 'authors': ['Victor Hugo:1802'],
+        }) + '\n'
+        self.importer('vecteurs.jsonl', contenu)
+        importe = Title.objects.values_list('search_vector', flat=True).get(isbn='444')
+        search.update_search_vectors()
+        self.assertEqual(importe, Title.objects.values_list('search_vector', flat=True).get(isbn='444'))
+        self.assertEqual([livre.isbn for livre in search.search_titles('hugo quasimodo')], ['444'])
+
+
+class ExportCatalogTests(APITestCase):
+    def setUp(self):
+        self.livres = creer_catalogue(5, nb_auteurs=2)
+        self.client.force_authenticate(User.objects.create_user('partenaire@example.com', 'Par', 'Tenaire'))
+
+    def exporter(self, headers=None, **params):
+        response = self.client.get(reverse('export_catalogue'), params, **(headers or {}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_streams_jsonl_with_authors_and_updated_since(self):
+        response, contenu = self.exporter()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lignes = [json.loads(ligne) for ligne in contenu.decode().splitlines()]
+        self.assertEqual([l['isbn'] for l in lignes], [l.isbn for l in self.livres])
+        self.assertEqual(lignes[0]['authors'], [
+            {'author': 'Auteur 0', 'year_born': 1900}, {'author': 'Auteur 1', 'year_born': 1901},
+        ])
+
+        Title.objects.exclude(pk=self.livres[2].pk).update(updated_at=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        _, contenu = self.exporter(updated_since=since)
+        self.assertEqual([json.loads(l)['isbn'] for l in contenu.decode().splitlines()], [self.livres[2].isbn])
+        self.assertEqual(
+            self.client.get(reverse('export_catalogue'), {'updated_since': 'hier'}).status_code, 400
+        )
+
+    def test_author_changes_mark_titles_updated(self):
+        Title.objects.update(updated_at=timezone.now() - timedelta(days=10))
+        Author.objects.filter(author='Auteur 0').get().titles.remove(self.livres[1])
+        self.assertEqual(
+            list(Title.objects.filter(updated_at__gte=timezone.now() - timedelta(days=1))), [self.livres[1]]
+        )
+
+    def test_csv_gzip_and_authentication(self):
+        response, contenu = self.exporter(export_format='csv', headers={'HTTP_ACCEPT_ENCODING': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lignes = gzip.decompress(contenu).decode().splitlines()
+        self.assertTrue(lignes[0].startswith('title_id,isbn,title'))
+        self.assertTrue(lignes[1].endswith('Auteur 0:1900|Auteur 1:1901'))
+        self.assertEqual(len(lignes), 6)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('export_catalogue')).status_code, 401)
+
+    def test_command_output_reimports_unchanged(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'catalogue.csv.gz')
+            call_command('export_catalog', chemin, format='csv', gzip=True, stderr=StringIO())
+            with gzip.open(chemin, 'rt', encoding='utf-8') as fichier:
+                contenu = fichier.read()
+            self.assertEqual(len(contenu.splitlines()), 6)
+            csv_path = os.path.join(dossier, 'catalogue.csv')
+            with open(csv_path, 'w', encoding='utf-8', newline='') as fichier:
+                fichier.write(contenu)
+            out = StringIO()
+            call_command('import_catalog', csv_path, stdout=out, stderr=StringIO())
+        self.assertIn('0 created, 5 updated, 0 new author(s), 0 rejected', out.getvalue())
+        self.assertEqual(self.livres[0].authors.count(), 2)
+
+
+class BulkWriteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.get_index().clear()
+        self.livres = creer_catalogue(2)
+        self.editeur = Publishers.objects.get()
+        self.client.force_authenticate(User.objects.create_superuser('admin@example.com', 'Ad', 'Min'))
+
+    def livre(self, i, **champs):
+        return {'isbn': f'979{i:010d}', 'title': f'Nouveau {i}', 'year_published': 2020,
+                'pubid': self.editeur.pk, 'description': 'Roman', **champs}
+
+    def test_bulk_create_titles_in_constant_queries_with_one_invalidation(self):
+        url = reverse('titles-bulk')
+        with mock.patch.object(catalog_cache, '_bump', wraps=catalog_cache._bump) as bump:
+            with CaptureQueriesContext(connection) as petit, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(url, [self.livre(i) for i in range(2)], format='json').status_code, 201)
+        self.assertEqual(bump.call_count, 2)  # immediat + au commit
+        with CaptureQueriesContext(connection) as grand:
+            response = self.client.post(url, [self.livre(i, copies=2) for i in range(10, 40)], format='json')
+        self.assertEqual(response.status_code, 201)
+        # Seule la validation est par ligne (unicite de l'ISBN, editeur) ; les ecritures sont groupees
+        self.assertEqual(len(grand.captured_queries) - len(petit.captured_queries), 2 * 28)
+
+        self.assertEqual(len(response.data), 30)
+        cree = Title.objects.get(isbn=self.livre(10)['isbn'])
+        self.assertEqual((cree.total_copies, cree.available_count, cree.copies.count()), (2, 2, 2))
+        self.assertEqual(autocomplete.get_index().suggest('nouveau', 50)[0]['type'], 'title')
+
+    def test_errors_are_reported_per_item_and_nothing_is_written(self):
+        response = self.client.post(reverse('titles-bulk'), [
+            self.livre(1), self.livre(2, isbn=self.livres[0].isbn), self.livre(3, year_published='x'),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2])
+        self.assertIn('isbn', response.data['errors'][0]['errors'])
+        self.assertEqual(Title.objects.count(), 2)
+
+        response = self.client.patch(reverse('titles-bulk'), [
+            {'title_id': self.livres[0].pk, 'title': 'Renomme'}, {'title_id': 999999, 'title': 'X'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertFalse(Title.objects.filter(title='Renomme').exists())
+
+    def test_duplicate_unique_keys_in_one_batch_are_reported_per_item(self):
+        isbn = self.livre(1)['isbn']
+        response = self.client.post(reverse('titles-bulk'), [
+            self.livre(1), self.livre(2), self.livre(3, isbn=isbn),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'errors': [
+            {'index': 2, 'errors': {'isbn': ['Duplicate value in this batch (item 0).']}},
+        ]})
+        self.assertEqual(Title.objects.count(), 2)
+
+        response = self.client.patch(reverse('titles-bulk'), [
+            {'title_id': livre.pk, 'isbn': isbn} for livre in self.livres
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1])
+        self.assertFalse(Title.objects.filter(isbn=isbn).exists())
+
+    def test_bulk_update_and_delete(self):
+        url = reverse('liste_livres')
+        self.client.get(url)
+        auteur = Author.objects.first()
+        response = self.client.patch(reverse('authors-bulk'), [
+            {'au_id': auteur.pk, 'author': 'Victor Hugo'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        noms = [a['author'] for a in self.client.get(url).data['books'][0]['authors']]
+        self.assertIn('Victor Hugo', noms)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('titles-bulk'), [
+                {'title_id': livre.pk, 'title': f'Edition {livre.pk}'} for livre in self.livres
+            ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).data['books'][0]['title'], f'Edition {self.livres[0].pk}')
+        self.assertEqual(len(autocomplete.get_index().suggest('edition', 10)), 2)
+
+        response = self.client.delete(reverse('titles-bulk'), [livre.pk for livre in self.livres], format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(self.client.get(url).data['books'], [])
+
+        response = self.client.post(reverse('publishers-bulk'), [{'name': 'Seuil'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.delete(reverse('authors-bulk'), [auteur.pk], format='json').status_code, 401)
+
+
+class TitleFilterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(6)
+        self.editeur = Publishers.objects.create(
+            name='Seuil', company_name='Editions du Seuil', address='57 rue Gaston-Tessier', city='Paris',
+            state='FR', zip='75019', telephone='-', fax='-', comments='',
+        )
+        self.hugo = Author.objects.create(author='Victor Hugo', year_born=1802)
+        for i, livre in enumerate(self.livres):
+            livre.subject = 'Roman' if i % 2 else 'Poésie'
+            livre.year_published = 1985 + 5 * i
+            if i >= 4:
+                livre.pubid = self.editeur
+            livre.save()
+        self.livres[0].authors.add(self.hugo)
+        self.livres[3].authors.add(self.hugo)
+
+    def ids(self, **params):
+        response = self.client.get(reverse('titles-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [livre['title_id'] for livre in response.data['results']]
+
+    def test_filters(self):
+        pks = [livre.pk for livre in self.livres]
+        self.assertEqual(sorted(self.ids(subject='Roman')), pks[1::2])
+        self.assertEqual(sorted(self.ids(pubid=self.editeur.pk)), pks[4:])
+        self.assertEqual(sorted(self.ids(author=self.hugo.pk)), [pks[0], pks[3]])
+        self.assertEqual(sorted(self.ids(decade=1990)), pks[1:3])
+        self.assertEqual(sorted(self.ids(year_min=1995, year_max=2005, subject='Roman,Poésie')), pks[2:5])
+        self.assertEqual(self.client.get(reverse('titles-list'), {'pubid': 'x'}).status_code, 400)
+
+    def test_ordering_with_cursor_pagination(self):
+        Title.objects.filter(pk__in=[self.livres[1].pk, self.livres[2].pk]).update(year_published=2000)
+        attendu = list(Title.objects.order_by('-year_published', 'title_id').values_list('pk', flat=True))
+        self.assertEqual(self.ids(ordering='-year_published'), attendu)
+        vus, url, params = [], reverse('titles-list'), {'ordering': '-year_published', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            vus.extend(livre['title_id'] for livre in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(vus, attendu)
+        self.assertEqual(self.ids(ordering='-pubid,title_id')[:2], [self.livres[4].pk, self.livres[5].pk])
+
+    def test_facets_in_one_cached_query(self):
+        url = reverse('titles-facets')
+        with self.assertNumQueries(1):
+            facettes = self.client.get(url).data
+        self.assertEqual(facettes['subject'], [{'value': 'Poésie', 'count': 3}, {'value': 'Roman', 'count': 3}])
+        self.assertEqual(
+            facettes['decade'],
+            [{'value': 1980, 'count': 1}, {'value': 1990, 'count': 2}, {'value': 2000, 'count': 2},
+             {'value': 2010, 'count': 1}],
+        )
+        self.assertEqual([(f['name'], f['count']) for f in facettes['publisher']], [('Gallimard', 4), ('Seuil', 2)])
+        self.assertEqual(facettes['count'], 6)
+
+        filtrees = self.client.get(url, {'author': self.hugo.pk}).data
+        self.assertEqual(filtrees['subject'], [{'value': 'Poésie', 'count': 1}, {'value': 'Roman', 'count': 1}])
+        with self.assertNumQueries(0):
+            self.client.get(url, {'author': self.hugo.pk})
+
+        livre = self.livres[0]
+        livre.subject = 'Roman'
+        livre.save()
+        self.assertEqual(self.client.get(url).data['subject'][0], {'value': 'Roman', 'count': 4})
+
+
+class QueryBudgetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        revocation.get_store().clear()
+        self.livres = creer_catalogue(40, nb_auteurs=5)
+        self.lecteur = User.objects.create_user('budget@example.com', 'Bud', 'Get')
+        services.reserve(self.lecteur, self.livres[0])
+        jeton = RefreshToken.for_user(self.lecteur).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {jeton}')
+
+    def test_budgeted_endpoints_stay_within_budget(self):
+        auteur, editeur, livre = Author.objects.first(), Publishers.objects.first(), self.livres[0]
+        urls = [
+            reverse('liste_livres'), reverse('liste_livres') + '?expand=pubid&view=compact',
+            reverse('mes_reservations'), reverse('liste_auteurs') + '?expand=titles',
+            reverse('livres_par_auteur', args=[auteur.pk]), reverse('liste_editeurs'),
+            reverse('detail_livre', args=[livre.pk]), reverse('mes_attentes'),
+            reverse('titles-list') + '?page_size=20', reverse('titles-detail', args=[livre.pk]),
+            reverse('titles-facets'), reverse('authors-list'), reverse('authors-livres', args=[auteur.pk]),
+            reverse('publishers-detail', args=[editeur.pk]),
+        ]
+        with instrumentation.capture_metrics() as mesures:
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertEqual(len(mesures), len(urls))
+        for url, mesure in zip(urls, mesures):
+            self.assertIsNotNone(mesure.budget, url)
+            self.assertLessEqual(mesure.queries, mesure.budget, url)
+
+    def test_server_timing_and_cache_counters(self):
+        url = reverse('liste_livres') + '?page_size=10'
+        with instrumentation.capture_metrics() as mesures:
+            froid = self.client.get(url)
+            chaud = self.client.get(url)
+        self.assertEqual(mesures[0].view, 'liste_livres')
+        self.assertEqual((mesures[0].cache_hits, mesures[0].cache_misses), (1, 11))
+        self.assertEqual((mesures[1].cache_hits, mesures[1].cache_misses), (2, 0))
+        self.assertLess(mesures[1].queries, mesures[0].queries)
+        self.assertIn('serialize', mesures[0].timings)
+        self.assertIn(f'desc="{mesures[0].queries} queries"', froid['Server-Timing'])
+        self.assertIn('render;dur=', chaud['Server-Timing'])
+        self.assertIn('total;dur=', chaud['Server-Timing'])
+
+    def test_viewset_budget_resolved_by_action(self):
+        with instrumentation.capture_metrics() as mesures:
+            self.client.get(reverse('titles-list'))
+            self.client.get(reverse('copies-list'))
+        self.assertEqual((mesures[0].view, mesures[0].budget), ('TitleViewSet.list', 3))
+        self.assertEqual((mesures[1].view, mesures[1].budget), ('CopyViewSet.list', None))
+
+    def test_over_budget(self):
+        url = reverse('liste_editeurs')
+        with mock.patch.object(views.liste_editeurs, 'query_budget', 0):
+            with self.assertRaisesMessage(instrumentation.QueryBudgetExceeded, 'liste_editeurs: 2 queries, budget 0'):
+                self.client.get(url)
+            cache.clear()
+            with instrumentation.enforce_budgets(False), self.assertLogs('api.instrumentation', 'WARNING') as logs:
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(logs.records[0].queries, 2)
+        self.assertEqual(logs.records[0].query_budget, 0)
+
+
+class PrincipalAuthTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        revocation.get_store().clear()
+        self.livres = creer_catalogue(3)
+        self.lecteur = User.objects.create_user('principal@example.com', 'Jean', 'Valjean', password='s3cret-pass')
+        services.reserve(self.lecteur, self.livres[1])
+
+    def connecter(self):
+        reponse = self.client.post(reverse('get_token'), {'email': 'principal@example.com', 'password': 's3cret-pass'})
+        self.assertEqual(reponse.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {reponse.json()['access']}")
+
+    def test_claims_avoid_user_lookup(self):
+        self.connecter()
+        url = reverse('liste_livres')
+        self.client.get(url)
+        # Utilisateur, page et titres reserves en cache : aucune requete
+        with self.assertNumQueries(0):
+            reponse = self.client.get(url)
+        self.assertEqual([livre['title_id'] for livre in reponse.data['reserved_books_by_user']], [self.livres[1].pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(reverse('mes_reservations')).data['reservations']), 1)
+        # Attributs hors claims : User charge une fois, puis servi par le cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('user-profile')).data['email'], 'principal@example.com')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('user-profile'))
+
+        services.reserve(self.lecteur, self.livres[2])
+        reserves = self.client.get(url).data['reserved_books_by_user']
+        self.assertEqual([livre['title_id'] for livre in reserves], [self.livres[1].pk, self.livres[2].pk])
+
+    def test_user_save_invalidates_cached_user(self):
+        self.connecter()
+        self.client.get(reverse('user-profile'))
+        self.lecteur.first_name = 'Fantine'
+        self.lecteur.save()
+        self.assertEqual(self.client.get(reverse('user-profile')).data['first_name'], 'Fantine')
+
+    def test_cached_user_excludes_password_hash(self):
+        user = authentication.cached_user(self.lecteur.pk)
+        self.assertNotIn(self.lecteur.password, str(cache.get(f'auth:user-fields:{self.lecteur.pk}')))
+        self.assertEqual(user.email, 'principal@example.com')
+        self.assertIn('password', user.get_deferred_fields())
+        # Relu en base a la demande
+        with self.assertNumQueries(1):
+            self.assertTrue(authentication.cached_user(self.lecteur.pk).check_password('s3cret-pass'))
+
+    def test_revocation_and_deactivation(self):
+        self.connecter()
+        authentication.bump_token_version(self.lecteur.pk)
+        self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 401)
+
+        self.connecter()
+        self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 200)
+        self.lecteur.is_active = False
+        self.lecteur.save()
+        self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 401)
+
+    def test_role_change_revokes_tokens(self):
+        for champ in ('is_staff', 'is_superuser'):
+            self.connecter()
+            self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 200)
+            setattr(self.lecteur, champ, True)
+            self.lecteur.save()
+            # Jeton emis avec l'ancien droit : refuse, un nouveau jeton porte le nouveau
+            self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 401)
+        self.connecter()
+        self.assertEqual(self.client.get(reverse('users-list')).status_code, 200)
+
+        # Droits inchanges : les sessions restent ouvertes, sans relecture si update_fields les exclut
+        self.lecteur.first_name = 'Fantine'
+        self.lecteur.save()
+        with self.assertNumQueries(1):
+            self.lecteur.save(update_fields=['first_name'])
+        self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 200)
+
+    def test_tokens_without_claims_still_accepted(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.lecteur).access_token}')
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 200)
+
+    def test_principal_behaves_like_user(self):
+        principal = authentication.Principal(self.lecteur.pk, False, False, 0)
+        self.assertEqual(principal.pk, self.lecteur.pk)
+        self.assertEqual(Reservation.objects.filter(user=principal).count(), 1)
+        self.assertEqual(Reservation.objects.get(user=principal).user, principal)
+        self.assertIsInstance(principal, User)
+
+
+@override_settings(TOKEN_REVOCATION={'BACKEND': 'api.revocation.MemoryRevocationStore'})
+class TokenRotationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.lecteur = User.objects.create_user('rotation@example.com', 'Jean', 'Valjean', password='s3cret-pass')
+
+    def connecter(self, client=None):
+        client = client or self.client
+        reponse = client.post(reverse('get_token'), {'email': 'rotation@example.com', 'password': 's3cret-pass'})
+        self.assertEqual(reponse.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {reponse.json()['access']}")
+        return reponse.cookies['refresh_token'].value
+
+    def rafraichir(self, refresh, client=None):
+        client = client or self.client
+        client.cookies['refresh_token'] = refresh
+        return client.post(reverse('refresh_access_token'))
+
+    def test_refresh_token_is_single_use(self):
+        ancien = self.connecter()
+        reponse = self.rafraichir(ancien)
+        self.assertEqual(reponse.status_code, 200)
+        nouveau = reponse.cookies['refresh_token'].value
+        self.assertNotEqual(nouveau, ancien)
+        self.assertEqual(reponse.cookies['refresh_token']['max-age'], 86400)
+
+        # Ancien jeton rejoue : refuse, et toutes les sessions du lecteur sont revoquees
+        self.assertEqual(self.rafraichir(ancien).status_code, 401)
+        self.assertEqual(self.rafraichir(nouveau).status_code, 401)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        refresh = self.connecter()
+        autre = APIClient()
+        self.connecter(autre)
+        self.assertEqual(self.client.post(reverse('deconnexion')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+        self.assertEqual(self.rafraichir(refresh).status_code, 401)
+        # Les autres sessions restent ouvertes
+        self.assertEqual(autre.get(reverse('user-profile')).status_code, 200)
+
+    def test_logout_all_sessions(self):
+        self.connecter()
+        autre = APIClient()
+        refresh = self.connecter(autre)
+        self.assertEqual(self.client.post(reverse('deconnexion_partout')).status_code, 200)
+        self.assertEqual(autre.get(reverse('user-profile')).status_code, 401)
+        self.assertEqual(self.rafraichir(refresh, autre).status_code, 401)
+
+    def test_password_change_revokes_sessions(self):
+        refresh = self.connecter()
+        self.lecteur.set_password('autre-pass')
+        self.lecteur.save()
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+        self.assertEqual(self.rafraichir(refresh).status_code, 401)
+
+    def test_rotation_reloads_claims(self):
+        refresh = self.connecter()
+        User.objects.filter(pk=self.lecteur.pk).update(is_staff=True)
+        authentication.invalidate_user(self.lecteur.pk)
+        acces = self.rafraichir(refresh).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {acces}')
+        self.assertEqual(self.client.get(reverse('users-list')).status_code, 200)
+
+    def test_memory_store_expiry(self):
+        store = revocation.MemoryRevocationStore()
+        self.assertTrue(store.revoke('jti', 60))
+        self.assertFalse(store.revoke('jti', 60))
+        self.assertEqual(store.state(7, 'jti'), (0, True))
+        with mock.patch('api.revocation.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(store.state(7, 'jti'), (0, False))
+        self.assertEqual(store.bump(7), 1)
+
+    @skipUnless('django_redis' in settings.CACHES['default']['BACKEND'], 'Stockage Redis')
+    def test_redis_store(self):
+        store = revocation.RedisRevocationStore()
+        jti = f'test-{time.time()}'
+        self.assertTrue(store.revoke(jti, 60))
+        self.assertFalse(store.revoke(jti, 60))
+        self.assertLessEqual(store.redis.ttl(f'{store.REVOKED_PREFIX}{jti}'), 60)
+        version = store.version(-1)
+        self.assertEqual(store.bump(-1), version + 1)
+        self.assertEqual(store.state(-1, jti), (version + 1, True))
+        store.redis.delete(f'{store.VERSION_PREFIX}-1', f'{store.REVOKED_PREFIX}{jti}')
+
+
+@override_settings(METRICS={
+    'BACKEND': 'api.metrics.MemoryStore', 'FLUSH_INTERVAL': 60, 'BUCKETS': (0.1, 1), 'TOKEN': 's3cret',
+})
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(3)
+        self.lecteur = User.objects.create_user('metrics@example.com', 'Met', 'Rics')
+
+    def series(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lignes = response.content.decode().splitlines()
+        return dict(ligne.rsplit(' ', 1) for ligne in lignes if not ligne.startswith('#'))
+
+    def test_requests_queries_cache_and_reservations(self):
+        self.client.get(reverse('liste_livres'))
+        self.client.get(reverse('liste_livres'))
+        self.client.get('/api/v1/nowhere/')
+        services.reserve(self.lecteur, self.livres[0])
+        with self.assertRaises(services.AlreadyReserved):
+            services.reserve(self.lecteur, self.livres[0])
+
+        series = self.series()
+        livres = 'view="liste_livres",method="GET",status="200"'
+        self.assertEqual(series[f'api_request_duration_seconds_count{{{livres}}}'], '2')
+        self.assertEqual(series[f'api_request_duration_seconds_bucket{{{livres},le="+Inf"}}'], '2')
+        self.assertLessEqual(
+            int(series[f'api_request_duration_seconds_bucket{{{livres},le="0.1"}}']),
+            int(series[f'api_request_duration_seconds_bucket{{{livres},le="1"}}']),
+        )
+        self.assertIn('api_request_duration_seconds_count{view="unmatched",method="GET",status="404"}', series)
+        self.assertEqual(series['api_db_queries_total{view="liste_livres"}'], '2')
+        self.assertEqual(series['api_catalog_cache_requests_total{view="liste_livres",result="hit"}'], '1')
+        self.assertEqual(series['api_catalog_cache_requests_total{view="liste_livres",result="miss"}'], '4')
+        self.assertEqual(series['api_reservations_total{outcome="created"}'], '1')
+        self.assertEqual(series['api_reservations_total{outcome="failed",reason="AlreadyReserved"}'], '1')
+
+    def test_workers_share_store(self):
+        # Deux registres (deux workers) sur le meme stockage : /metrics additionne les deltas
+        autre = metrics.Registry(metrics.get_registry().store)
+        autre.inc(metrics.RESERVATIONS, (('outcome', 'created'),), 2)
+        metrics.inc(metrics.RESERVATIONS, (('outcome', 'created'),))
+        autre.flush()
+        self.assertEqual(self.series()['api_reservations_total{outcome="created"}'], '3')
+
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer x').status_code, 403)
+        self.series()
+        # Aucun jeton configure : endpoint ferme
+        with self.settings(METRICS={'BACKEND': 'api.metrics.MemoryStore'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_flush_leaves_the_request_thread(self):
+        # Vues async : pas d'E/S vers le stockage dans la boucle d'evenements
+        registre = metrics.Registry(metrics.MemoryStore(), flush_interval=0)
+        envois, envoye = [], threading.Event()
+
+        def pousser(deltas):
+            envois.append(threading.current_thread())
+            envoye.set()
+
+        with mock.patch.object(registre.store, 'push', side_effect=pousser):
+            registre.inc(metrics.RESERVATIONS, (('outcome', 'created'),))
+            registre.maybe_flush()
+            self.assertTrue(envoye.wait(5))
+        self.assertIsNot(envois[0], threading.current_thread())
+
+    @skipUnless('django_redis' in settings.CACHES['default']['BACKEND'], 'Stockage Redis partage')
+    def test_redis_store_round_trip(self):
+        store = metrics.RedisStore()
+        store.clear()
+        store.push({(metrics.DB_QUERIES, (('view', 'x'),)): 3, (metrics.DB_SECONDS, (('view', 'x'),)): 0.25})
+        store.push({(metrics.DB_QUERIES, (('view', 'x'),)): 1})
+        self.assertEqual(
+            store.read(), {(metrics.DB_QUERIES, (('view', 'x'),)): 4.0, (metrics.DB_SECONDS, (('view', 'x'),)): 0.25}
+        )
+        store.clear()
+
+
+@override_settings(THROTTLING={**settings.THROTTLING, 'RATES': {
+    'default': {'anon': '4/min'},
+    'login': {'ip': '4/min', 'email': '2/min'},
+    'reservations': {'user': '2/min'},
+}})
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(4)
+        self.lecteur = User.objects.create_user('throttle@example.com', 'Jean', 'Valjean', password='s3cret-pass')
+
+    def connecter(self, email, password='mauvais'):
+        return self.client.post(reverse('get_token'), {'email': email, 'password': password})
+
+    def test_login_limited_per_email_then_ip_without_hashing(self):
+        with mock.patch('rest_framework_simplejwt.serializers.authenticate', return_value=None) as authenticate:
+            self.assertEqual(self.connecter('Throttle@example.com').status_code, 401)
+            self.assertEqual(self.connecter('throttle@example.com ').status_code, 401)
+            reponse = self.connecter('throttle@example.com')
+            self.assertEqual(reponse.status_code, 429)
+            self.assertTrue(1 <= int(reponse['Retry-After']) <= 60)
+            # Autre adresse depuis la meme IP : limite par IP (4/min, tentatives refusees non comptees)
+            self.assertEqual(self.connecter('autre@example.com').status_code, 401)
+            self.assertEqual(self.connecter('encore@example.com').status_code, 401)
+            self.assertEqual(self.connecter('dernier@example.com').status_code, 429)
+        self.assertEqual(authenticate.call_count, 4)
+
+    def test_forwarded_for_rotation_keeps_ip_limit(self):
+        # X-Forwarded-For choisi par le client : meme IP, meme compteur
+        with mock.patch('rest_framework_simplejwt.serializers.authenticate', return_value=None):
+            statuts = [
+                self.client.post(
+                    reverse('get_token'), {'email': f'lecteur{i}@example.com', 'password': 'mauvais'},
+                    HTTP_X_FORWARDED_FOR=f'203.0.113.{i}',
+                ).status_code
+                for i in range(5)
+            ]
+            self.assertEqual(statuts, [401] * 4 + [429])
+            # Derriere un proxy : seule l'entree qu'il ajoute compte, pas celles fournies par le client
+            cache.clear()
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+                statuts = [
+                    self.client.post(
+                        reverse('get_token'), {'email': f'lecteur{i}@example.com', 'password': 'mauvais'},
+                        HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 198.51.100.7',
+                    ).status_code
+                    for i in range(5)
+                ]
+            self.assertEqual(statuts, [401] * 4 + [429])
+
+    def test_reservations_limited_per_user(self):
+        self.client.force_authenticate(self.lecteur)
+        self.assertEqual(self.client.post(reverse('reserver_livre', args=[self.livres[0].pk])).status_code, 201)
+        self.assertEqual(self.client.post(reverse('titles-reserver', args=[self.livres[1].pk])).status_code, 201)
+        self.assertEqual(self.client.post(reverse('reserver_livre', args=[self.livres[2].pk])).status_code, 429)
+        # Lectures non limitees par la portee "reservations" ; autre lecteur independant
+        self.assertEqual(self.client.get(reverse('mes_reservations')).status_code, 200)
+        autre = User.objects.create_user('autre@example.com', 'Autre', 'Lecteur')
+        self.client.force_authenticate(autre)
+        self.assertEqual(self.client.post(reverse('reserver_livre', args=[self.livres[2].pk])).status_code, 201)
+
+    def test_default_scope_limits_anonymous_requests(self):
+        statuts = [self.client.get(reverse('liste_editeurs')).status_code for _ in range(5)]
+        self.assertEqual(statuts, [200, 200, 200, 200, 429])
+        self.client.force_authenticate(self.lecteur)
+        self.assertEqual(self.client.get(reverse('liste_editeurs')).status_code, 200)
+
+    def test_backend_failure_fails_open(self):
+        with mock.patch.object(throttling.get_backend(), 'hit', side_effect=ConnectionError), \
+                self.assertLogs('api.throttling', 'WARNING'):
+            statuts = [self.client.get(reverse('liste_editeurs')).status_code for _ in range(5)]
+        self.assertEqual(statuts, [200] * 5)
+
+    def verifier_fenetre(self, backend, key):
+        # Limite 2 par minute : la fenetre precedente compte au prorata du temps restant
+        regles = [(key, 2, 60)]
+        self.assertEqual(backend.hit(regles, now=6000), 0)
+        self.assertEqual(backend.hit(regles, now=6001), 0)
+        self.assertAlmostEqual(backend.hit(regles, now=6002), 58)
+        self.assertAlmostEqual(backend.hit(regles, now=6060), 30)
+        self.assertEqual(backend.hit(regles, now=6090), 0)
+        self.assertAlmostEqual(backend.hit(regles, now=6091), 29)
+
+    def test_sliding_window(self):
+        self.verifier_fenetre(throttling.CacheSlidingWindow(), 'test')
+        self.assertEqual(throttling.parse_rate('5/min'), (5, 60))
+        self.assertEqual(throttling.parse_rate('100/10s'), (100, 10))
+        self.assertEqual(throttling.parse_rate('10/hour'), (10, 3600))
+
+    @skipUnless('django_redis' in settings.CACHES['default']['BACKEND'], 'Stockage Redis')
+    def test_redis_sliding_window(self):
+        self.verifier_fenetre(throttling.RedisSlidingWindow(), f'test-{time.time()}')
+
+
+@override_settings(ROOT_URLCONF='backend.urls_asgi')
+class AsyncAuthTests(APITestCase):
+    # Vues async d'authentification, routees sous ASGI seulement (backend/urls_asgi.py)
+    def setUp(self):
+        cache.clear()
+        self.lecteur = User.objects.create_user('async@example.com', 'Jean', 'Valjean', password='s3cret-pass')
+
+    def jeton(self, client=None, password='s3cret-pass'):
+        return (client or self.client).post(reverse('get_token'), {'email': 'async@example.com', 'password': password})
+
+    def test_signup_register_and_login(self):
+        reponse = self.client.post(reverse('inscription'), {
+            'email': 'nouveau@example.com', 'first_name': 'Nou', 'last_name': 'Veau',
+            'password1': 'Tres-b0n-secret!', 'password2': 'Tres-b0n-secret!',
+        })
+        self.assertEqual(reponse.status_code, 201)
+        self.assertTrue(User.objects.get(email='nouveau@example.com').check_password('Tres-b0n-secret!'))
+        reponse = self.client.post(reverse('inscription'), {'email': 'nouveau@example.com'})
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('email', reponse.json()['errors'])
+
+        reponse = self.client.post(
+            '/api/v1/user/register/', {'email': 'api@example.com', 'first_name': 'A', 'last_name': 'Pi', 'password': 'pw'},
+            format='json',
+        )
+        self.assertEqual(reponse.status_code, 201)
+        self.assertNotIn('password', reponse.json())
+        self.assertTrue(User.objects.get(email='api@example.com').check_password('pw'))
+
+        self.assertEqual(
+            self.client.post(reverse('connexion'), {'username': 'nouveau@example.com', 'password': 'faux'}).status_code,
+            400,
+        )
+        reponse = self.client.post(reverse('connexion'), {'username': 'nouveau@example.com', 'password': 'Tres-b0n-secret!'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('_auth_user_id', self.client.session)
+
+    def test_token_errors(self):
+        reponse = self.jeton(password='faux')
+        self.assertEqual(reponse.status_code, 401)
+        self.assertEqual(reponse.json(), {'detail': 'No active account found with the given credentials'})
+        self.assertEqual(reponse['WWW-Authenticate'], 'Bearer realm="api"')
+        reponse = self.client.post(reverse('get_token'), {'email': 'async@example.com'})
+        self.assertEqual(reponse.json(), {'password': ['This field is required.']})
+        self.lecteur.is_active = False
+        self.lecteur.save()
+        self.assertEqual(self.jeton().status_code, 401)
+
+    def test_outdated_hash_is_upgraded_without_revoking_sessions(self):
+        User.objects.filter(pk=self.lecteur.pk).update(password=make_password('s3cret-pass', hasher='pbkdf2_sha1'))
+        reponse = self.jeton()
+        self.assertEqual(reponse.status_code, 200)
+        self.lecteur.refresh_from_db()
+        self.assertTrue(self.lecteur.password.startswith('pbkdf2_sha256$'))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {reponse.json()['access']}")
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 200)
+
+    def test_authentication_goes_through_backends(self):
+        echecs = []
+
+        def echec(sender, credentials, **kwargs):
+            echecs.append(credentials)
+
+        user_login_failed.connect(echec)
+        try:
+            self.assertEqual(self.jeton(password='faux').status_code, 401)
+        finally:
+            user_login_failed.disconnect(echec)
+        self.assertEqual([credentials['email'] for credentials in echecs], ['async@example.com'])
+
+        with mock.patch('api.hashing.verify_password', wraps=verify_password) as verification:
+            self.assertEqual(self.jeton().status_code, 200)
+        # Verification dans le pool de api/hashing.py, pas dans la boucle d'evenements
+        self.assertTrue(verification.called)
+        # AUTHENTICATION_BACKENDS respecte : aucun backend compatible, identifiants pourtant corrects
+        with override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.RemoteUserBackend']):
+            self.assertEqual(self.jeton().status_code, 401)
+
+    def test_signup_uses_form_save(self):
+        with mock.patch.object(CustomUserCreationForm, '_save_m2m') as save_m2m:
+            reponse = self.client.post(reverse('inscription'), {
+                'email': 'form@example.com', 'first_name': 'For', 'last_name': 'Mulaire',
+                'password1': 'Tres-b0n-secret!', 'password2': 'Tres-b0n-secret!',
+            })
+        self.assertEqual(reponse.status_code, 201)
+        self.assertTrue(save_m2m.called)
+        self.assertTrue(User.objects.get(email='form@example.com').check_password('Tres-b0n-secret!'))
+
+    @override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_PENDING': 1, 'RETRY_AFTER': 2})
+    def test_full_pool_returns_503(self):
+        occupe = threading.Event()
+        tache = hashing.get_pool().submit(occupe.wait)
+        try:
+            reponse = self.jeton()
+            self.assertEqual(reponse.status_code, 503)
+            self.assertEqual(reponse['Retry-After'], '2')
+        finally:
+            occupe.set()
+            tache.result()
+        self.assertEqual(self.jeton().status_code, 200)
+        self.assertEqual(hashing.get_pool().pending, 0)
+
+    async def test_asgi_path(self):
+        # Chaine de middlewares en mode async : vue async et vue DRF synchrone
+        reponse = await self.async_client.post(
+            reverse('get_token'), {'email': 'async@example.com', 'password': 's3cret-pass'},
+            content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('Server-Timing', reponse)
+        self.assertTrue(reponse.cookies['refresh_token'].value)
+        reponse = await self.async_client.get(
+            reverse('user-profile'), headers={'Authorization': f"Bearer {reponse.json()['access']}"}
+        )
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['email'], 'async@example.com')
+
+        async def vue(request):
+            pass
+        self.assertTrue(iscoroutinefunction(instrumentation.RequestMetricsMiddleware(vue)))
+
+    def test_wsgi_urlconf_keeps_sync_views(self):
+        # Sous WSGI une vue async tournerait dans une boucle d'evenements neuve a chaque requete
+        for urlconf in ('backend.urls', 'api.urls'):
+            for pattern in import_module(urlconf).urlpatterns:
+                callback = getattr(pattern, 'callback', None)
+                self.assertFalse(callback and iscoroutinefunction(callback), (urlconf, pattern))
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            self.assertEqual(self.jeton().status_code, 200)
+            self.assertEqual(
+                self.client.post(reverse('connexion'), {'username': 'async@example.com', 'password': 's3cret-pass'}).status_code,
+                200,
+            )
+
+    def test_async_redis_uses_cache_options(self):
+        caches_redis = {'default': {
+            'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/3',
+            'OPTIONS': {'PASSWORD': 'secret', 'SOCKET_TIMEOUT': 2, 'CONNECTION_POOL_KWARGS': {'max_connections': 5}},
+        }}
+
+        async def client():
+            redis = async_cache.async_redis()
+            self.assertIs(async_cache.async_redis(), redis)
+            return redis.connection_pool
+
+        with override_settings(CACHES=caches_redis):
+            pool = async_to_sync(client)()
+        self.assertEqual(pool.max_connections, 5)
+        self.assertEqual(pool.connection_kwargs['password'], 'secret')
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 2)
+        self.assertEqual(pool.connection_kwargs['db'], 3)
+
+
+class AsyncCatalogTests(APITestCase):
+    # Vues async du catalogue (backend/urls_asgi.py) : memes octets et memes en-tetes que les vues DRF
+    def setUp(self):
+        cache.clear()
+        revocation.get_store().clear()
+        self.livres = creer_catalogue(5)
+        self.auteur = Author.objects.first()
+        self.lecteur = User.objects.create_user('asgi@example.com', 'Jean', 'Valjean')
+        services.reserve(self.lecteur, self.livres[3])
+
+    def asgi_get(self, url, **kwargs):
+        with override_settings(ROOT_URLCONF='backend.urls_asgi'):
+            return async_to_sync(self.async_client.get)(url, **kwargs)
+
+    def bearer(self):
+        return {'Authorization': f'Bearer {authentication.LibraryRefreshToken.for_user(self.lecteur).access_token}'}
+
+    def test_same_responses_as_drf_views(self):
+        urls = [
+            '/api/v1/books/', '/api/v1/books/?page_size=2', '/api/v1/books/?page_size=2&view=compact',
+            '/api/v1/books/?fields=title_id,title,pubid&expand=pubid&page_size=3',
+            f'/api/v1/books/{self.livres[0].pk}/', f'/api/v1/books/{self.livres[0].pk}/?fields=title,pubid&expand=pubid',
+            '/api/v1/all-authors/', '/api/v1/all-authors/?expand=titles', '/api/v1/all-publishers/',
+            f'/api/v1/authors/{self.auteur.pk}/livres/', f'/api/v1/authors/{self.auteur.pk}/livres/?view=compact',
+        ]
+        for url in urls:
+            for headers in ({}, self.bearer()):
+                # Construite par la vue async puis par la vue DRF, et l'inverse : memes entrees de cache
+                for premier in ('asgi', 'wsgi'):
+                    cache.clear()
+                    if premier == 'asgi':
+                        reponse = self.asgi_get(url, headers=headers)
+                    attendu = self.client.get(url, headers=headers)
+                    if premier == 'wsgi':
+                        reponse = self.asgi_get(url, headers=headers)
+                    self.assertEqual(reponse.status_code, 200, url)
+                    self.assertEqual(reponse['Content-Type'], 'application/json')
+                    self.assertEqual(reponse.content, attendu.content, url)
+                    for entete in ('ETag', 'Last-Modified', 'Cache-Control'):
+                        self.assertEqual(reponse[entete], attendu[entete], (url, entete))
+        reserves = self.asgi_get('/api/v1/books/?page_size=2', headers=self.bearer()).json()['reserved_books_by_user']
+        self.assertEqual([livre['title_id'] for livre in reserves], [self.livres[3].pk])
+
+    def test_expanded_publisher_changes_invalidate_books(self):
+        urls = [
+            '/api/v1/books/?expand=pubid', f'/api/v1/books/{self.livres[0].pk}/?expand=pubid',
+            f'/api/v1/authors/{self.auteur.pk}/livres/?expand=pubid',
+        ]
+        etags = {url: self.asgi_get(url)['ETag'] for url in urls}
+        editeur = Publishers.objects.get(name='Gallimard')
+        editeur.name = 'Seuil'
+        editeur.save()
+        for url in urls:
+            reponse = self.asgi_get(url, headers={'If-None-Match': etags[url]})
+            self.assertEqual(reponse.status_code, 200, url)
+            self.assertNotEqual(reponse['ETag'], etags[url], url)
+            data = reponse.json()
+            livres = data['books'] if 'books' in data else [data['book']]
+            self.assertEqual({livre['pubid']['name'] for livre in livres}, {'Seuil'}, url)
+
+    def test_cached_hits_and_conditional_get(self):
+        url = '/api/v1/books/?page_size=2'
+        self.asgi_get(url, headers=self.bearer())
+        with instrumentation.capture_metrics() as mesures:
+            reponse = self.asgi_get(url, headers=self.bearer())
+        self.assertEqual(mesures[0].queries, 0)
+        self.assertEqual(mesures[0].view, 'liste_livres')
+        self.assertIn('Server-Timing', reponse)
+        self.assertIn('Authorization', reponse['Vary'])
+        self.assertIn('private', reponse['Cache-Control'])
+        revalide = self.asgi_get(url, headers={**self.bearer(), 'If-None-Match': reponse['ETag']})
+        self.assertEqual(revalide.status_code, 304)
+        services.reserve(self.lecteur, self.livres[4])
+        self.assertEqual(self.asgi_get(url, headers={**self.bearer(), 'If-None-Match': reponse['ETag']}).status_code, 200)
+
+    def test_errors_match_drf(self):
+        for url in ['/api/v1/books/999999/', '/api/v1/authors/999999/livres/', '/api/v1/books/?view=wide']:
+            reponse = self.asgi_get(url)
+            attendu = self.client.get(url)
+            self.assertEqual(reponse.status_code, attendu.status_code, url)
+            self.assertEqual(reponse.json(), attendu.json(), url)
+
+        reponse = self.asgi_get('/api/v1/books/', headers={'Authorization': 'Bearer pas-un-jeton'})
+        self.assertEqual(reponse.status_code, 401)
+        self.assertEqual(reponse['WWW-Authenticate'], 'Bearer realm="api"')
+        entetes = self.bearer()
+        authentication.bump_token_version(self.lecteur.pk)
+        self.assertEqual(self.asgi_get('/api/v1/books/', headers=entetes).json()['code'], 'token_revoked')
+        with override_settings(ROOT_URLCONF='backend.urls_asgi'):
+            self.assertEqual(async_to_sync(self.async_client.post)('/api/v1/books/').status_code, 405)
+
+    def test_default_rate_limit(self):
+        rates = {**settings.THROTTLING['RATES'], 'default': {'anon': '2/min', 'user': '3/min'}}
+        with override_settings(THROTTLING={**settings.THROTTLING, 'RATES': rates}):
+            cache.clear()
+            statuts = [self.asgi_get('/api/v1/all-publishers/').status_code for _ in range(3)]
+            self.assertEqual(statuts, [200, 200, 429])
+            self.assertIn('Retry-After', self.asgi_get('/api/v1/all-publishers/'))
+            # Lecteur connecte : compte par utilisateur, pas par IP
+            self.assertEqual(self.asgi_get('/api/v1/all-publishers/', headers=self.bearer()).status_code, 200)
+
+    def test_async_cache_shares_django_cache_entries(self):
+        async def lire_ecrire():
+            acache = async_cache.get_cache()
+            valeur = await acache.get('partage')
+            await acache.set('depuis-async', {'pk': 7}, 60)
+            self.assertFalse(await acache.add('depuis-async', 'autre', 60))
+            await acache.set_many({'a': 1, 'b': [2]}, None)
+            return valeur, await acache.get_many(['a', 'b', 'absente'])
+
+        cache.set('partage', {'titres': [1, 2]}, 60)
+        valeur, plusieurs = async_to_sync(lire_ecrire)()
+        self.assertEqual(valeur, {'titres': [1, 2]})
+        self.assertEqual(plusieurs, {'a': 1, 'b': [2]})
+        self.assertEqual(cache.get('depuis-async'), {'pk': 7})
+        self.assertEqual(cache.get_many(['a', 'b']), {'a': 1, 'b': [2]})
+
+
+class PeriodicWorkerTests(TransactionTestCase):
+    # TransactionTestCase : le worker ferme les connexions entre deux taches
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(1)
+        self.lecteurs = [User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')]
+
+    def test_runs_due_tasks(self):
+        maintenant = [0.0]
+        resultats = []
+        worker = PeriodicWorker(
+            {'api.expiry.expire_overdue_reservations': 60}, clock=lambda: maintenant[0],
+            on_result=lambda path, result: resultats.append((path, result)),
+        )
+        reservation = services.reserve(self.lecteurs[0], self.livres[0])
+        Reservation.objects.filter(pk=reservation.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        worker.run_pending()
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'expired')
+        self.assertEqual([(path, result['expired']) for path, result in resultats], [
+            ('api.expiry.expire_overdue_reservations', 1),
+        ])
+        self.assertEqual(worker.next_run['api.expiry.expire_overdue_reservations'], 60)
+
+
+class BenchmarkApiTests(TransactionTestCase):
+    def test_run_save_and_compare(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'baseline.json')
+            options = dict(titles=30, users=2, reservations=20, requests=5, workers=[1], local_cache=True)
+            call_command('benchmark_api', save=chemin, stdout=StringIO(), **options)
+            with open(chemin) as fichier:
+                rapport = json.load(fichier)
+            resultats = rapport['results']['1']
+            self.assertEqual(
+                set(resultats), {'books', 'books_user', 'book_detail', 'author_books', 'my_reservations', 'reserve', 'cancel'}
+            )
+            for label, r in resultats.items():
+                self.assertEqual(r['errors'], 0, label)
+                self.assertLessEqual(r['p50_ms'], r['p99_ms'])
+            self.assertEqual(resultats['book_detail']['requests'], 5)
+            self.assertEqual(resultats['cancel']['requests'], 5)
+            self.assertEqual(resultats['my_reservations']['queries_max'], 1)
+
+            sortie = StringIO()
+            call_command('benchmark_api', compare=chemin, stdout=sortie, scenarios=['books'], **options)
+            self.assertIn('1w books', sortie.getvalue())
+        # Catalogue synthetique supprime a la fin du run
+        self.assertFalse(Title.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_login_storm_under_asgi(self):
+        sortie = StringIO()
+        call_command(
+            'benchmark_api', titles=20, users=2, reservations=0, requests=5, workers=[1], scenarios=['books'],
+            login_storm=2, local_cache=True, stdout=sortie,
+        )
+        self.assertIn('asgi_books_alone', sortie.getvalue())
+        self.assertIn('asgi_books_storm', sortie.getvalue())
+        self.assertRegex(sortie.getvalue(), r'asgi_login +\d+ req')
+        self.assertFalse(User.objects.exists())
+
+    def test_asgi_catalog_pass(self):
+        sortie = StringIO()
+        call_command(
+            'benchmark_api', titles=20, users=2, reservations=0, requests=5, workers=[2],
+            scenarios=['books_user', 'book_detail', 'my_reservations'], asgi=True, local_cache=True, stdout=sortie,
+        )
+        self.assertRegex(sortie.getvalue(), r'asgi_books_user +10 req .* errors 0')
+        self.assertRegex(sortie.getvalue(), r'asgi_book_detail +10 req .* errors 0')
+        self.assertIn('asgi/wsgi book_detail', sortie.getvalue())
+        self.assertNotIn('asgi_my_reservations', sortie.getvalue())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ReservationConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.livres = creer_catalogue(10)
+        self.user = User.objects.create_user('lecteur@example.com', 'Jean', 'Valjean')
+
+    def marteler(self, livres):
+        barriere = threading.Barrier(len(livres))
+        statuts = []
+
+        def reserver(livre):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barriere.wait()
+            try:
+                statuts.append(client.post(reverse('reserver_livre', args=[livre.pk])).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reserver, args=(livre,)) for livre in livres]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuts
+
+    def test_concurrent_reservations_respect_limit(self):
+        statuts = self.marteler(self.livres)
+        self.assertEqual(statuts.count(201), 3)
+        self.assertEqual(statuts.count(400), 7)
+        self.assertEqual(Reservation.objects.active().count(), 3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_reservations, 3)
+
+    def test_concurrent_duplicates_create_one_hold(self):
+        statuts = self.marteler([self.livres[0]] * 8)
+        self.assertEqual(statuts.count(201), 1)
+        self.assertEqual(Reservation.objects.filter(book=self.livres[0]).count(), 1)
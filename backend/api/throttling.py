@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+from .async_cache import async_redis
+from .instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+# Limitation de debit par fenetre glissante (deux compteurs fixes ponderes : courant + precedent).
+# Toutes les regles d'une requete (portee de la vue + "default") sont verifiees puis consommees en un
+# seul appel au stockage : un script Lua (un aller-retour Redis) ou le cache Django sous verrou.
+# Une requete refusee ne consomme rien ; reponse 429 avec Retry-After (exception Throttled de DRF).
+
+PREFIX = 'throttle:'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _setting(name, default):
+    return getattr(settings, 'THROTTLING', {}).get(name, default)
+
+
+def parse_rate(rate):
+    # "5/min", "10/hour", "100/10s" -> (limite, fenetre en secondes)
+    nombre, periode = rate.split('/')
+    chiffres = periode[:len(periode) - len(periode.lstrip('0123456789'))]
+    return int(nombre), int(chiffres or 1) * PERIODS[periode[len(chiffres)]]
+
+
+def _fenetres(regles, now):
+    # (cle courante, cle precedente, limite, fenetre, secondes ecoulees dans la fenetre courante)
+    for key, limit, window in regles:
+        bucket, elapsed = divmod(now, window)
+        yield f'{PREFIX}{key}:{int(bucket)}', f'{PREFIX}{key}:{int(bucket) - 1}', limit, window, elapsed
+
+
+def _attente(courant, precedent, limit, window, elapsed):
+    # Secondes avant qu'une requete de plus passe sous la limite (0 : acceptee)
+    if precedent * (1 - elapsed / window) + courant + 1 <= limit:
+        return 0
+    if courant + 1 > limit:
+        return window - elapsed
+    return window * (1 - (limit - courant - 1) / precedent) - elapsed
+
+
+class CacheSlidingWindow:
+    # Compteurs dans le cache Django (LocMemCache en developpement et tests, vide par cache.clear()) ;
+    # atomique au sein du processus seulement
+    def __init__(self):
+        self.cache = caches[_setting('CACHE_ALIAS', 'default')]
+        self._lock = threading.Lock()
+
+    def hit(self, regles, now=None):
+        fenetres = list(_fenetres(regles, time.time() if now is None else now))
+        with self._lock:
+            valeurs = self.cache.get_many([key for courante, precedente, *_ in fenetres for key in (courante, precedente)])
+            attente = max(
+                _attente(valeurs.get(courante, 0), valeurs.get(precedente, 0), limit, window, elapsed)
+                for courante, precedente, limit, window, elapsed in fenetres
+            )
+            if attente:
+                return attente
+            for courante, _, _, window, _ in fenetres:
+                self.cache.set(courante, valeurs.get(courante, 0) + 1, 2 * window)
+        return 0
+
+    async def ahit(self, regles, now=None):
+        return self.hit(regles, now)
+
+
+class RedisSlidingWindow:
+    # KEYS : (courante, precedente) par regle ; ARGV : (limite, fenetre, ecoule) par regle
+    SCRIPT = """
+    local attente = 0
+    for i = 1, #KEYS / 2 do
+        local limite, fenetre, ecoule = tonumber(ARGV[3 * i - 2]), tonumber(ARGV[3 * i - 1]), tonumber(ARGV[3 * i])
+        local courant = tonumber(redis.call('GET', KEYS[2 * i - 1]) or 0)
+        local precedent = tonumber(redis.call('GET', KEYS[2 * i]) or 0)
+        local t = 0
+        if precedent * (1 - ecoule / fenetre) + courant + 1 > limite then
+            if courant + 1 > limite then
+                t = fenetre - ecoule
+            else
+                t = fenetre * (1 - (limite - courant - 1) / precedent) - ecoule
+            end
+        end
+        if t > attente then attente = t end
+    end
+    if attente > 0 then return tostring(attente) end
+    for i = 1, #KEYS / 2 do
+        redis.call('INCR', KEYS[2 * i - 1])
+        redis.call('EXPIRE', KEYS[2 * i - 1], 2 * tonumber(ARGV[3 * i - 1]))
+    end
+    return '0'
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.alias = _setting('CACHE_ALIAS', 'default')
+        self.redis = get_redis_connection(self.alias)
+        self.script = self.redis.register_script(self.SCRIPT)
+
+    def _arguments(self, regles, now):
+        keys, args = [], []
+        for courante, precedente, limit, window, elapsed in _fenetres(regles, time.time() if now is None else now):
+            keys += [courante, precedente]
+            args += [limit, window, repr(elapsed)]
+        return keys, args
+
+    def hit(self, regles, now=None):
+        keys, args = self._arguments(regles, now)
+        return float(self.script(keys=keys, args=args))
+
+    async def ahit(self, regles, now=None):
+        # Vues async : meme script (EVALSHA) par le client redis.asyncio de la boucle courante
+        keys, args = self._arguments(regles, now)
+        script = async_redis(self.alias).register_script(self.SCRIPT)
+        return float(await script(keys=keys, args=args))
+
+
+_backend = None
+_rates = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(_setting('BACKEND', 'api.throttling.CacheSlidingWindow'))()
+    return _backend
+
+
+def get_rates():
+    # {portee: {identifiant: (limite, fenetre)}}
+    global _rates
+    if _rates is None:
+        for scope, regles in _setting('RATES', {}).items():
+            inconnus = set(regles) - set(SlidingWindowThrottle.KINDS)
+            if inconnus:
+                raise ImproperlyConfigured(f"THROTTLING['RATES'][{scope!r}]: unknown identifiers {sorted(inconnus)}")
+        _rates = {
+            scope: {kind: parse_rate(rate) for kind, rate in regles.items()}
+            for scope, regles in _setting('RATES', {}).items()
+        }
+    return _rates
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend, _rates
+    if setting in ('THROTTLING', 'CACHES'):
+        _backend = None
+        _rates = None
+
+
+def throttle_scope(scope):
+    # Vues fonctions : @throttle_scope('login') au-dessus de @api_view
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
+
+
+def view_scope(view):
+    # ViewSets : throttle_scopes = {'create': ...} par action, sinon l'attribut throttle_scope
+    scopes = getattr(view, 'throttle_scopes', None)
+    if scopes and getattr(view, 'action', None) in scopes:
+        return scopes[view.action]
+    return getattr(view, 'throttle_scope', None)
+
+
+def normalize_email(valeur):
+    return valeur.strip().lower() or None if isinstance(valeur, str) else None
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    # Identifiants : user (lecteur connecte), anon (IP des requetes anonymes), ip, email (champ
+    # email / username du corps POST, en minuscules)
+    KINDS = ('user', 'anon', 'ip', 'email')
+    attente = 0
+
+    def identifiant(self, request, kind):
+        authentifie = request.user.is_authenticated
+        if kind == 'user':
+            return request.user.pk if authentifie else None
+        if kind == 'anon':
+            return None if authentifie else self.get_ident(request)
+        if kind == 'ip':
+            return self.get_ident(request)
+        data = request.data if request.method == 'POST' else None
+        return normalize_email((data.get('email') or data.get('username')) if hasattr(data, 'get') else None)
+
+    def regles(self, request, scope):
+        rates = get_rates()
+        regles = []
+        for nom in (scope, 'default'):
+            for kind, (limit, window) in rates.get(nom, {}).items():
+                ident = self.identifiant(request, kind)
+                if ident is not None:
+                    regles.append((f'{nom}:{kind}:{ident}', limit, window))
+        return regles
+
+    def consume(self, regles, scope):
+        # Secondes d'attente (0 : requete acceptee et comptee)
+        with timed('throttle'):
+            try:
+                attente = get_backend().hit(regles)
+            except Exception:
+                # Stockage indisponible : la limitation ne doit pas bloquer l'API
+                logger.warning('throttling check failed', exc_info=True)
+                return 0
+        return self.compter(attente, scope)
+
+    async def aconsume(self, regles, scope):
+        with timed('throttle'):
+            try:
+                attente = await get_backend().ahit(regles)
+            except Exception:
+                logger.warning('throttling check failed', exc_info=True)
+                return 0
+        return self.compter(attente, scope)
+
+    def compter(self, attente, scope):
+        if attente:
+            metrics.inc(metrics.THROTTLED, (('scope', scope or 'default'),))
+        return attente
+
+    def allow_request(self, request, view):
+        scope = view_scope(view)
+        regles = self.regles(request, scope)
+        if regles:
+            self.attente = self.consume(regles, scope)
+        return not self.attente
+
+    def wait(self):
+        return self.attente
+
+
+class AnonymousThrottle(SlidingWindowThrottle):
+    # Vues async d'authentification (api/async_views.py) : pas de lecteur, email lu par la vue
+    def __init__(self, email=None):
+        self.email = normalize_email(email)
+
+    def identifiant(self, request, kind):
+        if kind == 'user':
+            return None
+        if kind == 'email':
+            return self.email
+        return self.get_ident(request)
+
+
+async def acheck(throttle, request, scope):
+    # Vues async (api/async_views.py) : stockage interroge sans thread (ahit)
+    regles = throttle.regles(request, scope)
+    if regles:
+        attente = await throttle.aconsume(regles, scope)
+        if attente:
+            raise Throttled(attente)
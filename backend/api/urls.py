@@ -6,20 +6,27 @@ router = DefaultRouter()
 router.register(r'authors', views.AuthorViewSet, basename='authors')
 router.register(r'publishers', views.PublishersViewSet, basename='publishers')
 router.register(r'titles', views.TitleViewSet, basename='titles')
+router.register(r'copies', views.CopyViewSet, basename='copies')
 router.register(r'users', views.UserViewSet, basename='users')
 router.register(r'reservations', views.ReservationViewSet, basename='reservations')
 
 urlpatterns = [
     path('', views.accueil, name='accueil'),
     path('books/', views.liste_livres, name='liste_livres'),
+    path('books/search/', views.recherche_livres, name='recherche_livres'),
+    path('books/export/', views.export_catalogue, name='export_catalogue'),
+    path('autocomplete/', views.autocompletion, name='autocompletion'),
     path('books/<int:id>/', views.detail_livre, name='detail_livre'),
     path('books/<int:title_id>/reserver/', views.reserver_livre, name='reserver_livre'),
+    path('books/<int:title_id>/hold/', views.file_attente, name='file_attente'),
     path('authors/<int:au_id>/livres/', views.livres_par_auteur, name='livres_par_auteur'),
     path('all-authors/', views.liste_auteurs, name='liste_auteurs'),
     path('all-publishers/', views.liste_editeurs, name='liste_editeurs'),
     path('my-reservations/', views.mes_reservations, name='mes_reservations'),
+    path('my-holds/', views.mes_attentes, name='mes_attentes'),
     path('login/', views.connexion, name='connexion'),
     path('logout/', views.LogoutView.as_view(), name='deconnexion'),
+    path('logout/all/', views.LogoutAllView.as_view(), name='deconnexion_partout'),
     path('signup/', views.inscription, name='inscription'),
     path('users/me/', views.user_profile, name='user-profile'),
     path('', include(router.urls)),
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import async_views
+
+# Vues async servies sous ASGI (backend/urls_asgi.py) : memes chemins et memes noms que les vues DRF
+# de api/urls.py, qu'elles masquent
+urlpatterns = [
+    path('books/', async_views.liste_livres, name='liste_livres'),
+    path('books/<int:id>/', async_views.detail_livre, name='detail_livre'),
+    path('authors/<int:au_id>/livres/', async_views.livres_par_auteur, name='livres_par_auteur'),
+    path('all-authors/', async_views.liste_auteurs, name='liste_auteurs'),
+    path('all-publishers/', async_views.liste_editeurs, name='liste_editeurs'),
+    path('login/', async_views.connexion, name='connexion'),
+    path('signup/', async_views.inscription, name='inscription'),
+    path('api/user/register/', async_views.creer_compte, name="register"),
+]
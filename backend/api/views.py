@@ -1,32 +1,44 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.views import APIView
 
-from .models import Author, Title, Publishers, Reservation, User
+from .models import Author, Copy, Hold, Title, Publishers, Reservation, User
 from .serializers import (
     AuthorSerializer,
+    CopySerializer,
+    HoldSerializer,
     PublishersSerializer,
+    TitleListSerializer,
     TitleSerializer,
+    TitleSearchSerializer,
     UserSerializer,
     ReservationSerializer,
 )
+from . import autocomplete, availability, catalog_cache, export, fastpath, filters, metrics, renderers, search, services
+from .authentication import (
+    LibraryRefreshToken, PrincipalJWTAuthentication, bump_token_version, revoke_token, rotate_refresh_token,
+)
+from .bulk import BulkActionsMixin
+from .conditional import conditional_books, conditional_catalog
+from .fieldsets import Fieldset, SparseFieldsViewSetMixin
 from .forms import CustomUserCreationForm
+from .instrumentation import query_budget
+from .pagination import CatalogCursorPagination, SearchPagination
+from .throttling import throttle_scope
 
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
 
 # PAGE D'ACCUEIL
@@ -37,131 +49,275 @@ def accueil(request):
     return Response({"message": "Welcome to the Online Library API"}, status=status.HTTP_200_OK)
 
 
+# METRIQUES (Prometheus), hors DRF : pas de negociation de contenu ni d'authentification JWT
+@query_budget(0)
+def metriques(request):
+    if not metrics.authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def fragments_par_id(rendu, lignes):
+    lignes = list(lignes)
+    items = [(rendu.pk(ligne), item) for ligne, item in zip(lignes, rendu.render(lignes))]
+    availability.remember(items)
+    return {pk: renderers.dumps(item) for pk, item in items}
+
+
+def fragments_json(name, scopes, rendu, lignes, *parts):
+    # Un fragment JSON pre-encode par objet, en cache : FastJSONRenderer l'insere tel quel
+    lignes = {rendu.pk(ligne): ligne for ligne in lignes}
+    fragments = catalog_cache.cached_fragments(
+        name, scopes, list(lignes), lambda ids: fragments_par_id(rendu, [lignes[pk] for pk in ids]), *parts
+    )
+    return [renderers.Fragment(data, pk) for pk, data in fragments.items()]
+
+
 # LISTE DES LIVRES
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 15)  
+@conditional_books(per_user=True)
 def liste_livres(request):
-    cache_key = 'all_books_list'
-    livres = cache.get(cache_key)
-    if livres is None:
-        livres = Title.objects.all()
-        cache.set(cache_key, livres, 300)  
-
-    serializer = TitleSerializer(livres, many=True)
+    fieldset = Fieldset.from_request(request)
+    serializer_class = fieldset.serializer(TitleSerializer, TitleListSerializer)
+    rendu = fastpath.plan(serializer_class, fieldset)
+    livres = rendu.queryset(Title.objects.for_catalog())
+    scopes = catalog_cache.book_scopes(fieldset)
+    parts = (serializer_class.__name__, *fieldset.cache_parts())
+
+    def construire():
+        paginator = CatalogCursorPagination()
+        page = paginator.paginate_queryset(livres, request)
+        return {
+            'books': fragments_json('book-json', scopes, rendu, page, *parts),
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        }
+
+    data = dict(catalog_cache.cached_payload('books', scopes, construire, request.build_absolute_uri()))
 
     livres_reserves_data = []
     if request.user.is_authenticated:
-        livres_reserves = Title.objects.filter(
-            reservations__user=request.user,
-            reservations__returned_at__isnull=True
+        livres_reserves_data = catalog_cache.cached_fragments(
+            'book-json', scopes, services.reserved_title_ids(request.user.pk),
+            lambda ids: fragments_par_id(rendu, livres.filter(pk__in=ids)), *parts,
         )
-        serializer_reserves = TitleSerializer(livres_reserves, many=True)
-        livres_reserves_data = serializer_reserves.data
+        livres_reserves_data = [renderers.Fragment(data, pk) for pk, data in livres_reserves_data.items()]
 
+    # Compteurs de disponibilite a jour, hors du cache des pages et des fragments
+    data['books'], data['reserved_books_by_user'] = availability.apply(data['books'], livres_reserves_data)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+# RECHERCHE DE LIVRES
+def rechercher(request):
+    terms = request.query_params.get('q', '').strip()
+    if not terms:
+        raise ValidationError("The 'q' query parameter is required.")
+    paginator = SearchPagination()
+    livres = paginator.paginate_queryset(search.search_titles(terms), request)
+    return paginator, TitleSearchSerializer(livres, many=True).data
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recherche_livres(request):
+    paginator, livres = rechercher(request)
     return Response({
-        'books': serializer.data,
-        'reserved_books_by_user': livres_reserves_data
+        'books': livres,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
     }, status=status.HTTP_200_OK)
 
 
+# AUTOCOMPLETION
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocompletion(request):
+    prefix = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    suggestions = autocomplete.get_index().suggest(prefix, limit) if prefix else []
+    return Response({'suggestions': suggestions}, status=status.HTTP_200_OK)
+
+
+# EXPORT DU CATALOGUE
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_catalogue(request):
+    # 'format' est reserve par DRF a la negociation de contenu
+    fmt = request.query_params.get('export_format', 'jsonl')
+    if fmt not in export.CONTENT_TYPES:
+        raise ValidationError("export_format must be 'jsonl' or 'csv'.")
+    updated_since = None
+    if request.query_params.get('updated_since'):
+        try:
+            updated_since = export.parse_since(request.query_params['updated_since'])
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+
+    flux = export.encode(export.render(export.iter_catalog(updated_since), fmt))
+    compresse = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    response = StreamingHttpResponse(
+        export.gzip_stream(flux) if compresse else flux,
+        content_type=f'{export.CONTENT_TYPES[fmt]}; charset=utf-8',
+    )
+    if compresse:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+    return response
+
+
 # MES RESERVATIONS
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mes_reservations(request):
 
     cache_key = f'reservations_{request.user.id}'
-    reservations_cached = cache.get(cache_key)
+    reservations = cache.get(cache_key)
 
-    if reservations_cached is None:
-        reservations_qs = Reservation.objects.filter(user=request.user)
-        cache.set(cache_key, reservations_qs, 300)  
-        reservations = reservations_qs
-    else:
-        reservations = reservations_cached
+    if reservations is None:
+        reservations_qs = Reservation.objects.filter(user_id=request.user.pk)
+        reservations = fastpath.plan(ReservationSerializer).serialize(reservations_qs)
+        cache.set(cache_key, reservations, 300)  
 
-    serializer = ReservationSerializer(reservations, many=True)
-    return Response({'reservations': serializer.data}, status=status.HTTP_200_OK)
+    return Response({'reservations': reservations}, status=status.HTTP_200_OK)
 
 
 # LISTE DES AUTEURS
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 15)
+@conditional_catalog(catalog_cache.AUTHORS, catalog_cache.TITLES, catalog_cache.AVAILABILITY)
 def liste_auteurs(request):
-    cache_key = 'all_authors_list'
-    auteurs = cache.get(cache_key)
-    if auteurs is None:
-        auteurs = Author.objects.all()
-        cache.set(cache_key, auteurs, 300)
-    serializer = AuthorSerializer(auteurs, many=True)
-    return Response({'authors': serializer.data}, status=status.HTTP_200_OK)
+    fieldset = Fieldset.from_request(request)
+    rendu = fastpath.plan(AuthorSerializer, fieldset)
+    # ?expand=titles : la liste depend aussi des livres, compteurs de disponibilite compris
+    scopes = [catalog_cache.AUTHORS] + (
+        [catalog_cache.TITLES, catalog_cache.AVAILABILITY] if 'titles' in fieldset.expand else []
+    )
+    auteurs = catalog_cache.cached_payload(
+        'authors', scopes,
+        lambda: fragments_json(
+            'author-json', scopes, rendu, rendu.queryset(Author.objects.all()), *fieldset.cache_parts()
+        ),
+        *fieldset.cache_parts(),
+    )
+    return Response({'authors': auteurs}, status=status.HTTP_200_OK)
 
 
 # LIVRES PAR AUTEUR
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 15)
+@conditional_books()
 def livres_par_auteur(request, au_id):
-    auteur = get_object_or_404(Author, pk=au_id)
-    livres = auteur.titles.all()
-    serializer = TitleSerializer(livres, many=True)
-    return Response({
-        'author': AuthorSerializer(auteur).data,
-        'books': serializer.data
-    }, status=status.HTTP_200_OK)
+    # ?fields= / ?expand= / ?view= s'appliquent aux livres
+    fieldset = Fieldset.from_request(request)
+    serializer_class = fieldset.serializer(TitleSerializer, TitleListSerializer)
+    rendu = fastpath.plan(serializer_class, fieldset)
+    scopes = catalog_cache.book_scopes(fieldset)
+    parts = (serializer_class.__name__, *fieldset.cache_parts())
+
+    def construire():
+        auteur = get_object_or_404(Author, pk=au_id)
+        livres = rendu.queryset(Title.objects.filter(authors=auteur))
+        return {
+            'author': AuthorSerializer(auteur).data,
+            'books': fragments_json('book-json', scopes, rendu, livres, *parts),
+        }
+
+    data = dict(catalog_cache.cached_payload('author_books', scopes, construire, au_id, *parts))
+    data['books'], = availability.apply(data['books'])
+    return Response(data, status=status.HTTP_200_OK)
 
 
 # LISTE DES EDITEURS
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 15)
+@conditional_catalog(catalog_cache.PUBLISHERS)
 def liste_editeurs(request):
-    cache_key = 'all_publishers_list'
-    editeurs = cache.get(cache_key)
-    if editeurs is None:
-        editeurs = Publishers.objects.all()
-        cache.set(cache_key, editeurs, 300)
-    serializer = PublishersSerializer(editeurs, many=True)
-    return Response({'publishers': serializer.data}, status=status.HTTP_200_OK)
+    fieldset = Fieldset.from_request(request)
+    rendu = fastpath.plan(PublishersSerializer, fieldset)
+    editeurs = catalog_cache.cached_payload(
+        'publishers', [catalog_cache.PUBLISHERS],
+        lambda: rendu.serialize(Publishers.objects.all()),
+        *fieldset.cache_parts(),
+    )
+    return Response({'publishers': editeurs}, status=status.HTTP_200_OK)
 
 
 # DETAIL D'UN LIVRE
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 15)
+@conditional_books()
 def detail_livre(request, id):
-    livre = get_object_or_404(Title, pk=id)
-    serializer = TitleSerializer(livre)
-    return Response({'book': serializer.data}, status=status.HTTP_200_OK)
+    fieldset = Fieldset.from_request(request)
+    livres = fieldset.queryset(TitleSerializer, Title.objects.for_catalog())
+
+    def construire():
+        livre = TitleSerializer(get_object_or_404(livres, pk=id), **fieldset.kwargs).data
+        availability.remember([(id, livre)])
+        return livre
+
+    livre = catalog_cache.cached_payload(
+        'book', catalog_cache.book_scopes(fieldset), construire, id, *fieldset.cache_parts()
+    )
+    return Response({'book': availability.apply_item(livre, id)}, status=status.HTTP_200_OK)
 
 
 # RESERVER UN LIVRE
+@throttle_scope('reservations')
 @api_view(['POST'])
 def reserver_livre(request, title_id):
     if not request.user.is_authenticated:
         return Response({"error": "You must be logged in to reserve a book."}, status=status.HTTP_401_UNAUTHORIZED)
 
     livre = get_object_or_404(Title, pk=title_id)
+    services.reserve(request.user, livre)
 
-   
-    if Reservation.objects.filter(user=request.user, book=livre, returned_at__isnull=True).exists():
-        raise ValidationError("You have already reserved this book.")
+    return Response({
+        "message": f"You have successfully reserved the book: {livre.title}."
+    }, status=status.HTTP_201_CREATED)
 
-    active_count = Reservation.objects.filter(user=request.user, returned_at__isnull=True).count()
-    if active_count >= 3:
-        raise ValidationError("You already have 3 active reservations. Please return a book before reserving another.")
 
-    Reservation.objects.create(user=request.user, book=livre)
+# FILE D'ATTENTE D'UN LIVRE
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def file_attente(request, title_id):
+    livre = get_object_or_404(Title, pk=title_id)
+    if request.method == 'DELETE':
+        if not services.leave_waitlist(request.user, livre):
+            raise NotFound("You are not waiting for this book.")
+        return Response({"message": "You have left the waiting list."}, status=status.HTTP_200_OK)
 
-    cache_key = f'reservations_{request.user.id}'
-    cache.delete(cache_key)
+    hold = services.join_waitlist(request.user, livre)
+    # Servie des l'inscription (exemplaire rendu entre-temps) : plus de rang dans la file
+    hold.position = services.waitlist_position(hold) if hold.status == Hold.Status.WAITING else None
+    return Response(HoldSerializer(hold).data, status=status.HTTP_201_CREATED)
 
-    return Response({
-        "message": f"You have successfully reserved the book: {livre.title}."
-    }, status=status.HTTP_201_CREATED)
+
+# MES FILES D'ATTENTE
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mes_attentes(request):
+    holds = services.with_positions(
+        Hold.objects.filter(user_id=request.user.pk, status=Hold.Status.WAITING).order_by('id')
+    )
+    return Response({'holds': HoldSerializer(holds, many=True).data}, status=status.HTTP_200_OK)
 
 
+# Vues synchrones (WSGI) ; sous ASGI, pendants async de api/async_views.py (backend/urls_asgi.py)
+@throttle_scope('signup')
 @api_view(['POST', 'GET'])
 @permission_classes([AllowAny])
 def inscription(request):
@@ -175,6 +331,7 @@ def inscription(request):
     return Response({"message": "Send a POST request with the required fields to create an account."}, status=status.HTTP_200_OK)
 
 
+@throttle_scope('login')
 @api_view(['POST', 'GET'])
 @permission_classes([AllowAny])
 def connexion(request):
@@ -200,78 +357,160 @@ def user_profile(request):
 
 class LogoutView(APIView):
     def post(self, request):
+        # Jeton d'acces courant et refresh token du cookie revoques jusqu'a leur expiration
+        if request.auth is not None:
+            revoke_token(request.auth)
+        try:
+            revoke_token(LibraryRefreshToken(request.COOKIES.get("refresh_token", "")))
+        except TokenError:
+            pass
         response = Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
         response.delete_cookie("refresh_token")
         return response
 
 
+class LogoutAllView(APIView):
+    def post(self, request):
+        # Nouvelle version des jetons du lecteur : toutes ses sessions sont fermees
+        bump_token_version(request.user.pk)
+        response = Response({"message": "Logged out of all sessions"}, status=status.HTTP_200_OK)
+        response.delete_cookie("refresh_token")
+        return response
+
+
 # VIEWSETS
 
-class AuthorViewSet(viewsets.ModelViewSet):
+def indexer_autocompletion(kind, entrees, nouveaux=False):
+    # Apres commit : bulk_add en un aller-retour pour les creations, add() pour les renommages
+    # (sans score, il conserve la popularite deja indexee)
+    def appliquer():
+        index = autocomplete.get_index()
+        if nouveaux:
+            index.bulk_add([(kind, pk, label, 0) for pk, label in entrees])
+            return
+        for pk, label in entrees:
+            index.add(kind, pk, label)
+
+    transaction.on_commit(appliquer)
+
+
+class AuthorViewSet(SparseFieldsViewSetMixin, BulkActionsMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [PrincipalJWTAuthentication]
+    query_budgets = {'list': 3, 'retrieve': 3, 'livres': 3}
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
+    def after_bulk_create(self, instances, validated_data):
+        catalog_cache.bump_generation(catalog_cache.AUTHORS)
+        indexer_autocompletion(autocomplete.AUTHOR, [(a.pk, a.author) for a in instances], nouveaux=True)
+
+    def after_bulk_update(self, changes, fields):
+        catalog_cache.bump_generation(catalog_cache.AUTHORS, catalog_cache.TITLES)
+        auteurs = [auteur for auteur, _ in changes]
+        titres = Title.objects.filter(authors__in=auteurs).values('pk')
+        search.update_search_vectors(titres)
+        Title.objects.filter(pk__in=titres).touch()
+        if 'author' in fields:
+            indexer_autocompletion(autocomplete.AUTHOR, [(a.pk, a.author) for a in auteurs])
+
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def livres(self, request, pk=None):
         auteur = self.get_object()
-        livres = auteur.titles.all()
-        serializer = TitleSerializer(livres, many=True)
-        return Response({'books': serializer.data}, status=status.HTTP_200_OK)
+        livres = fastpath.plan(TitleSerializer).serialize(auteur.titles.all())
+        return Response({'books': livres}, status=status.HTTP_200_OK)
 
 
-class PublishersViewSet(viewsets.ModelViewSet):
+class PublishersViewSet(SparseFieldsViewSetMixin, BulkActionsMixin, viewsets.ModelViewSet):
     queryset = Publishers.objects.all()
     serializer_class = PublishersSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [PrincipalJWTAuthentication]
+    query_budgets = {'list': 2, 'retrieve': 2}
+    bulk_cache_scopes = [catalog_cache.PUBLISHERS]
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
 
-class TitleViewSet(viewsets.ModelViewSet):
-    queryset = Title.objects.all()
+class TitleViewSet(SparseFieldsViewSetMixin, BulkActionsMixin, viewsets.ModelViewSet):
+    queryset = Title.objects.for_catalog()
     serializer_class = TitleSerializer
-    authentication_classes = [JWTAuthentication]
+    compact_serializer_class = TitleListSerializer
+    pagination_class = CatalogCursorPagination
+    authentication_classes = [PrincipalJWTAuthentication]
+    query_budgets = {'list': 3, 'retrieve': 3, 'facets': 2, 'search': 4}
+    throttle_scopes = {'reserver': 'reservations'}
+    filter_backends = [filters.TitleFilterBackend, filters.TitleOrderingFilter]
+    ordering_fields = ['title_id', 'title', 'year_published', 'subject', 'pubid', 'updated_at']
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
+    def build_instance(self, data):
+        # Les images de couverture passent par l'endpoint unitaire (multipart)
+        data.pop('cover_image', None)
+        copies = data.pop('copies', 1)
+        return Title(**data, total_copies=copies, available_count=copies)
+
+    def clean_update(self, data):
+        data.pop('cover_image', None)
+        data.pop('copies', None)
+
+    def after_bulk_create(self, instances, validated_data):
+        Copy.objects.bulk_create([Copy(title=titre) for titre in instances for _ in range(titre.total_copies)])
+        catalog_cache.bump_generation(catalog_cache.TITLES)
+        search.update_search_vectors([titre.pk for titre in instances])
+        indexer_autocompletion(autocomplete.TITLE, [(t.pk, t.title) for t in instances], nouveaux=True)
+
+    def after_bulk_update(self, changes, fields):
+        catalog_cache.bump_generation(catalog_cache.TITLES)
+        search.update_search_vectors([titre.pk for titre, _ in changes])
+        indexer_autocompletion(autocomplete.TITLE, [(t.pk, t.title) for t, data in changes if 'title' in data])
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def facets(self, request):
+        return Response(filters.facets(filters.clean_filters(request.query_params)), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def search(self, request):
+        paginator, livres = rechercher(request)
+        return paginator.get_paginated_response(livres)
+
     @action(detail=True, methods=['post'])
     def reserver(self, request, pk=None):
         if not request.user.is_authenticated:
             return Response({"error": "You must be logged in to reserve a book."}, status=status.HTTP_401_UNAUTHORIZED)
 
         title = self.get_object()
-        if Reservation.objects.filter(user=request.user, book=title, returned_at__isnull=True).exists():
-            raise ValidationError("You have already reserved this book.")
+        reservation = services.reserve(request.user, title)
+        serializer = ReservationSerializer(reservation)
 
-        active_res_count = Reservation.objects.filter(user=request.user, returned_at__isnull=True).count()
-        if active_res_count >= 3:
-            raise ValidationError("You already have 3 active reservations. Return a book first.")
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        reservation = Reservation.objects.create(user=request.user, book=title)
-        serializer = ReservationSerializer(reservation)
 
-        cache_key = f'reservations_{request.user.id}'
-        cache.delete(cache_key)
+class CopyViewSet(viewsets.ModelViewSet):
+    queryset = Copy.objects.all()
+    serializer_class = CopySerializer
+    authentication_classes = [PrincipalJWTAuthentication]
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def get_permissions(self):
+        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+            return [permissions.IsAdminUser()]
+        return [permissions.AllowAny()]
 
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [PrincipalJWTAuthentication]
     permission_classes = [permissions.IsAdminUser]
 
 
@@ -279,46 +518,64 @@ class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_scope = 'signup'
 
 
 class ReservationViewSet(viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [PrincipalJWTAuthentication]
+    query_budgets = {'list': 3, 'retrieve': 3}
+    throttle_scopes = {'create': 'reservations', 'destroy': 'reservations', 'retourner': 'reservations'}
 
     def get_permissions(self):
         if self.action == 'create':
             return [permissions.IsAuthenticated()]
-        elif self.action in ['update', 'partial_update', 'destroy']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'retourner']:
           
             return [permissions.IsAuthenticated()]
      
         return [permissions.IsAdminUser()]
 
     def perform_create(self, serializer):
-        user = self.request.user
-        active_count = Reservation.objects.filter(user=user, returned_at__isnull=True).count()
-        if active_count >= 3:
-            raise ValidationError("You already have 3 active reservations.")
-        serializer.save(user=user)
+        serializer.save(user=self.request.user)
 
-        cache_key = f'reservations_{user.id}'
-        cache.delete(cache_key)
+    def get_own_object(self):
+        instance = self.get_object()
+        if instance.user != self.request.user and not self.request.user.is_superuser:
+            raise ValidationError("You cannot change this reservation because it does not belong to you.")
+        return instance
 
     def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.user != request.user and not request.user.is_superuser:
-            raise ValidationError("You cannot cancel this reservation because it does not belong to you.")
+        instance = self.get_own_object()
+        services.cancel(instance)
+        return Response({"message": "Reservation successfully canceled."}, status=status.HTTP_200_OK)
 
-        self.perform_destroy(instance)
+    @action(detail=True, methods=['post'], url_path='return')
+    def retourner(self, request, pk=None):
+        reservation = services.return_reservation(self.get_own_object())
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_200_OK)
 
-        cache_key = f'reservations_{instance.user.id}'
-        cache.delete(cache_key)
+    @action(detail=True, methods=['post'], url_path='checkout')
+    def emprunter(self, request, pk=None):
+        reservation = services.check_out(self.get_object())
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_200_OK)
 
-        return Response({"message": "Reservation successfully canceled."}, status=status.HTTP_200_OK)
+
+def poser_cookie_refresh(response, refresh_token):
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=True,
+        samesite="Strict",
+        max_age=int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds()),
+    )
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
+    throttle_scope = 'login'
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         data = response.data
@@ -327,14 +584,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         refresh_token = data.get("refresh")
 
         res = Response({"access": access_token}, status=status.HTTP_200_OK)
-        res.set_cookie(
-            key="refresh_token",
-            value=refresh_token,
-            httponly=True,
-            secure=True,
-            samesite="Strict",
-            max_age=86400, 
-        )
+        poser_cookie_refresh(res, refresh_token)
         return res
 
 
@@ -346,8 +596,12 @@ class RefreshAccessTokenView(APIView):
             return Response({"error": "No refresh token provided"}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
-            token = RefreshToken(refresh_token)
-            access_token = str(token.access_token)
-            return Response({"access": access_token}, status=status.HTTP_200_OK)
+            token = rotate_refresh_token(refresh_token)
         except Exception:
-            return Response({"error": "Invalid refresh token"}, status=status.HTTP_401_UNAUTHORIZED)
+            response = Response({"error": "Invalid refresh token"}, status=status.HTTP_401_UNAUTHORIZED)
+            response.delete_cookie("refresh_token")
+            return response
+
+        response = Response({"access": str(token.access_token)}, status=status.HTTP_200_OK)
+        poser_cookie_refresh(response, str(token))
+        return response
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Catalogue en lecture par les vues async (api/async_views.py)
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'backend.urls_asgi')
 
 application = get_asgi_application()
@@ -29,19 +29,33 @@ INSTALLED_APPS = [
 # REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Principal construit depuis les claims du jeton, User charge a la demande (api/authentication.py)
+        "api.authentication.PrincipalJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # orjson si installe (sinon json), fragments pre-encodes inseres sans re-encodage
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Fenetres glissantes dans Redis, limites par portee dans THROTTLING (api/throttling.py)
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.SlidingWindowThrottle",
+    ],
+    # Proxies de confiance devant l'API : l'IP des limites par IP est l'entree de X-Forwarded-For
+    # ajoutee par le dernier d'entre eux ; 0 (defaut) : REMOTE_ADDR, l'en-tete du client est ignore
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 
 # JWT Settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "ROTATE_REFRESH_TOKENS": False,
-    "BLACKLIST_AFTER_ROTATION": True,
+    # Rotation et revocation (jti revoques, version par utilisateur) dans Redis : api/revocation.py
+    "ROTATE_REFRESH_TOKENS": True,
+    "BLACKLIST_AFTER_ROTATION": False,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": SECRET_KEY,
@@ -49,9 +63,20 @@ SIMPLE_JWT = {
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
+    # Claims is_staff / is_superuser / ver (version des jetons de l'utilisateur)
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.LibraryTokenObtainPairSerializer",
+}
+
+TOKEN_REVOCATION = {
+    "BACKEND": "api.revocation.RedisRevocationStore",
 }
 
+# Utilisateur complet en cache (charge a la demande par le Principal JWT), invalide a l'enregistrement
+AUTH_USER_CACHE_TIMEOUT = 300
+
 MIDDLEWARE = [
+    # En premier : mesure toute la requete (api/instrumentation.py)
+    "api.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -62,7 +87,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "backend.urls"
+# backend.urls_asgi sous ASGI (backend/asgi.py) : catalogue servi par les vues async
+ROOT_URLCONF = os.getenv("DJANGO_ROOT_URLCONF", "backend.urls")
 
 TEMPLATES = [
     {
@@ -105,10 +131,92 @@ CACHES = {
     }
 }
 
+# Cache du catalogue (api/catalog_cache.py)
+CATALOG_CACHE = {
+    "TIMEOUT": 300,
+    "STALE_TTL": 60,
+    "LOCK_TIMEOUT": 10,
+    "WAIT_TIMEOUT": 0.5,
+    # En-tetes Cache-Control des endpoints publics du catalogue (navigateurs / CDN)
+    "HTTP_MAX_AGE": 60,
+    "HTTP_S_MAXAGE": 300,
+    "HTTP_STALE_WHILE_REVALIDATE": 60,
+}
+
+# Recherche plein texte (api/search.py)
+CATALOG_SEARCH_CONFIG = "simple"
+
+# Autocompletion (api/autocomplete.py), reconstruction : manage.py rebuild_autocomplete
+AUTOCOMPLETE = {
+    "BACKEND": "api.autocomplete.RedisPrefixIndex",
+    "MAX_PREFIX_LENGTH": 15,
+    "MAX_PER_PREFIX": 50,
+}
+
+# Reservations non retirees : expiration (manage.py expire_reservations / run_worker)
+RESERVATION_PICKUP_DELAY = timedelta(days=3)
+EXPIRY_BATCH_SIZE = 500
+
+# Taches periodiques executees par manage.py run_worker (chemin -> intervalle en secondes)
+PERIODIC_TASKS = {
+    "api.expiry.expire_overdue_reservations": 60,
+}
+
+# Instrumentation par requete (api/instrumentation.py) : en-tete Server-Timing, log "request metrics"
+# sur le logger api.instrumentation, budgets de requetes SQL par vue (warning, ou erreur si ENFORCE_BUDGETS)
+REQUEST_METRICS = {
+    "SERVER_TIMING": True,
+    "ENFORCE_BUDGETS": False,
+}
+
+# Metriques Prometheus (api/metrics.py) exposees sur GET /metrics : deltas de chaque worker pousses
+# dans Redis au plus toutes les FLUSH_INTERVAL secondes. METRICS_TOKEN : Authorization: Bearer <token> exige,
+# endpoint ferme (403) tant qu'il n'est pas defini
+METRICS = {
+    "BACKEND": "api.metrics.RedisStore",
+    "FLUSH_INTERVAL": 5,
+    "BUCKETS": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    "TOKEN": os.getenv("METRICS_TOKEN", ""),
+}
+
+# Limitation de debit (api/throttling.py) : regles par portee de vue (throttle_scope) et par
+# identifiant (user, anon, ip, email) ; "default" s'applique a toutes les requetes de l'API
+THROTTLING = {
+    "BACKEND": "api.throttling.RedisSlidingWindow",
+    "RATES": {
+        "default": {"user": "600/min", "anon": "300/min"},
+        "login": {"ip": "20/min", "email": "5/min"},
+        "signup": {"ip": "10/hour"},
+        "reservations": {"user": "30/min"},
+    },
+}
+
+# Hachage des mots de passe des vues d'authentification async (api/hashing.py) : WORKERS threads par
+# processus (la moitie des coeurs : le reste pour le catalogue), au-dela de MAX_PENDING hachages en
+# cours ou en attente, 503 + Retry-After (secondes)
+PASSWORD_HASHING = {
+    "WORKERS": max(1, (os.cpu_count() or 2) // 2),
+    "MAX_PENDING": 16,
+    "RETRY_AFTER": 1,
+}
+
 # Session Redis Cache
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 
+# Logs applicatifs (api.*) : avertissements seulement par defaut ; API_LOG_LEVEL=INFO pour suivre
+# les taches periodiques (expiration des reservations), DEBUG pour les mesures par requete
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {"handlers": ["console"], "level": os.getenv("API_LOG_LEVEL", "WARNING")},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -138,6 +246,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = 'api.User'
 
+# Version async sans hachage dans la boucle d'evenements (api/authentication.py)
+AUTHENTICATION_BACKENDS = ['api.authentication.HashingPoolBackend']
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from api.views import CreateUserView
-from api.views import CreateUserView, CustomTokenObtainPairView, RefreshAccessTokenView
+from api.views import CreateUserView, CustomTokenObtainPairView, RefreshAccessTokenView, metriques
 
 
 urlpatterns = [
@@ -11,6 +10,7 @@ urlpatterns = [
     path("api/v1/token/refresh-access/", RefreshAccessTokenView.as_view(), name="refresh_access_token"),  # Custom view
     path("api/v1/auth/", include("rest_framework.urls")),  
     path("api/v1/", include("api.urls")), 
+    path("metrics", metriques, name="metrics"),
 ]
 
 # # Configuration CORS pour le développement
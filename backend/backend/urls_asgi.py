@@ -0,0 +1,14 @@
+from django.urls import include, path
+
+from api import async_views
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+# ROOT_URLCONF du serveur ASGI (backend/asgi.py) : authentification et catalogue en lecture par les
+# vues async, tout le reste comme sous WSGI. Les vues async restent hors de backend/urls.py : sous
+# WSGI chaque requete tournerait dans une nouvelle boucle d'evenements (clients redis.asyncio compris)
+urlpatterns = [
+    path("api/v1/user/register/", async_views.creer_compte, name="register"),
+    path("api/v1/token/", async_views.obtenir_jeton, name="get_token"),  # Hachage dans api/hashing.py
+    path("api/v1/", include("api.urls_asgi")),
+] + wsgi_urlpatterns
@@ -8,6 +8,8 @@ export function Books() {
   const [books, setBooks] = useState([]);
   const [hovered, setHovered] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [next, setNext] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [alert, setAlert] = useState({
     show: false,
     message: "",
@@ -19,11 +21,30 @@ export function Books() {
     setTimeout(() => setAlert({ ...alert, show: false }), 3000);
   };
 
+  // Liste paginée par curseur : première page, puis la suivante à la demande (lien `next`)
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await api.get(next);
+      setBooks((previous) => [...previous, ...response.data.books]);
+      setNext(response.data.next);
+    } catch (error) {
+      console.error("Erreur lors du chargement des livres:", error);
+      handleAlert({
+        type: "error",
+        message: "Erreur lors du chargement des livres",
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const fetchBooks = async () => {
       try {
         const response = await api.get("/books/");
         setBooks(response.data.books);
+        setNext(response.data.next);
       } catch (error) {
         console.error("Erreur lors du chargement des livres:", error);
         handleAlert({
@@ -64,6 +85,21 @@ export function Books() {
               />
             ))}
           </div>
+          {next && (
+            <div className="mt-8 flex justify-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className={`px-6 py-2 rounded-md transition-colors ${
+                  loadingMore
+                    ? "bg-gray-100 text-gray-400 cursor-not-allowed"
+                    : "bg-primary-600 text-white hover:bg-primary-700"
+                }`}
+              >
+                {loadingMore ? "Chargement..." : "Voir plus de livres"}
+              </button>
+            </div>
+          )}
           <Alert
             isVisible={alert.show}
             message={alert.message}
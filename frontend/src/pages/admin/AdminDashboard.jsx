@@ -30,6 +30,7 @@ export const AdminDashboard = () => {
   });
 
   const [books, setBooks] = useState([]);
+  const [booksNext, setBooksNext] = useState(null);
   const [authors, setAuthors] = useState([]);
   const [publishers, setPublishers] = useState([]);
   const [users, setUsers] = useState([]);
@@ -50,13 +51,14 @@ export const AdminDashboard = () => {
       const [usersRes, booksRes, authorsRes, reservationsRes] =
         await Promise.all([
           api.get("/users/"),
-          api.get("/titles/"),
+          // Total des livres : facettes (une agrégation en cache), sans parcourir le catalogue
+          api.get("/titles/facets/"),
           api.get("/authors/"),
           api.get("/reservations/"),
         ]);
       setStats({
         users: usersRes.data.length,
-        books: booksRes.data.length,
+        books: booksRes.data.count,
         authors: authorsRes.data.length,
         reservations: reservationsRes.data.length,
       });
@@ -68,9 +70,13 @@ export const AdminDashboard = () => {
   const fetchData = async (tab) => {
     try {
       switch (tab) {
-        case "books":
-          setBooks((await api.get("/titles/")).data);
+        case "books": {
+          // Liste paginée par curseur : première page, les suivantes à la demande
+          const { data } = await api.get("/titles/");
+          setBooks(data.results);
+          setBooksNext(data.next);
           break;
+        }
         case "authors":
           setAuthors((await api.get("/authors/")).data);
           break;
@@ -91,6 +97,16 @@ export const AdminDashboard = () => {
     }
   };
 
+  const loadMoreBooks = async () => {
+    try {
+      const { data } = await api.get(booksNext);
+      setBooks((previous) => [...previous, ...data.results]);
+      setBooksNext(data.next);
+    } catch (error) {
+      console.error("Erreur lors de la récupération des livres :", error);
+    }
+  };
+
   const handleDelete = async (id, type) => {
     try {
       await api.delete(`/${type}/${id}/`);
@@ -698,6 +714,16 @@ export const AdminDashboard = () => {
                   ))}
               </tbody>
             </table>
+            {activeTab === "books" && booksNext && (
+              <div className="mt-4 flex justify-center">
+                <button
+                  className="px-4 py-2 text-sm rounded-md text-blue-700 hover:bg-blue-50"
+                  onClick={loadMoreBooks}
+                >
+                  Charger plus de livres
+                </button>
+              </div>
+            )}
           </div>
         </div>
       </div>